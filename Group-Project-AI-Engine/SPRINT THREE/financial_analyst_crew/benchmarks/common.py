@@ -0,0 +1,9 @@
+"""Settings shared by the benchmark driver and the in-worker stand-ins."""
+import os
+
+
+BENCH_SEEDED_REPORTS = int(os.environ.get('BENCH_SEEDED_REPORTS', 20))
+
+
+def seeded_report_ids(count: int = BENCH_SEEDED_REPORTS) -> list:
+    return [f'bench-report-{index}' for index in range(count)]
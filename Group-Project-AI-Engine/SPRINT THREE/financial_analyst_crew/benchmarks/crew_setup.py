@@ -0,0 +1,94 @@
+"""Crew setup overhead per analysis, with and without the config cache and agent pool.
+
+Usage: python benchmarks/crew_setup.py [--iterations 200] [--out results.json]
+
+Builds the crew for a fresh asset each iteration the way setup_crew() does,
+without running any task, and reports wall time and allocations per setup
+as JSON. The "rebuild" mode re-parses the YAML and constructs new agents
+every time, as the crew did before the template and pool were added.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [HERE, os.path.join(os.path.dirname(HERE), 'src')]
+
+import numpy as np
+
+import agents
+import tasks
+from crew import FinancialAnalystCrew
+
+
+ASSETS = ['AAPL', 'AMD', 'NVDA', 'CSCO', 'EA', 'GOOG', 'MSFT', 'INTC', 'PYPL']
+
+
+def setup_once(llm, asset_name: str, pooled: bool):
+    if not pooled:
+        agents.load_agents_config.cache_clear()
+        tasks.load_tasks_config.cache_clear()
+        tasks.task_graph.cache_clear()
+    crew_agents = agents.FinancialAgents(llm, pool=agents.agent_pool if pooled else None)
+    crew_tasks = tasks.FinancialTasks(crew_agents, asset_name)
+    graph = crew_tasks.graph()
+    built = {name: crew_tasks.create_task(name) for name in graph.order if not crew_tasks.is_computed(name)}
+    if pooled:
+        crew_agents.release()
+    return built
+
+
+def measure(llm, iterations: int, pooled: bool) -> dict:
+    setup_once(llm, ASSETS[0], pooled)
+    durations = []
+    allocated = []
+    tracemalloc.start()
+    for i in range(iterations):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        start = time.perf_counter()
+        setup_once(llm, ASSETS[i % len(ASSETS)], pooled)
+        durations.append(time.perf_counter() - start)
+        _, peak = tracemalloc.get_traced_memory()
+        allocated.append(peak - before)
+    tracemalloc.stop()
+
+    durations = np.array(durations) * 1000
+    return {
+        'iterations': iterations,
+        'setup_ms': {
+            'mean': round(float(durations.mean()), 3),
+            'p50': round(float(np.percentile(durations, 50)), 3),
+            'p95': round(float(np.percentile(durations, 95)), 3)
+        },
+        'peak_alloc_kb': round(float(np.mean(allocated)) / 1024, 1)
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--llm', default='groq')
+    parser.add_argument('--out', help='also write the JSON results to this file')
+    args = parser.parse_args(argv)
+
+    llm = FinancialAnalystCrew('bench', ASSETS[0], args.llm).llm_provider
+    results = {
+        'rebuild': measure(llm, args.iterations, pooled=False),
+        'template': measure(llm, args.iterations, pooled=True),
+        'pool': agents.agent_pool.stats()
+    }
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, 'w') as file:
+            file.write(output + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,28 @@
+"""Gunicorn settings for benchmark runs; mirrors the Dockerfile start script."""
+import os
+import sys
+import tempfile
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [here, os.path.join(os.path.dirname(here), 'src')]
+os.environ.setdefault('OTEL_SDK_DISABLED', 'true')
+os.environ.setdefault('PRETRAIN_ENABLED', 'false')
+os.environ.setdefault('LLM_CACHE_ENABLED', 'false')
+os.environ.setdefault('MODEL_DIR', os.path.join(tempfile.gettempdir(), 'bench-models'))
+os.environ.setdefault('STORAGE_SQLITE_PATH', os.path.join(tempfile.gettempdir(), 'bench-storage.sqlite3'))
+
+bind = f"127.0.0.1:{os.environ.get('BENCH_PORT', '18080')}"
+workers = int(os.environ.get('BENCH_WORKERS', 2))
+threads = int(os.environ.get('BENCH_THREADS', 4))
+timeout = int(os.environ.get('BENCH_TIMEOUT', 120))
+graceful_timeout = timeout
+os.environ.setdefault('GUNICORN_GRACEFUL_TIMEOUT', str(graceful_timeout))
+keepalive = 5
+loglevel = os.environ.get('BENCH_LOG_LEVEL', 'warning')
+wsgi_app = 'api:app'
+
+
+def post_fork(server, worker):
+    # Runs before the worker imports api.py, so warm-up already sees the stand-ins.
+    import standins
+    standins.install()
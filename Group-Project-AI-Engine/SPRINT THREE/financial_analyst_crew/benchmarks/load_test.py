@@ -0,0 +1,244 @@
+"""Offline load test for the API under gunicorn.
+
+Usage: python benchmarks/load_test.py [--duration 60] [--concurrency 8]
+           [--mix single=4,multiple=1,analysis=2,report=3] [--out results.json]
+
+Boots src/api.py with benchmarks/gunicorn.conf.py, which swaps in a
+synthetic price fetcher, in-memory or SQLite storage (BENCH_STORAGE) and a
+scripted LLM, drives a weighted mix of requests and prints throughput,
+latency percentiles and per-worker RSS as JSON. Gunicorn settings come from
+BENCH_* variables, and TRAINING_EPOCHS can be lowered to keep model fits short.
+
+analysis forces a new crew run on every request; repeat requests the same
+analyses without force_refresh, measuring reuse of stored reports.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+import numpy as np
+
+from common import seeded_report_ids
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(HERE)
+ASSETS = ['AAPL', 'AMD', 'NVDA', 'CSCO', 'EA', 'GOOG', 'MSFT', 'INTC', 'PYPL']
+TIMEFRAMES = [7, 30, 90, 180]
+
+
+def _request(base_url, method, path, body=None, headers=None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(base_url + path, data=data, method=method, headers={
+        'Content-Type': 'application/json',
+        'Accept-Encoding': 'gzip',
+        **(headers or {})
+    })
+    try:
+        with urllib.request.urlopen(req, timeout=300) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def single_prediction(base_url, rng):
+    return _request(base_url, 'GET', f'/api/predictions/{rng.choice(ASSETS)}?timeframe={rng.choice(TIMEFRAMES)}')
+
+
+def multiple_predictions(base_url, rng):
+    return _request(base_url, 'POST', '/api/predictions/multiple', {
+        'assets': rng.sample(ASSETS, 3),
+        'timeframe': rng.choice(TIMEFRAMES)
+    })
+
+
+def analysis(base_url, rng):
+    return _request(base_url, 'POST', '/api/analysis?client_type=mobile', {
+        'asset_name': rng.choice(ASSETS),
+        'llm_choice': 'groq',
+        'force_refresh': True
+    })
+
+
+def repeat_view(base_url, rng):
+    # Served from a stored report once an analysis of the asset has run.
+    return _request(base_url, 'POST', '/api/analysis?client_type=mobile', {
+        'asset_name': rng.choice(ASSETS),
+        'llm_choice': 'groq'
+    })
+
+
+def report_read(base_url, rng):
+    return _request(base_url, 'GET', f'/api/analysis/{rng.choice(seeded_report_ids())}', headers={
+        'X-Client-Type': 'mobile'
+    })
+
+
+OPERATIONS = {
+    'single': single_prediction,
+    'multiple': multiple_predictions,
+    'analysis': analysis,
+    'repeat': repeat_view,
+    'report': report_read
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in OPERATIONS:
+            raise ValueError(f'Unknown operation in mix: {name}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def worker_pids(master_pid):
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as file:
+                fields = file.read().rsplit(')', 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == master_pid:
+            pids.append(int(entry))
+    return pids
+
+
+def memory_kb(pid):
+    usage = {}
+    with open(f'/proc/{pid}/status') as file:
+        for line in file:
+            if line.startswith(('VmRSS:', 'VmHWM:')):
+                key, value = line.split(':', 1)
+                usage[key] = int(value.split()[0])
+    return {'rss_kb': usage.get('VmRSS'), 'peak_rss_kb': usage.get('VmHWM')}
+
+
+def wait_until_up(base_url, server, timeout=300):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with code {server.returncode}')
+        try:
+            if _request(base_url, 'GET', '/health') == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError('Server did not become healthy in time')
+
+
+def percentiles(samples):
+    if not samples:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None}
+    p50, p95, p99 = np.percentile(np.asarray(samples) * 1000, [50, 95, 99])
+    return {'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2), 'p99_ms': round(p99, 2)}
+
+
+def run_load(base_url, mix, duration, concurrency, seed):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client(index):
+        rng = random.Random(seed + index)
+        while time.monotonic() < stop_at:
+            name = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                status = OPERATIONS[name](base_url, rng)
+            except OSError:
+                status = None
+            elapsed = time.perf_counter() - start
+            with lock:
+                if status is not None and status < 400:
+                    latencies[name].append(elapsed)
+                else:
+                    errors[name] += 1
+
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--duration', type=float, default=60)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mix', default='single=4,multiple=1,analysis=2,report=3')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='also write the JSON results to this file')
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    port = os.environ.setdefault('BENCH_PORT', '18080')
+    base_url = f'http://127.0.0.1:{port}'
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', os.path.join(HERE, 'gunicorn.conf.py')],
+        cwd=PROJECT_ROOT
+    )
+    try:
+        wait_until_up(base_url, server)
+        latencies, errors, elapsed = run_load(base_url, mix, args.duration, args.concurrency, args.seed)
+        workers = {str(pid): memory_kb(pid) for pid in worker_pids(server.pid)}
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+    all_samples = [sample for samples in latencies.values() for sample in samples]
+    results = {
+        'config': {
+            'duration_s': args.duration,
+            'concurrency': args.concurrency,
+            'mix': mix,
+            'workers': int(os.environ.get('BENCH_WORKERS', 2)),
+            'threads': int(os.environ.get('BENCH_THREADS', 4)),
+            'llm_latency_s': float(os.environ.get('BENCH_LLM_LATENCY', 0.05)),
+            'storage': os.environ.get('BENCH_STORAGE', 'memory'),
+            'training_epochs': int(os.environ.get('TRAINING_EPOCHS', 25))
+        },
+        'elapsed_s': round(elapsed, 3),
+        'requests': len(all_samples),
+        'errors': sum(errors.values()),
+        'throughput_rps': round(len(all_samples) / elapsed, 3) if elapsed else 0.0,
+        'latency': percentiles(all_samples),
+        'operations': {
+            name: {
+                'requests': len(latencies[name]),
+                'errors': errors[name],
+                **percentiles(latencies[name])
+            } for name in mix
+        },
+        'workers': workers
+    }
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, 'w') as file:
+            file.write(output + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,97 @@
+"""Quick single-call analysis against the full crew, end to end and offline.
+
+Usage: python benchmarks/quick_analysis.py [--iterations 3] [--llm-latency 2.0] [--out results.json]
+
+Runs request_analysis in both modes for a set of assets with the Yahoo
+Finance, Firestore and LLM stand-ins, after one warm-up pass so both modes
+read statements and prices from cache. Every scripted LLM call sleeps
+--llm-latency seconds, so the gap between modes reflects the number of
+sequential LLM calls. Prints wall time percentiles, LLM calls per analysis
+and how many quick analyses met QUICK_ANALYSIS_SLO_SECONDS, as JSON.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [HERE, os.path.join(os.path.dirname(HERE), 'src')]
+os.environ.setdefault('LLM_CACHE_ENABLED', 'false')
+os.environ.setdefault('WARMUP_ENABLED', 'false')
+os.environ.setdefault('PRETRAIN_ENABLED', 'false')
+
+import numpy as np
+
+
+ASSETS = ['AAPL', 'NVDA', 'MSFT', 'AMD']
+
+
+def run_mode(interface, mode: str, iterations: int) -> dict:
+    durations = []
+    calls = []
+    errors = []
+    for _ in range(iterations):
+        for asset in ASSETS:
+            start = time.perf_counter()
+            result = interface.request_analysis(asset_name=asset, llm_choice='groq', client_type='mobile', mode=mode,
+                                                force_refresh=True)
+            durations.append(time.perf_counter() - start)
+            if result.get('status') != 'success':
+                errors.append(f"{asset}: {result.get('message')}")
+                continue
+            usage = interface.db.get_analysis_report(result['report_id'])['metadata']['token_usage']
+            calls.append(usage['total'].get('calls', 0))
+
+    durations = np.array(durations)
+    return {
+        'analyses': len(durations),
+        'seconds': {
+            'mean': round(float(durations.mean()), 3),
+            'p50': round(float(np.percentile(durations, 50)), 3),
+            'p95': round(float(np.percentile(durations, 95)), 3)
+        },
+        'llm_calls_per_analysis': round(float(np.mean(calls)), 2) if calls else None,
+        'errors': errors
+    }
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=3)
+    parser.add_argument('--llm-latency', type=float, default=2.0, help='seconds per scripted LLM call')
+    parser.add_argument('--out', help='also write the JSON results to this file')
+    args = parser.parse_args(argv)
+    os.environ['BENCH_LLM_LATENCY'] = str(args.llm_latency)
+
+    import standins
+    standins.install()
+    import quick
+    from financial_interface import get_interface
+
+    interface = get_interface()
+    for asset in ASSETS:
+        quick.QuickAnalysis(asset, predictor=interface.price_predictions).gather_context()
+
+    full = run_mode(interface, 'full', args.iterations)
+    fast = run_mode(interface, 'quick', args.iterations)
+    fast['slo_seconds'] = quick.QUICK_ANALYSIS_SLO_SECONDS
+    fast['slo_met'] = sum(1 for report in standins.InMemoryDatabase._collections['analysis_reports'].values()
+                          if report.get('metadata', {}).get('slo_met'))
+    results = {
+        'llm_latency_seconds': args.llm_latency,
+        'full': full,
+        'quick': fast,
+        'speedup_p50': round(full['seconds']['p50'] / fast['seconds']['p50'], 2) if fast['seconds']['p50'] else None
+    }
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, 'w') as file:
+            file.write(output + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
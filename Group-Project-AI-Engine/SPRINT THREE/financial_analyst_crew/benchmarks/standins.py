@@ -0,0 +1,323 @@
+"""Local stand-ins for Yahoo Finance, Firestore and the hosted LLMs.
+
+install() swaps them into the application modules before api.py is
+imported, so the benchmark exercises the real Flask routes, interface, crew and model code offline.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from common import seeded_report_ids
+from llm import ProviderLLM, record_usage
+from storage import Storage
+
+
+BENCH_LLM_LATENCY = float(os.environ.get('BENCH_LLM_LATENCY', 0.05))
+# memory keeps documents in this process; sqlite uses the embedded backend at STORAGE_SQLITE_PATH.
+BENCH_STORAGE = os.environ.get('BENCH_STORAGE', 'memory').lower()
+
+
+class SyntheticTicker:
+    """Drop-in for yfinance.Ticker with two years of deterministic annual statements."""
+
+    def __init__(self, ticker):
+        rng = np.random.default_rng(zlib.crc32(ticker.encode()))
+        years = [pd.Timestamp(datetime.today().year - offset, 12, 31) for offset in (1, 2)]
+        revenue = rng.uniform(5e9, 4e11) * np.array([1.0, 1 / rng.uniform(0.9, 1.2)])
+        assets = revenue * rng.uniform(0.8, 2.0)
+        equity = assets * rng.uniform(0.2, 0.6)
+        current_liabilities = assets * rng.uniform(0.1, 0.3)
+
+        def statement(rows):
+            return pd.DataFrame(rows, index=years).T
+
+        self.income_stmt = statement({
+            'Total Revenue': revenue,
+            'Cost Of Revenue': revenue * 0.55,
+            'Gross Profit': revenue * 0.45,
+            'Operating Income': revenue * 0.25,
+            'Net Income': revenue * 0.18,
+            'EBIT': revenue * 0.26,
+            'Interest Expense': revenue * 0.01
+        })
+        self.balance_sheet = statement({
+            'Total Assets': assets,
+            'Stockholders Equity': equity,
+            'Current Assets': current_liabilities * rng.uniform(0.8, 2.5),
+            'Current Liabilities': current_liabilities,
+            'Inventory': revenue * 0.05,
+            'Cash And Cash Equivalents': current_liabilities * 0.4,
+            'Accounts Receivable': revenue * 0.12,
+            'Total Debt': equity * rng.uniform(0.2, 1.5),
+            'Ordinary Shares Number': np.full(2, rng.uniform(1e8, 1.6e10))
+        })
+        self.cashflow = statement({'Cash Dividends Paid': -revenue * 0.02})
+        self.news = [{'title': f'{ticker} synthetic headline {index}', 'publisher': 'Synthetic'} for index in range(5)]
+
+
+class SyntheticPriceFetcher:
+    """Drop-in for the yfinance module: deterministic geometric Brownian motion per ticker."""
+
+    Ticker = SyntheticTicker
+
+    def download(self, asset, start=None, end=None, **kwargs):
+        end = pd.Timestamp(end or datetime.today()).normalize()
+        start = pd.Timestamp(start or end - pd.Timedelta(days=365 * 3)).normalize()
+        index = pd.bdate_range(start=start, end=end)
+        rng = np.random.default_rng(zlib.crc32(asset.encode()))
+        returns = rng.normal(0.0004, 0.02, len(index))
+        prices = (50 + rng.random() * 200) * np.exp(np.cumsum(returns))
+        return pd.DataFrame({
+            'Open': prices,
+            'High': prices * 1.01,
+            'Low': prices * 0.99,
+            'Close': prices,
+            'Adj Close': prices,
+            'Volume': rng.integers(1_000_000, 50_000_000, len(index))
+        }, index=index)
+
+
+class InMemoryDatabase(Storage):
+    """Process-local Storage with no I/O at all."""
+
+    _collections = {'analysis_reports': {}, 'price_predictions': {}, 'historical_data': {}, 'crew_checkpoints': {},
+                    'analysis_batches': {}, 'job_cancellations': {}, 'idempotency_keys': {}}
+    _lock = threading.Lock()
+
+    def _store(self, collection: str, id_field: str, asset_name: str, document: dict) -> str:
+        document_id = uuid.uuid4().hex[:20]
+        document.update({
+            'asset_name': asset_name,
+            'timestamp': datetime.now().isoformat(),
+            id_field: document_id
+        })
+        with self._lock:
+            self._collections[collection][document_id] = document
+        return document_id
+
+    def store_analysis_report(self, asset_name: str, report: dict, durable: bool = False) -> str:
+        return self._store('analysis_reports', 'report_id', asset_name, report)
+
+    def store_price_predictions(self, asset_name: str, prediction: dict, durable: bool = False) -> str:
+        return self._store('price_predictions', 'prediction_id', asset_name, prediction)
+
+    def get_historical_data(self, asset_name: str, limit: int = 100) -> list:
+        with self._lock:
+            docs = [doc for doc in self._collections['historical_data'].values() if doc.get('asset_name') == asset_name]
+        return sorted(docs, key=lambda doc: doc['timestamp'], reverse=True)[:limit]
+
+    def get_recent_analysis_reports(self, asset_name: str, limit: int = 5) -> list:
+        with self._lock:
+            docs = [doc for doc in self._collections['analysis_reports'].values() if doc.get('asset_name') == asset_name]
+        return sorted(docs, key=lambda doc: doc['timestamp'], reverse=True)[:limit]
+
+    def store_task_checkpoint(self, job_id: str, task_name: str, checkpoint: dict) -> bool:
+        with self._lock:
+            self._collections['crew_checkpoints'].setdefault(job_id, {})[task_name] = dict(checkpoint)
+        return True
+
+    def get_task_checkpoints(self, job_id: str) -> dict:
+        with self._lock:
+            return dict(self._collections['crew_checkpoints'].get(job_id, {}))
+
+    def store_batch_status(self, batch_id: str, status: dict) -> bool:
+        with self._lock:
+            self._collections['analysis_batches'][batch_id] = dict(status)
+        return True
+
+    def get_batch_status(self, batch_id: str):
+        return self._collections['analysis_batches'].get(batch_id)
+
+    def store_job_cancellation(self, job_id: str, cancellation: dict) -> bool:
+        with self._lock:
+            self._collections['job_cancellations'][job_id] = dict(cancellation)
+        return True
+
+    def get_job_cancellation(self, job_id: str):
+        return self._collections['job_cancellations'].get(job_id)
+
+    def claim_idempotency_key(self, key: str, record: dict):
+        with self._lock:
+            existing = self._collections['idempotency_keys'].get(key)
+            if existing is not None and existing.get('expires_at', 0) > time.time():
+                return dict(existing)
+            self._collections['idempotency_keys'][key] = dict(record)
+        return None
+
+    def update_idempotency_key(self, key: str, changes: dict) -> bool:
+        with self._lock:
+            self._collections['idempotency_keys'].setdefault(key, {}).update(changes)
+        return True
+
+    def release_idempotency_key(self, key: str) -> bool:
+        with self._lock:
+            self._collections['idempotency_keys'].pop(key, None)
+        return True
+
+    def get_analysis_report(self, report_id: str):
+        return self._collections['analysis_reports'].get(report_id)
+
+    def get_price_predictions(self, prediction_id: str):
+        return self._collections['price_predictions'].get(prediction_id)
+
+
+SCRIPTED_OUTPUTS = {
+    'quick_analysis': {
+        'news_sentiment': 'neutral',
+        'recommendation': {
+            'decision': 'hold',
+            'confidence_level': 0.5,
+            'rationale': 'Synthetic rationale.',
+            'risk_factors': ['synthetic']
+        },
+        'final_report': {
+            'executive_summary': 'Synthetic summary.',
+            'sections': {
+                'overview': 'Synthetic overview.',
+                'research_findings': 'Synthetic research.',
+                'financial_analysis': 'Synthetic analysis.',
+                'recommendation': 'Hold.'
+            },
+            'disclaimers': ['Benchmark output, not investment advice.']
+        }
+    },
+    'final_report': {
+        'final_report': {
+            'executive_summary': 'Synthetic summary.',
+            'sections': {
+                'overview': 'Synthetic overview.',
+                'research_findings': 'Synthetic research.',
+                'financial_analysis': 'Synthetic analysis.',
+                'recommendation': 'Hold.'
+            },
+            'disclaimers': ['Benchmark output, not investment advice.']
+        }
+    },
+    'recommendation': {
+        'recommendation': {
+            'decision': 'hold',
+            'confidence_level': 0.5,
+            'rationale': 'Synthetic rationale.',
+            'risk_factors': ['synthetic']
+        }
+    },
+    'financial_analysis': {
+        'financial_analysis': {
+            'risks': ['synthetic'],
+            'historical_trends': 'flat',
+            'summary': 'Synthetic financial analysis.'
+        }
+    },
+    'news_analysis': {
+        'news_analysis': {
+            'latest_news': [],
+            'sentiment': 'neutral',
+            'sources': ['synthetic']
+        }
+    },
+    'price_research': {
+        'price_research': {
+            'data_sources': ['synthetic'],
+            'price_data': {'current': 100.0, 'historical_summary': 'flat'},
+            'market_trends': 'flat',
+            'sources': ['synthetic']
+        }
+    },
+    'company_research': {
+        'company_research': {
+            'company_fundamentals': 'n/a',
+            'competitor_analysis': 'n/a',
+            'sources': ['synthetic']
+        }
+    }
+}
+
+
+class ScriptedLLM(ProviderLLM):
+    """Answers each crew task with a canned schema-shaped reply after a fixed delay."""
+
+    def __init__(self, provider: str, latency: float = BENCH_LLM_LATENCY):
+        super().__init__(provider, model=f'scripted/{provider}')
+        self.latency = latency
+
+    def _complete(self, messages, callbacks):
+        time.sleep(self.latency)
+        prompt = messages[-1]['content'] if messages else ''
+        for schema, output in SCRIPTED_OUTPUTS.items():
+            if f'{schema} schema' in prompt:
+                break
+        else:
+            output = {'answer': 'synthetic'}
+        answer = f'Thought: I now can give a great answer\nFinal Answer: {json.dumps(output)}'
+        # Roughly four characters per token, so token accounting has numbers offline.
+        record_usage(self.provider, sum(len(str(m.get('content', ''))) for m in messages) // 4, len(answer) // 4)
+        return answer
+
+
+class FakeProviderLLM(ProviderLLM):
+    """Provider with a configurable latency distribution and failure rate, for routing runs.
+
+    Latencies are lognormal around median seconds; a slow_fraction of calls
+    take slow_factor times longer, which is what hedging is meant to hide.
+    """
+
+    def __init__(self, provider: str, median: float, slow_fraction: float = 0.0, slow_factor: float = 10.0,
+                 error_rate: float = 0.0, seed: int = 0):
+        super().__init__(provider, model=f'fake/{provider}')
+        self.median = median
+        self.slow_fraction = slow_fraction
+        self.slow_factor = slow_factor
+        self.error_rate = error_rate
+        self._rng = np.random.default_rng(seed)
+        self._rng_lock = threading.Lock()
+
+    def _complete(self, messages, callbacks):
+        with self._rng_lock:
+            latency = self.median * self._rng.lognormal(0, 0.25)
+            if self._rng.random() < self.slow_fraction:
+                latency *= self.slow_factor
+            failed = self._rng.random() < self.error_rate
+        time.sleep(latency)
+        if failed:
+            raise RuntimeError(f'{self.provider} returned a synthetic error')
+        return f'{self.provider} answer'
+
+
+def install():
+    """Replace external services in the loaded application modules."""
+    import PricePredictions
+    import crew
+    import financial_interface
+    import quick
+    import ratios
+
+    PricePredictions.yf = SyntheticPriceFetcher()
+    ratios.yf = SyntheticPriceFetcher()
+    crew.FinancialAnalystCrew._setup_llm_provider = lambda self: ScriptedLLM(self.llm_choice)
+    quick.QuickAnalysis._setup_llm_provider = lambda self: ScriptedLLM(self.llm_choice)
+
+    seeded = {
+        report_id: {
+            'report_id': report_id,
+            'asset_name': 'AAPL',
+            'timestamp': datetime.now().isoformat(),
+            **SCRIPTED_OUTPUTS['final_report']
+        }
+        for report_id in seeded_report_ids()
+    }
+    if BENCH_STORAGE == 'sqlite':
+        from sqlite_storage import SQLiteDatabase
+        financial_interface.Database = SQLiteDatabase
+        database = SQLiteDatabase()
+        for report_id, report in seeded.items():
+            database._put('analysis_reports', report_id, report)
+    else:
+        financial_interface.Database = InMemoryDatabase
+        InMemoryDatabase._collections['analysis_reports'].update(seeded)
@@ -0,0 +1,79 @@
+"""Merge request profiles written by the API's on-demand profiler.
+
+Usage: python scripts/aggregate_profiles.py [profile_dir] [--match TEXT] [--out FILE] [--top N]
+
+Collapsed-stack (.folded) samples are summed into one folded file that can be
+fed to flamegraph.pl or speedscope, and the hottest functions are printed.
+cProfile (.prof) dumps are merged with pstats.
+"""
+import argparse
+import glob
+import os
+import pstats
+import sys
+from collections import Counter
+
+
+def merge_folded(paths):
+    stacks = Counter()
+    for path in paths:
+        with open(path) as file:
+            for line in file:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack and count.isdigit():
+                    stacks[stack] += int(count)
+    return stacks
+
+
+def hottest(stacks, top):
+    self_samples = Counter()
+    total_samples = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        self_samples[frames[-1]] += count
+        for frame in set(frames):
+            total_samples[frame] += count
+    return self_samples.most_common(top), total_samples.most_common(top)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('profile_dir', nargs='?', default='profiles')
+    parser.add_argument('--match', default='', help='only include files whose name contains this text, e.g. a route or asset')
+    parser.add_argument('--out', default='aggregate.folded', help='where to write the merged folded stacks')
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    folded = [path for path in sorted(glob.glob(os.path.join(args.profile_dir, '*.folded'))) if args.match in os.path.basename(path)]
+    prof = [path for path in sorted(glob.glob(os.path.join(args.profile_dir, '*.prof'))) if args.match in os.path.basename(path)]
+    if not folded and not prof:
+        print(f'No profiles found in {args.profile_dir}')
+        return 1
+
+    if folded:
+        stacks = merge_folded(folded)
+        with open(args.out, 'w') as file:
+            for stack, count in stacks.most_common():
+                file.write(f'{stack} {count}\n')
+        total = sum(stacks.values())
+        self_top, total_top = hottest(stacks, args.top)
+        print(f'{len(folded)} sampled profiles, {total} samples, merged into {args.out}')
+        print('\nSelf samples:')
+        for frame, count in self_top:
+            print(f'{count / total:>7.1%}  {frame}')
+        print('\nInclusive samples:')
+        for frame, count in total_top:
+            print(f'{count / total:>7.1%}  {frame}')
+
+    if prof:
+        stats = pstats.Stats(prof[0])
+        for path in prof[1:]:
+            stats.add(path)
+        print(f'\n{len(prof)} cProfile dumps')
+        stats.sort_stats('cumulative').print_stats(args.top)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
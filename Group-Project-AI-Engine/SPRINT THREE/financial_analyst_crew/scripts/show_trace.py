@@ -0,0 +1,68 @@
+"""Print the span tree of one trace from a TRACE_EXPORTER=file log.
+
+Usage: python scripts/show_trace.py [traces.jsonl] [trace_id]
+
+Without a trace id the slowest recorded trace is shown.
+"""
+import json
+import sys
+from collections import defaultdict
+from datetime import datetime
+
+
+def load_spans(path):
+    spans = defaultdict(list)
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                span = json.loads(line)
+                spans[span['trace_id']].append(span)
+    return spans
+
+
+def print_tree(spans):
+    children = defaultdict(list)
+    ids = {span['span_id'] for span in spans}
+    for span in spans:
+        parent = span['parent_id'] if span['parent_id'] in ids else None
+        children[parent].append(span)
+    for siblings in children.values():
+        siblings.sort(key=lambda span: span['start'])
+
+    origin = min(datetime.fromisoformat(span['start']) for span in spans)
+
+    def walk(parent, depth):
+        for span in children[parent]:
+            offset = (datetime.fromisoformat(span['start']) - origin).total_seconds() * 1000
+            status = '' if span['status'] == 'ok' else f"  !! {span['error']}"
+            attributes = ' '.join(f'{key}={value}' for key, value in span['attributes'].items())
+            print(f"{offset:>10.1f}ms {span['duration_ms']:>10.1f}ms  {'  ' * depth}{span['name']}  {attributes}{status}")
+            walk(span['span_id'], depth + 1)
+
+    print(f"{'start':>12} {'duration':>12}  span")
+    walk(None, 0)
+
+
+def main(argv):
+    path = argv[1] if len(argv) > 1 else 'traces.jsonl'
+    traces = load_spans(path)
+    if not traces:
+        print(f'No spans found in {path}')
+        return 1
+
+    if len(argv) > 2:
+        trace_id = argv[2]
+        if trace_id not in traces:
+            print(f'Trace {trace_id} not found in {path}')
+            return 1
+    else:
+        trace_id = max(traces, key=lambda key: max(span['duration_ms'] for span in traces[key]))
+
+    print(f'Trace {trace_id}')
+    print_tree(traces[trace_id])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
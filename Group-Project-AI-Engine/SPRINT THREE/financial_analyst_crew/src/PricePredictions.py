@@ -1,4 +1,8 @@
 import datetime as dt
+import logging
+import os
+import threading
+import time
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
@@ -8,10 +12,34 @@ from sklearn.preprocessing import MinMaxScaler
 from sklearn.metrics import mean_squared_error, mean_absolute_error
 from tensorflow.keras import Sequential
 from tensorflow.keras.layers import Dense, Dropout, LSTM
+from tensorflow.keras.models import clone_model, load_model
 
 import warnings
 warnings.filterwarnings("ignore")
 
+import metrics
+from cache import TTLCache
+
+TRAINING_EPOCHS = int(os.environ.get("TRAINING_EPOCHS", 25))
+FINETUNE_EPOCHS = int(os.environ.get("FINETUNE_EPOCHS", 5))
+MODEL_DIR = os.environ.get("MODEL_DIR", "models")
+# Several nightly pre-training periods, so one late or failed pass does not move training onto requests.
+MODEL_MAX_AGE = float(os.environ.get("MODEL_MAX_AGE", 3 * 24 * 3600))
+PRICE_CACHE_TTL = float(os.environ.get("PRICE_CACHE_TTL", 3600))
+PREDICTION_CACHE_TTL = float(os.environ.get("PREDICTION_CACHE_TTL", 3600))
+
+price_cache = TTLCache("price_series", ttl=PRICE_CACHE_TTL, max_entries=64)
+model_cache = TTLCache("models", ttl=MODEL_MAX_AGE, max_entries=64)
+prediction_cache = TTLCache("predictions", ttl=PREDICTION_CACHE_TTL, max_entries=256)
+
+_model_locks = {}
+_model_locks_guard = threading.Lock()
+
+
+def _model_lock(key):
+    with _model_locks_guard:
+        return _model_locks.setdefault(key, threading.Lock())
+
 
 class PricePredictions:
 
@@ -21,13 +49,33 @@ class PricePredictions:
         self.prediction_timeframes = [7, 30, 90, 180]
         self.confidence_level = 0.95
 
+    def asset_class(self, asset):
+        if asset.upper() in self.crypto_assets or asset.upper().endswith("-USD"):
+            return "crypto"
+        return "stock"
+
     def load_data(self, asset, start_date, end_date):
-        data = yf.download(asset, start=start_date, end=end_date)
+        with metrics.stage("data_download"):
+            data = yf.download(asset, start=start_date, end=end_date)
         if data.empty:
             raise ValueError(f"No data found for {asset}")
         return data
 
+    def price_history(self, asset, years=3, refresh=False):
+        """Daily prices for the last few years, shared across requests for PRICE_CACHE_TTL seconds."""
+        end_date = dt.datetime.today()
+        key = (asset, years, end_date.date())
+        data = None if refresh else price_cache.get(key)
+        if data is None:
+            data = self.load_data(asset, end_date - dt.timedelta(days=365 * years), end_date)
+            price_cache.set(key, data)
+        return data
+
     def process_data(self, data, prediction_timeframe):
+        with metrics.stage("window_build"):
+            return self._build_windows(data, prediction_timeframe)
+
+    def _build_windows(self, data, prediction_timeframe):
         data_scaler = MinMaxScaler(feature_range=(0, 1))
         scaled_data = data_scaler.fit_transform(data['Adj Close'].values.reshape(-1, 1))
 
@@ -57,6 +105,94 @@ class PricePredictions:
 
         return model
 
+    def _model_path(self, asset, prediction_timeframe):
+        return os.path.join(MODEL_DIR, f"{asset}_{prediction_timeframe}.keras")
+
+    def load_saved_model(self, asset, prediction_timeframe):
+        """Load a persisted model into the model cache if it is younger than MODEL_MAX_AGE."""
+        path = self._model_path(asset, prediction_timeframe)
+        if not os.path.exists(path):
+            return None
+        saved_at = os.path.getmtime(path)
+        age = time.time() - saved_at
+        if age > MODEL_MAX_AGE:
+            return None
+        with metrics.stage("model_load"):
+            model = load_model(path)
+        model_cache.set((asset, prediction_timeframe), (model, saved_at), ttl=MODEL_MAX_AGE - age)
+        return model
+
+    def train_model(self, asset, prediction_timeframe, x_train, y_train, base_model=None):
+        """Fit a model, persist it to MODEL_DIR and publish it to the model cache.
+
+        With a base_model the weights are copied and fine-tuned for FINETUNE_EPOCHS
+        instead of training from scratch; the base model itself is left untouched.
+        """
+        with metrics.stage("model_fit"):
+            if base_model is None:
+                model = self.build_model((x_train.shape[1], 1))
+                epochs = TRAINING_EPOCHS
+            else:
+                model = clone_model(base_model)
+                model.set_weights(base_model.get_weights())
+                model.compile(optimizer="adam", loss="mean_squared_error")
+                epochs = FINETUNE_EPOCHS
+            model.fit(x_train, y_train, epochs=epochs, batch_size=30)
+
+        path = self._model_path(asset, prediction_timeframe)
+        saved_at = time.time()
+        try:
+            os.makedirs(MODEL_DIR, exist_ok=True)
+            temp_path = f"{path[:-len('.keras')]}.{os.getpid()}.tmp.keras"
+            model.save(temp_path)
+            os.replace(temp_path, path)
+            saved_at = os.path.getmtime(path)
+        except OSError as e:
+            logging.warning(f"Could not persist model for {asset} ({prediction_timeframe} days): {str(e)}")
+
+        model_cache.set((asset, prediction_timeframe), (model, saved_at))
+        return model
+
+    def cached_model(self, asset, prediction_timeframe):
+        """The cached model, unless another worker has since saved a newer one."""
+        entry = model_cache.get((asset, prediction_timeframe))
+        if entry is None:
+            return None
+        model, saved_at = entry
+        path = self._model_path(asset, prediction_timeframe)
+        if os.path.exists(path) and os.path.getmtime(path) > saved_at:
+            return None
+        return model
+
+    def get_model(self, asset, prediction_timeframe, x_train, y_train):
+        """Return a cached or saved model, training one only when neither exists."""
+        model = self.cached_model(asset, prediction_timeframe)
+        if model is not None:
+            return model
+
+        with _model_lock((asset, prediction_timeframe)):
+            model = self.cached_model(asset, prediction_timeframe)
+            if model is None:
+                model = self.load_saved_model(asset, prediction_timeframe)
+            if model is None:
+                model = self.train_model(asset, prediction_timeframe, x_train, y_train)
+        return model
+
+    def refresh(self, asset, prediction_timeframe, fine_tune=False):
+        """Retrain on the latest prices and publish the model and forecast to the caches."""
+        data = self.price_history(asset, refresh=True)
+        x_train, y_train, scaler = self.process_data(data, prediction_timeframe)
+        with _model_lock((asset, prediction_timeframe)):
+            base_model = None
+            if fine_tune:
+                base_model = self.cached_model(asset, prediction_timeframe)
+                if base_model is None:
+                    base_model = self.load_saved_model(asset, prediction_timeframe)
+            model = self.train_model(asset, prediction_timeframe, x_train, y_train, base_model=base_model)
+        result = self._forecast(model, x_train, scaler, data, prediction_timeframe)
+        prediction_cache.set((asset, prediction_timeframe), result)
+        return result
+
     def calculate_conf_interval(self, price_predictions, real_prices):
         errors = np.array(price_predictions) - np.array(real_prices)
         mean_error = np.mean(errors)
@@ -78,26 +214,30 @@ class PricePredictions:
         }
 
     def predictions(self, asset, prediction_timeframe=30):
-        end_date = dt.datetime.today()
-        start_date = end_date - dt.timedelta(days=365 * 3)
+        cached = prediction_cache.get((asset, prediction_timeframe))
+        if cached is not None:
+            return cached
 
-        data = self.load_data(asset, start_date, end_date)
+        data = self.price_history(asset)
         if data is None:
             return None
 
         x_train, y_train, scaler = self.process_data(data, prediction_timeframe)
+        model = self.get_model(asset, prediction_timeframe, x_train, y_train)
+        result = self._forecast(model, x_train, scaler, data, prediction_timeframe)
+        prediction_cache.set((asset, prediction_timeframe), result)
+        return result
 
-        model = self.build_model((x_train.shape[1], 1))
-        model.fit(x_train, y_train, epochs=25, batch_size=30)
-
+    def _forecast(self, model, x_train, scaler, data, prediction_timeframe):
         final = x_train[-1:]
         future_predictions = []
 
-        for _ in range(prediction_timeframe):
-            next_prediction = model.predict(final)
-            future_predictions.append(next_prediction[0, 0])
-            final = np.roll(final, -1)
-            final[0, -1, 0] = next_prediction
+        with metrics.stage("rollout"):
+            for _ in range(prediction_timeframe):
+                next_prediction = model.predict(final)
+                future_predictions.append(next_prediction[0, 0])
+                final = np.roll(final, -1)
+                final[0, -1, 0] = next_prediction
 
         future_predictions = scaler.inverse_transform(np.array(future_predictions).reshape(-1, 1))
 
@@ -149,17 +289,18 @@ class PricePredictions:
         return plt.gcf()
 
 
-predictor = PricePredictions()
-asset = "AAPL"
-timeframe = 90
+if __name__ == "__main__":
+    predictor = PricePredictions()
+    asset = "AAPL"
+    timeframe = 90
 
 
-results = predictor.predictions(asset, timeframe)
+    results = predictor.predictions(asset, timeframe)
 
 
-past_data = predictor.load_data(asset, dt.datetime.today() - dt.timedelta(days=365 * 3), dt.datetime.today())
-plt.figure()
-predictor.plot_prices(asset, past_data, results['Dates'], results['Predictions'])
+    past_data = predictor.load_data(asset, dt.datetime.today() - dt.timedelta(days=365 * 3), dt.datetime.today())
+    plt.figure()
+    predictor.plot_prices(asset, past_data, results['Dates'], results['Predictions'])
 
-plt.show()
+    plt.show()
 
@@ -1,16 +1,102 @@
 from crewai import Agent
+from functools import lru_cache
 from pathlib import Path
+import os
+import threading
 import yaml
 
+from providers import MODEL_TIERS, get_llm
+
+AGENTS_CONFIG_PATH = Path(__file__).parent.parent / "config" / "agents.yaml"
+AGENT_POOL_SIZE = int(os.environ.get('CREW_AGENT_POOL_SIZE', 8))
+REQUIRED_AGENT_FIELDS = ('role', 'goal', 'backstory')
+
+
+@lru_cache(maxsize=None)
+def load_agents_config() -> dict:
+    """Parse and validate agents.yaml once per process."""
+    with open(AGENTS_CONFIG_PATH, 'r') as file:
+        config = yaml.safe_load(file)
+
+    for agent_type, fields in config.items():
+        missing = [field for field in REQUIRED_AGENT_FIELDS if not (fields or {}).get(field)]
+        if missing:
+            raise ValueError(f"Agent {agent_type} in agents.yaml is missing: {missing}")
+        if fields.get('tier', 'standard') not in MODEL_TIERS:
+            raise ValueError(f"Agent {agent_type} in agents.yaml has an unknown tier: {fields['tier']}")
+    return config
+
+
+class AgentPool:
+    """Idle agents per agent type, reused across analyses.
+
+    An agent is leased to a single task at a time, so tasks running
+    concurrently always get distinct agents.
+    """
+
+    def __init__(self, max_idle: int = AGENT_POOL_SIZE):
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, agent_type: str, factory) -> Agent:
+        with self._lock:
+            idle = self._idle.get(agent_type)
+            if idle:
+                self.reused += 1
+                return idle.pop()
+            self.created += 1
+        return factory()
+
+    def release(self, agent_type: str, agent: Agent):
+        # Clear what a previous task left behind before the next lease.
+        agent.tools_results = []
+        agent._times_executed = 0
+        with self._lock:
+            idle = self._idle.setdefault(agent_type, [])
+            if len(idle) < self.max_idle:
+                idle.append(agent)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'created': self.created,
+                'reused': self.reused,
+                'idle': {agent_type: len(idle) for agent_type, idle in self._idle.items()}
+            }
+
+
+agent_pool = AgentPool()
+
+
 class FinancialAgents:
-    def __init__(self, llm):
+    def __init__(self, llm, pool: AgentPool = agent_pool, tier_choices: dict = None):
         self.llm = llm
-        
-        current_dir = Path(__file__).parent.parent
-        config_path = current_dir / "config" / "agents.yaml"
+        self.tier_choices = tier_choices or {}
+        self.config = load_agents_config()
+        self.pool = pool
+        self._leased = []
+        self._leased_lock = threading.Lock()
+
+    def tier(self, agent_type: str) -> str:
+        return self.config[agent_type].get('tier', 'standard')
 
-        with open(config_path, 'r') as file:
-            self.config = yaml.safe_load(file)
+    def llm_choice(self, agent_type: str):
+        """The agent's own llm from agents.yaml, else the choice for its tier, else None for the crew's LLM."""
+        return self.config[agent_type].get('llm') or self.tier_choices.get(self.tier(agent_type))
+
+    def llm_for(self, agent_type: str):
+        choice = self.llm_choice(agent_type)
+        return get_llm(choice) if choice else self.llm
+
+    def assignments(self) -> dict:
+        """Tier and LLM choice of every agent type, for the report metadata."""
+        return {
+            agent_type: {'tier': self.tier(agent_type), 'llm': self.llm_choice(agent_type) or self.llm.provider}
+            for agent_type in self.config
+        }
 
     def _create_base_agent(self, agent_type: str):
         if not self.llm:
@@ -22,19 +108,37 @@ class FinancialAgents:
             role=self.config[agent_type]['role'],
             goal=self.config[agent_type]['goal'],
             backstory=self.config[agent_type]['backstory'],
-            llm=self.llm,
+            llm=self.llm_for(agent_type),
             verbose=True,
             allow_delegation=False
         )
 
+    def _agent(self, agent_type: str) -> Agent:
+        """Lease an agent from the pool, or build one when pooling is off."""
+        if self.pool is None:
+            return self._create_base_agent(agent_type)
+
+        agent = self.pool.acquire(agent_type, lambda: self._create_base_agent(agent_type))
+        agent.llm = self.llm_for(agent_type)
+        with self._leased_lock:
+            self._leased.append((agent_type, agent))
+        return agent
+
+    def release(self):
+        """Return every leased agent to the pool once the crew has finished."""
+        with self._leased_lock:
+            leased, self._leased = self._leased, []
+        for agent_type, agent in leased:
+            self.pool.release(agent_type, agent)
+
     def researcher(self) -> Agent:
-        return self._create_base_agent('researcher')
+        return self._agent('researcher')
 
     def accountant(self) -> Agent:
-        return self._create_base_agent('accountant')
+        return self._agent('accountant')
 
     def recommender(self) -> Agent:
-        return self._create_base_agent('recommender')
+        return self._agent('recommender')
 
     def blogger(self) -> Agent:
-        return self._create_base_agent('blogger')
+        return self._agent('blogger')
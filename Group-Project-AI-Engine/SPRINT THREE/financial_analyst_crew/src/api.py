@@ -1,20 +1,38 @@
-from flask import Flask, jsonify, request, abort
+from flask import Flask, Response, g, jsonify, request, abort, stream_with_context
 from flask_cors import CORS
-from financial_interface import FinancialInterface
+from financial_interface import ANALYSIS_MODES, get_interface
+from encoding import FastJSONProvider, compress_response
+import metrics
+import tracing
+import profiling
+import warmup
+import scheduler
+import llm_cache
+import providers
+import batch
+import idempotency
+import streaming
 from http import HTTPStatus
 import logging
 import os
+import re
 import time
+import uuid
 from functools import wraps
 
 
 logging.basicConfig(
     level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    format='%(asctime)s - %(name)s - %(levelname)s - [trace=%(trace_id)s] %(message)s'
 )
+tracing.install_log_filter()
 logger = logging.getLogger(__name__)
 
+TRACE_ID_PATTERN = re.compile(r'^[0-9a-f]{16,32}$')
+JOB_ID_PATTERN = re.compile(r'^[0-9A-Za-z-]{8,64}$')
+
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
 class APIError(Exception):
@@ -26,21 +44,124 @@ class APIError(Exception):
 def log_request(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        start_time = time.time()
+        start_time = time.perf_counter()
+        route = request.url_rule.rule if request.url_rule else request.path
+        incoming_trace_id = request.headers.get('X-Trace-Id', '').lower()
+        request_span = tracing.start_span(
+            f"{request.method} {route}",
+            trace_id=incoming_trace_id if TRACE_ID_PATTERN.match(incoming_trace_id) else None,
+            path=request.path
+        )
+        g.trace_id = request_span.trace_id
         logger.info(f"Request started: {request.method} {request.path}")
         
         try:
             response = f(*args, **kwargs)
-            duration = time.time() - start_time
+            duration = time.perf_counter() - start_time
             logger.info(f"Request completed: {request.method} {request.path} - Duration: {duration:.2f}s")
+            status = response[1] if isinstance(response, tuple) else getattr(response, 'status_code', 200)
+            if metrics.METRICS_ENABLED:
+                metrics.request_duration.observe(duration, method=request.method, route=route, status=int(status))
+            request_span.set_attribute('status', int(status))
+            request_span.end()
             return response
         except Exception as e:
-            duration = time.time() - start_time
+            duration = time.perf_counter() - start_time
             logger.error(f"Request failed: {request.method} {request.path} - Duration: {duration:.2f}s - Error: {str(e)}")
+            status = getattr(e, 'status_code', HTTPStatus.INTERNAL_SERVER_ERROR)
+            if metrics.METRICS_ENABLED:
+                metrics.request_duration.observe(duration, method=request.method, route=route, status=int(status))
+            request_span.set_attribute('status', int(status))
+            request_span.end(error=e)
             raise
     
     return decorated_function
 
+def idempotent(scope):
+    """Run a request with an Idempotency-Key header once; retries get the same result
+
+    A retry while the first request is still running gets 409 with the job it
+    started, and reusing a key for a different request gets 422. Failed
+    requests release their key so they can be retried.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            key = request.headers.get('Idempotency-Key')
+            if not key:
+                return f(*args, **kwargs)
+            if not idempotency.KEY_PATTERN.match(key):
+                raise APIError('Invalid Idempotency-Key', HTTPStatus.BAD_REQUEST)
+
+            store = idempotency.IdempotencyStore(get_interface().db)
+            request_hash = idempotency.fingerprint(
+                request.method, request.path, request.args.to_dict(flat=False), request.get_json(silent=True)
+            )
+            outcome, stored_key, record = store.begin(scope, key, request_hash)
+            if outcome == 'conflict':
+                raise APIError('Idempotency-Key was already used for a different request', HTTPStatus.UNPROCESSABLE_ENTITY)
+            if outcome == 'in_progress':
+                response = jsonify({'status': 'in_progress', 'job_id': record.get('job_id')})
+                response.status_code = HTTPStatus.CONFLICT
+                response.headers['Retry-After'] = str(idempotency.IDEMPOTENCY_RETRY_AFTER)
+                return response
+            if outcome == 'replayed':
+                response = jsonify(record.get('body'))
+                response.status_code = record.get('status_code', HTTPStatus.OK)
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+
+            g.idempotency = (store, stored_key)
+            try:
+                response, status = f(*args, **kwargs)
+            except Exception:
+                store.abandon(stored_key)
+                raise
+            body = response.get_json(silent=True)
+            if int(status) < 300 and not (isinstance(body, dict) and body.get('status') == 'error'):
+                store.complete(stored_key, int(status), body)
+            else:
+                store.abandon(stored_key)
+            return response, status
+        return decorated_function
+    return decorator
+
+def annotate_idempotency(**fields):
+    """Attach the job a request starts to its Idempotency-Key, if it has one"""
+    if 'idempotency' in g:
+        store, stored_key = g.idempotency
+        store.annotate(stored_key, **fields)
+
+@app.before_request
+def start_profile():
+    """Profile this request when an authorized operator asks for it"""
+    mode = request.args.get('profile') or request.headers.get('X-Profile')
+    if not mode:
+        return
+    if not profiling.authorized(request.headers.get('X-Profile-Token')):
+        raise APIError('Profiling not authorized', HTTPStatus.FORBIDDEN)
+
+    body = request.get_json(silent=True) if request.is_json else None
+    body = body if isinstance(body, dict) else {}
+    assets = body.get('assets') if isinstance(body.get('assets'), list) else []
+    asset = (request.view_args or {}).get('asset_name') or body.get('asset_name') or '-'.join(map(str, assets))
+    route = request.url_rule.rule if request.url_rule else request.path
+    g.profile = profiling.RequestProfile(route, asset, mode)
+
+@app.after_request
+def encode_response(response):
+    if 'trace_id' in g:
+        response.headers['X-Trace-Id'] = g.trace_id
+    if 'profile' in g:
+        response.headers['X-Profile-File'] = g.profile.filename
+    return compress_response(response)
+
+@app.teardown_request
+def finish_profile(error):
+    profile = g.pop('profile', None)
+    if profile:
+        profile.finish()
+
 @app.errorhandler(APIError)
 def handle_api_error(error):
     logger.error(f"API Error: {error.message} (Status: {error.status_code})")
@@ -56,62 +177,190 @@ def handle_unexpected_error(error):
     return response
 
 @app.route('/health')
+@app.route('/health/ready')
 def health_check():
-    """Health check endpoint for Render"""
+    """Readiness check for Render: unhealthy until this worker has warmed up"""
     try:
-        # Add any critical service checks here
+        ready = warmup.is_ready()
         return jsonify({
-            'status': 'healthy',
+            'status': 'healthy' if ready else 'warming',
             'timestamp': time.time(),
-            'environment': os.environ.get('FLASK_ENV', 'production')
-        }), HTTPStatus.OK
+            'environment': os.environ.get('FLASK_ENV', 'production'),
+            'warmup': warmup.status(),
+            'pretrain': scheduler.status(),
+            'llm_cache': llm_cache.get_cache().stats() if llm_cache.get_cache() else {'enabled': False},
+            'llm_providers': providers.status()
+        }), HTTPStatus.OK if ready else HTTPStatus.SERVICE_UNAVAILABLE
     except Exception as e:
         logger.error(f"Health check failed: {str(e)}")
         return jsonify({'status': 'unhealthy'}), HTTPStatus.SERVICE_UNAVAILABLE
 
+@app.route('/health/live')
+def liveness_check():
+    """Liveness check: the worker process is up and serving"""
+    return jsonify({
+        'status': 'alive',
+        'timestamp': time.time(),
+        'pid': os.getpid()
+    }), HTTPStatus.OK
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Per-stage latency histograms in Prometheus text format, for the worker that answers
+
+    Metrics are kept per gunicorn worker and labelled with its pid, so one
+    scrape only covers one worker. Aggregate across workers in queries,
+    e.g. sum without (worker), and expect new series when a worker restarts.
+    """
+    if not metrics.METRICS_ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), HTTPStatus.NOT_FOUND
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def durable_requested(data=None) -> bool:
+    """Whether the client asked to wait until results are committed to storage, from the body or query"""
+    value = (data or {}).get('durable', request.args.get('durable', 'false'))
+    return str(value).lower() == 'true'
+
+def analysis_arguments():
+    """Validated request_analysis arguments from the body and query of an analysis request"""
+    data = request.json
+    if not data:
+        raise APIError("No JSON data provided", HTTPStatus.BAD_REQUEST)
+    
+    logger.debug(f"Analysis request received for data: {data}")
+    
+    if 'asset_name' not in data:
+        raise APIError("Missing asset_name in request", HTTPStatus.BAD_REQUEST)
+    
+    client_type = request.args.get('client_type')
+    if not client_type in ['mobile', 'web']:
+        raise APIError('Invalid client type', HTTPStatus.BAD_REQUEST)
+        
+    if client_type == 'web':
+        raise APIError('Analysis not available for web clients', HTTPStatus.FORBIDDEN)
+
+    job_id = data.get('job_id')
+    if job_id is not None and not JOB_ID_PATTERN.match(str(job_id)):
+        raise APIError('Invalid job_id', HTTPStatus.BAD_REQUEST)
+
+    model_preset = data.get('model_preset')
+    if model_preset is not None and str(model_preset).lower() not in providers.MODEL_PRESETS:
+        raise APIError(f'Invalid model_preset, expected one of {sorted(providers.MODEL_PRESETS)}', HTTPStatus.BAD_REQUEST)
+
+    # Resuming a job always runs it rather than serving a stored report.
+    force_refresh = job_id is not None or str(data.get('force_refresh', request.args.get('force_refresh', 'false'))).lower() == 'true'
+
+    mode = data.get('mode', 'full')
+    if mode not in ANALYSIS_MODES:
+        raise APIError(f'Invalid mode, expected one of {list(ANALYSIS_MODES)}', HTTPStatus.BAD_REQUEST)
+
+    durable = durable_requested(data)
+
+    return {
+        'asset_name': data['asset_name'],
+        'llm_choice': data.get('llm_choice', 'groq'),
+        'client_type': client_type,
+        'job_id': job_id,
+        'model_preset': model_preset,
+        'mode': mode,
+        'force_refresh': force_refresh,
+        'durable': durable
+    }
+
 @app.route('/api/analysis', methods=['POST'])
 @log_request
+@idempotent('analysis')
 def request_analysis():
     """Endpoint to request a new financial analysis"""
     try:
-        interface = FinancialInterface()
-        data = request.json
-        if not data:
-            raise APIError("No JSON data provided", HTTPStatus.BAD_REQUEST)
-        
-        logger.debug(f"Analysis request received for data: {data}")
+        interface = get_interface()
+        arguments = analysis_arguments()
+        arguments['job_id'] = arguments['job_id'] or str(uuid.uuid4())
+        annotate_idempotency(job_id=arguments['job_id'])
         
-        if 'asset_name' not in data:
-            raise APIError("Missing asset_name in request", HTTPStatus.BAD_REQUEST)
+        result = interface.request_analysis(**arguments)
         
-        client_type = request.args.get('client_type')
-        if not client_type in ['mobile', 'web']:
-            raise APIError('Invalid client type', HTTPStatus.BAD_REQUEST)
-            
-        if client_type == 'web':
-            raise APIError('Analysis not available for web clients', HTTPStatus.FORBIDDEN)
-            
-        llm_choice = data.get('llm_choice', 'groq')
-        
-        result = interface.request_analysis(
-            asset_name=data['asset_name'],
-            llm_choice=llm_choice,
-            client_type=client_type
-        )
-        
-        logger.info(f"Analysis completed successfully for asset: {data['asset_name']}")
+        logger.info(f"Analysis completed successfully for asset: {arguments['asset_name']}")
         return jsonify(result), HTTPStatus.OK
     
     except Exception as e:
         logger.error(f"Error in analysis request: {str(e)}", exc_info=True)
         raise APIError(str(e), HTTPStatus.INTERNAL_SERVER_ERROR)
 
+@app.route('/api/analysis/stream', methods=['POST'])
+@log_request
+def stream_analysis():
+    """Run an analysis and stream the final report to the client as server-sent events
+
+    Events: started (job_id), token (report text as it is generated), reset
+    (discard the text so far), then done with the stored report or error.
+    """
+    interface = get_interface()
+    arguments = analysis_arguments()
+    arguments['job_id'] = arguments['job_id'] or str(uuid.uuid4())
+
+    report_stream = streaming.ReportStream()
+    report_stream.publish('started', {'job_id': arguments['job_id'], 'asset_name': arguments['asset_name']})
+    streaming.start(report_stream, interface.request_analysis, **arguments)
+
+    return Response(
+        stream_with_context(report_stream.events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/analysis/batch', methods=['POST'])
+@log_request
+def request_batch_analysis():
+    """Start analyses for a watchlist in the background; poll the batch for per-asset results"""
+    data = request.get_json(silent=True)
+    if not data or 'assets' not in data:
+        raise APIError('Missing assets list or watchlist name', HTTPStatus.BAD_REQUEST)
+
+    if request.args.get('client_type') != 'mobile':
+        raise APIError('Analysis only available for mobile clients', HTTPStatus.FORBIDDEN)
+
+    interface = get_interface()
+    try:
+        assets = batch.resolve_assets(interface.price_predictions, data['assets'])
+    except ValueError as e:
+        raise APIError(str(e), HTTPStatus.BAD_REQUEST)
+
+    force_refresh = str(data.get('force_refresh', request.args.get('force_refresh', 'false'))).lower() == 'true'
+    batch_id = batch.start(interface, assets, data.get('llm_choice', 'groq'), force_refresh=force_refresh)
+    logger.info(f"Batch analysis {batch_id} started for {len(assets)} assets")
+    return jsonify({'status': 'accepted', 'batch_id': batch_id, 'assets': assets}), HTTPStatus.ACCEPTED
+
+@app.route('/api/analysis/batch/<batch_id>', methods=['GET'])
+@log_request
+def get_batch_analysis(batch_id):
+    """Progress of a batch analysis, with the report id of each finished asset; failed if its worker died"""
+    status = get_interface().db.get_batch_status(batch_id)
+    if not status:
+        raise APIError('Batch not found', HTTPStatus.NOT_FOUND)
+    return jsonify(batch.current_status(status)), HTTPStatus.OK
+
+@app.route('/api/analysis/jobs/<job_id>/cancel', methods=['POST'])
+@log_request
+def cancel_analysis(job_id):
+    """Cancel a running analysis; what it finished is stored as a partial report"""
+    if request.args.get('client_type') != 'mobile':
+        raise APIError('Analysis only available for mobile clients', HTTPStatus.FORBIDDEN)
+    if not JOB_ID_PATTERN.match(job_id):
+        raise APIError('Invalid job_id', HTTPStatus.BAD_REQUEST)
+
+    result = get_interface().cancel_analysis(job_id)
+    if result['status'] == 'error':
+        raise APIError(result['message'], HTTPStatus.SERVICE_UNAVAILABLE)
+    logger.info(f"Cancellation requested for job {job_id}")
+    return jsonify(result), HTTPStatus.ACCEPTED
+
 @app.route('/api/analysis/<report_id>', methods=['GET'])
 @log_request
 def get_analysis_report(report_id):
     """Endpoint to retrieve analysis report (mobile only, final report only)"""
     try:
-        interface = FinancialInterface()
+        interface = get_interface()
         client_type = request.headers.get('X-Client-Type')
         logger.debug(f"Report request received for ID: {report_id}, Client: {client_type}")
         
@@ -138,14 +387,15 @@ def get_analysis_report(report_id):
 
 @app.route('/api/predictions/<asset_name>', methods=['GET'])
 @log_request
+@idempotent('prediction')
 def get_prediction(asset_name):
     """Endpoint for single asset prediction"""
     try:
-        interface = FinancialInterface()
+        interface = get_interface()
         timeframe = request.args.get('timeframe', default=30, type=int)
         logger.debug(f"Prediction request for asset: {asset_name}, timeframe: {timeframe}")
         
-        prediction = interface.get_single_prediction(asset_name, timeframe)
+        prediction = interface.get_single_prediction(asset_name, timeframe, durable=durable_requested())
         if prediction is None:
             raise APIError(f"No prediction available for {asset_name}", HTTPStatus.NOT_FOUND)
         
@@ -158,10 +408,11 @@ def get_prediction(asset_name):
 
 @app.route('/api/predictions/multiple', methods=['POST'])
 @log_request
+@idempotent('predictions')
 def get_multiple_predictions():
     """Endpoint for multiple asset predictions"""
     try:
-        interface = FinancialInterface()
+        interface = get_interface()
         data = request.get_json()
         if not data or 'assets' not in data:
             raise APIError('Missing assets list', HTTPStatus.BAD_REQUEST)
@@ -169,7 +420,7 @@ def get_multiple_predictions():
         logger.debug(f"Multiple predictions request received for assets: {data['assets']}")
         
         timeframe = data.get('timeframe', 30)
-        predictions = interface.get_multiple_predictions(data['assets'], timeframe)
+        predictions = interface.get_multiple_predictions(data['assets'], timeframe, durable=durable_requested(data))
         
         logger.info(f"Multiple predictions completed for {len(data['assets'])} assets")
         return jsonify(predictions), HTTPStatus.OK
@@ -178,6 +429,9 @@ def get_multiple_predictions():
         logger.error(f"Error in multiple predictions: {str(e)}", exc_info=True)
         raise APIError(str(e), HTTPStatus.INTERNAL_SERVER_ERROR)
 
+warmup.start()
+scheduler.start()
+
 if __name__ == '__main__':
     port = int(os.environ.get("PORT", 10000))  
     logger.info(f"Starting application on port {port}")
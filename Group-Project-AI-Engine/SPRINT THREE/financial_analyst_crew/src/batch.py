@@ -0,0 +1,207 @@
+import argparse
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import llm
+import ratios
+import tracing
+
+
+BATCH_MAX_CREWS = int(os.environ.get('BATCH_MAX_CREWS', 4))
+BATCH_LLM_CONCURRENCY = int(os.environ.get('BATCH_LLM_CONCURRENCY', 6))
+BATCH_MAX_ASSETS = int(os.environ.get('BATCH_MAX_ASSETS', 50))
+# Batch crews wait on a shared LLM budget and no gunicorn timeout applies, so by default they have no deadline.
+BATCH_ANALYSIS_DEADLINE_SECONDS = float(os.environ.get('BATCH_ANALYSIS_DEADLINE_SECONDS', 0))
+# A running batch rewrites its status at least this often; one not updated for BATCH_STALE_SECONDS lost its worker.
+BATCH_HEARTBEAT_SECONDS = float(os.environ.get('BATCH_HEARTBEAT_SECONDS', 30))
+BATCH_STALE_SECONDS = float(os.environ.get(
+    'BATCH_STALE_SECONDS', max(10 * BATCH_HEARTBEAT_SECONDS, BATCH_ANALYSIS_DEADLINE_SECONDS)
+))
+
+logger = logging.getLogger(__name__)
+
+# Shared by every batch in this process, so concurrent batches do not each get their own slots.
+llm_budget = threading.BoundedSemaphore(max(1, BATCH_LLM_CONCURRENCY))
+
+
+def resolve_assets(predictor, assets) -> list:
+    """A PricePredictions list name such as technology_stocks, or an explicit list of tickers."""
+    if isinstance(assets, str):
+        named = getattr(predictor, assets, None)
+        assets = list(named) if isinstance(named, list) else assets.split(',')
+    resolved = list(dict.fromkeys(str(asset).strip().upper() for asset in assets if str(asset).strip()))
+    if not resolved:
+        raise ValueError('No assets to analyse')
+    if len(resolved) > BATCH_MAX_ASSETS:
+        raise ValueError(f'At most {BATCH_MAX_ASSETS} assets per batch')
+    return resolved
+
+
+def current_status(status: dict) -> dict:
+    """A stored batch status, reported as failed if its worker stopped updating it before it finished."""
+    if status.get('state') not in ('pending', 'running') or not status.get('updated_at'):
+        return status
+    age = (datetime.now() - datetime.fromisoformat(status['updated_at'])).total_seconds()
+    if age <= BATCH_STALE_SECONDS:
+        return status
+    return {**status, 'state': 'failed', 'stale': True,
+            'message': f'The batch worker stopped after {len(status.get("results", {}))} of {len(status.get("assets", []))} assets'}
+
+
+class BatchAnalysis:
+    """Analyse many assets with shared context and one budget of concurrent LLM calls.
+
+    Market indicators, statements and price histories are fetched once up front,
+    then up to max_crews crews run at a time while their LLM calls share the
+    process-wide llm_budget with every other batch, or llm_concurrency slots of
+    their own when given. Each asset's report is stored, and the batch status
+    updated, as soon as that asset finishes. Fresh stored reports are reused
+    unless force_refresh is set.
+    """
+
+    def __init__(self, interface, assets: list, llm_choice: str = 'groq', batch_id: str = None,
+                 max_crews: int = BATCH_MAX_CREWS, llm_concurrency: int = None, on_result=None,
+                 force_refresh: bool = False):
+        self.interface = interface
+        self.assets = assets
+        self.llm_choice = llm_choice
+        self.force_refresh = force_refresh
+        self.batch_id = batch_id or str(uuid.uuid4())
+        self.max_crews = max(1, max_crews)
+        self.budget = llm_budget if llm_concurrency is None else threading.BoundedSemaphore(max(1, llm_concurrency))
+        self.on_result = on_result
+        self._lock = threading.Lock()
+        self.status = {
+            'batch_id': self.batch_id,
+            'state': 'pending',
+            'llm_choice': llm_choice,
+            'force_refresh': force_refresh,
+            'assets': assets,
+            'results': {},
+            'started_at': None,
+            'finished_at': None
+        }
+
+    def _publish(self):
+        with self._lock:
+            self.status['updated_at'] = datetime.now().isoformat()
+            snapshot = json.loads(json.dumps(self.status))
+        self.interface.db.store_batch_status(self.batch_id, snapshot)
+
+    @tracing.traced()
+    def prefetch_shared_context(self):
+        """Warm the caches every crew reads, vectorized across the whole batch."""
+        predictor = self.interface.price_predictions
+        try:
+            ratios.market_indicators(predictor)
+            ratios.compute_metrics(self.assets, predictor, {asset: predictor.asset_class(asset) for asset in self.assets})
+        except Exception as e:
+            logger.warning(f'Prefetching shared context for batch {self.batch_id} failed: {str(e)}')
+
+    def _analyse(self, asset: str) -> dict:
+        with llm.concurrency_budget(self.budget):
+            return self.interface.request_analysis(
+                asset_name=asset,
+                llm_choice=self.llm_choice,
+                client_type='mobile',
+                force_refresh=self.force_refresh,
+                deadline_seconds=BATCH_ANALYSIS_DEADLINE_SECONDS
+            )
+
+    def _record(self, asset: str, result: dict):
+        entry = {key: result[key] for key in ('status', 'report_id', 'message', 'job_id', 'reused') if key in result}
+        entry['finished_at'] = datetime.now().isoformat()
+        with self._lock:
+            self.status['results'][asset] = entry
+        self._publish()
+        if self.on_result:
+            self.on_result(asset, result)
+
+    @tracing.traced()
+    def run(self) -> dict:
+        with self._lock:
+            self.status.update(state='running', started_at=datetime.now().isoformat())
+        self._publish()
+        start = time.perf_counter()
+
+        self.prefetch_shared_context()
+        with ThreadPoolExecutor(max_workers=self.max_crews, thread_name_prefix='batch-crew') as executor:
+            futures = {
+                executor.submit(contextvars.copy_context().run, self._analyse, asset): asset
+                for asset in self.assets
+            }
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=BATCH_HEARTBEAT_SECONDS, return_when=FIRST_COMPLETED)
+                if not done:
+                    # Heartbeat, so pollers can tell a long crew from a dead worker.
+                    self._publish()
+                for future in done:
+                    asset = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {'status': 'error', 'message': str(e)}
+                    self._record(asset, result)
+
+        with self._lock:
+            self.status.update(
+                state='finished',
+                finished_at=datetime.now().isoformat(),
+                duration_seconds=round(time.perf_counter() - start, 3),
+                succeeded=sum(1 for entry in self.status['results'].values() if entry.get('status') == 'success')
+            )
+        self._publish()
+        return self.status
+
+
+def start(interface, assets: list, llm_choice: str = 'groq', force_refresh: bool = False) -> str:
+    """Run a batch in the background and return its id; progress is read back from the database."""
+    batch = BatchAnalysis(interface, assets, llm_choice, force_refresh=force_refresh)
+    batch._publish()
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(batch.run,), name=f'batch-{batch.batch_id[:8]}', daemon=True).start()
+    return batch.batch_id
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Analyse a watchlist of assets in one batch.')
+    parser.add_argument('assets', help='technology_stocks, crypto_assets or comma-separated tickers')
+    parser.add_argument('--llm', default='groq')
+    parser.add_argument('--max-crews', type=int, default=BATCH_MAX_CREWS)
+    parser.add_argument('--llm-concurrency', type=int, default=BATCH_LLM_CONCURRENCY)
+    parser.add_argument('--force-refresh', action='store_true', help='run every asset even if a fresh report is stored')
+    args = parser.parse_args(argv)
+
+    from financial_interface import get_interface
+
+    interface = get_interface()
+
+    def print_result(asset, result):
+        print(json.dumps({'asset': asset, **result}, default=str), flush=True)
+
+    batch = BatchAnalysis(
+        interface,
+        resolve_assets(interface.price_predictions, args.assets),
+        args.llm,
+        max_crews=args.max_crews,
+        llm_concurrency=args.llm_concurrency,
+        on_result=print_result,
+        force_refresh=args.force_refresh
+    )
+    status = batch.run()
+    print(json.dumps({key: value for key, value in status.items() if key != 'results'}), file=sys.stderr)
+    return 0 if status['succeeded'] == len(batch.assets) else 1
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,119 @@
+import ast
+import json
+import os
+import re
+from typing import Optional
+
+
+CONTEXT_MAX_CHARS = int(os.environ.get('CONTEXT_MAX_CHARS', 4000))
+
+_WHITESPACE = re.compile(r'\s+')
+_DECODER = json.JSONDecoder(strict=False)
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+_SMART_QUOTES = str.maketrans({'\u201c': '"', '\u201d': '"', '\u2018': "'", '\u2019': "'"})
+
+
+def _close_brackets(text: str) -> str:
+    """Append the closing quotes and brackets of an answer that was cut off."""
+    stack = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]' and stack:
+            stack.pop()
+    return text + ('"' if in_string else '') + ''.join(reversed(stack))
+
+
+def repair_json(text: str) -> Optional[dict]:
+    """Best-effort parse of a malformed object: smart quotes, trailing commas,
+    Python literals and single quotes, and truncated endings."""
+    start = text.find('{')
+    if start == -1:
+        return None
+    candidate = text[start:].translate(_SMART_QUOTES)
+    end = candidate.rfind('}')
+    candidates = [candidate[:end + 1]] if end != -1 else []
+    candidates.append(_close_brackets(candidate.rstrip().rstrip('`').rstrip().rstrip(',')))
+
+    for candidate in candidates:
+        candidate = _TRAILING_COMMA.sub(r'\1', candidate)
+        try:
+            value, _ = _DECODER.raw_decode(candidate)
+            if isinstance(value, dict):
+                return value
+        except ValueError:
+            pass
+        try:
+            value = ast.literal_eval(candidate)
+            if isinstance(value, dict):
+                return value
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            pass
+        literal = re.sub(r'\b(true|false|null)\b', lambda m: {'true': 'True', 'false': 'False', 'null': 'None'}[m.group(1)], candidate)
+        try:
+            value = ast.literal_eval(literal)
+            if isinstance(value, dict):
+                return value
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            pass
+    return None
+
+
+def extract_json(text: str) -> Optional[dict]:
+    """First JSON object in an agent's answer, ignoring any prose or code fences around it.
+
+    Falls back to repair_json when no object parses as it stands.
+    """
+    position = text.find('{')
+    while position != -1:
+        try:
+            value, _ = _DECODER.raw_decode(text, position)
+            if isinstance(value, dict):
+                return value
+        except ValueError:
+            pass
+        position = text.find('{', position + 1)
+    return repair_json(text)
+
+
+def _prune(value):
+    """Drop empty strings, lists, objects and nulls, which cost tokens and say nothing."""
+    if isinstance(value, dict):
+        pruned = {key: _prune(item) for key, item in value.items()}
+        return {key: item for key, item in pruned.items() if item not in (None, '', [], {})}
+    if isinstance(value, list):
+        return [item for item in (_prune(item) for item in value) if item not in (None, '', [], {})]
+    if isinstance(value, str):
+        return _WHITESPACE.sub(' ', value).strip()
+    return value
+
+
+def compact_output(raw: str, output_key: str, fields: list = None):
+    """The parts of a task output a downstream task needs, as a JSON-ready value.
+
+    The payload under output_key is narrowed to fields when given and pruned.
+    Answers without a JSON object fall back to whitespace-collapsed text capped
+    at CONTEXT_MAX_CHARS.
+    """
+    parsed = extract_json(raw)
+    if parsed is None:
+        return _WHITESPACE.sub(' ', raw).strip()[:CONTEXT_MAX_CHARS]
+
+    payload = parsed.get(output_key, parsed)
+    if fields and isinstance(payload, dict):
+        payload = {field: payload[field] for field in fields if field in payload}
+    return _prune(payload)
+
+
+def dumps(value) -> str:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
@@ -1,65 +1,203 @@
 import os
+import time
 import traceback
-from crewai import Crew, Process
-from langchain_groq import ChatGroq
-from langchain_ollama import OllamaLLM
-from langchain_openai import ChatOpenAI
+from contextlib import nullcontext
+from crewai.tasks.task_output import TaskOutput
 from agents import FinancialAgents
 from tasks import FinancialTasks
+from PricePredictions import PricePredictions
+import providers
+import compaction
+import deadlines
+import schemas
+from llm import TokenUsage, stream_tokens, track_usage
+import metrics
+import tracing
+
+CHECKPOINT_MAX_AGE = float(os.environ.get('CHECKPOINT_MAX_AGE', 6 * 3600))
+SCHEMA_MAX_REASKS = int(os.environ.get('SCHEMA_MAX_REASKS', 2))
+
+stopped_runs = metrics.registry.register(metrics.Counter(
+    'crew_stopped_total',
+    'Crew runs stopped before finishing, by reason.',
+    ('reason',)
+))
 
 class FinancialAnalystCrew:
-    def __init__(self, job_id: str, asset_name: str, llm_choice: str = 'groq'):
+    def __init__(self, job_id: str, asset_name: str, llm_choice: str = 'groq', checkpoints=None, model_preset: str = None,
+                 stream=None, deadline: deadlines.Deadline = None, predictor: PricePredictions = None):
         os.environ["USER_AGENT"] = "FinancialAnalystCrew/1.0"
 
         self.job_id = job_id
         self.asset_name = asset_name
         self.llm_choice = llm_choice.lower()
-        self.crew = None
+        self.model_preset = (model_preset or providers.DEFAULT_MODEL_PRESET).lower()
+        self.tier_choices = providers.tier_choices(self.model_preset)
+        self.tasks = None
+        self.graph = None
+        self.agents = None
+        self.task_factory = None
+        self.usage = TokenUsage()
+        self.checkpoints = checkpoints
+        self.resumed_tasks = []
+        self.stream = stream
+        self.deadline = deadline or deadlines.Deadline()
+        self.predictor = predictor or PricePredictions()
+        self.started_at = time.time()
+        self.outputs = {}
         self.llm_provider = self._setup_llm_provider()
 
     def _setup_llm_provider(self):
-        """Initialize the LLM provider based on user choice."""
-        if self.llm_choice == 'groq':
-            return 'groq/llama3-8b-8192'
-        elif self.llm_choice == 'gpt':
-            return ChatOpenAI(model="gpt-3.5-turbo", temperature=0.0)
-        elif self.llm_choice == 'ollama_llama2':
-            return OllamaLLM(model="llama2")
-        elif self.llm_choice == 'ollama_mistral':
-            return OllamaLLM(model="mistral")
-        else:
-            raise ValueError(f"Invalid LLM choice: {self.llm_choice}")
+        """Look up the shared LLM for the user's provider choice."""
+        return providers.get_llm(self.llm_choice)
 
+    @tracing.traced()
     def setup_crew(self):
-        """Set up the crew with initialized LLM provider."""
-        agents = FinancialAgents(self.llm_provider)
-        tasks = FinancialTasks(agents, self.asset_name)
-
-        self.crew = Crew(
-            agents=[
-                agents.researcher(),
-                agents.accountant(),
-                agents.recommender(),
-                agents.blogger()
-            ],
-            tasks=[
-                tasks.research_stock(),
-                tasks.analyze_stock(),
-                tasks.make_decision(),
-                tasks.output_report()
-            ],
-            process=Process.sequential,
-            verbose=True
-        )
+        """Set up the crew tasks and their dependency graph with the initialized LLM provider."""
+        self.agents = FinancialAgents(self.llm_provider, tier_choices=self.tier_choices)
+        self.task_factory = FinancialTasks(self.agents, self.asset_name, self.predictor)
+
+        self.graph = self.task_factory.graph()
+        self.tasks = {
+            name: self.task_factory.create_task(name)
+            for name in self.graph.order if not self.task_factory.is_computed(name)
+        }
+
+    def _task_context(self, name, upstream):
+        """Compact JSON of the upstream outputs, narrowed to the fields this task uses."""
+        context = {}
+        for dependency, output in upstream.items():
+            for key in self.graph.outputs[dependency]:
+                if key in self.graph.inputs[name]:
+                    fields = self.task_factory.context_fields(name, key)
+                    context[key] = compaction.compact_output(output.raw, key, fields)
+        return compaction.dumps(context) if context else None
+
+    def _load_checkpoints(self):
+        """Task outputs saved by an earlier attempt of this job that are safe to reuse.
+
+        A checkpoint is reused only if it is younger than CHECKPOINT_MAX_AGE,
+        belongs to the same asset and every task it depended on is reused too,
+        so the run resumes from the first incomplete task.
+        """
+        if self.checkpoints is None:
+            return {}
+
+        stored = self.checkpoints.get_task_checkpoints(self.job_id)
+        completed = {}
+        for name in self.graph.order:
+            checkpoint = stored.get(name)
+            if (checkpoint is None
+                    or checkpoint.get('asset_name') != self.asset_name
+                    or time.time() - checkpoint.get('created_at', 0) > CHECKPOINT_MAX_AGE
+                    or not all(dep in completed for dep in self.graph.dependencies[name])):
+                continue
+            completed[name] = TaskOutput(
+                name=name,
+                description=checkpoint['description'],
+                raw=checkpoint['raw'],
+                agent=checkpoint['agent']
+            )
+        return completed
+
+    def _save_checkpoint(self, name, output):
+        """Persist a validated task output, so a retry of this job can skip the task."""
+        if self.checkpoints is None:
+            return
+        self.checkpoints.store_task_checkpoint(self.job_id, name, {
+            'asset_name': self.asset_name,
+            'llm_choice': self.llm_choice,
+            'description': output.description,
+            'agent': output.agent,
+            'raw': output.raw,
+            'created_at': time.time()
+        })
+
+    def _check_stopped(self):
+        """Raise Cancelled once the deadline has passed or any worker stored a cancel for this job."""
+        if self.checkpoints is not None and not self.deadline.stopped():
+            cancellation = self.checkpoints.get_job_cancellation(self.job_id)
+            if cancellation and cancellation.get('requested_at', 0) >= self.started_at:
+                self.deadline.cancel()
+        self.deadline.check()
 
+    def _validate(self, name, output):
+        """Validate every output of a task, normalizing its raw text to the validated JSON."""
+        payloads = {}
+        for key in self.graph.outputs[name]:
+            payload, error = schemas.validate_output(key, output.raw)
+            if error:
+                return f"{key}: {error}"
+            payloads[key] = payload
+        output.raw = compaction.dumps(payloads)
+        output.json_dict = payloads
+        return None
+
+    def _run_task(self, name, upstream):
+        """Execute one task with the outputs of the tasks it depends on as context.
+
+        An answer that fails schema validation is sent back to the same agent
+        with the errors, up to SCHEMA_MAX_REASKS times, instead of failing the run.
+        The task producing final_report streams its tokens to self.stream, if set.
+        """
+        self._check_stopped()
+        agent_type = self.task_factory.agent_type(name)
+        labels = {}
+        if agent_type:
+            labels = {
+                'tier': self.agents.tier(agent_type),
+                'llm_provider': self.agents.llm_choice(agent_type) or self.llm_choice
+            }
+        streamed = self.stream is not None and 'final_report' in self.graph.outputs[name]
+        token_stream = stream_tokens(self.stream) if streamed else nullcontext()
+        with tracing.span(name, job_id=self.job_id, **labels) as task_span, token_stream:
+            with metrics.bind(**labels), metrics.stage(name), track_usage(self.usage, name, labels.get('tier', '')):
+                if name not in self.tasks:
+                    output = self.task_factory.run_computed(name)
+                    error = self._validate(name, output)
+                else:
+                    context = self._task_context(name, upstream)
+                    task_span.set_attribute('context_chars', len(context or ''))
+                    output = self.tasks[name].execute_sync(context=context)
+                    error = self._validate(name, output)
+                    reasks = 0
+                    while error and reasks < SCHEMA_MAX_REASKS:
+                        reasks += 1
+                        task_span.set_attribute('reasks', reasks)
+                        print(f"RE-ASKING {name} for job {self.job_id}: {error}")
+                        correction = (
+                            f"Your previous answer could not be used: {error}. "
+                            "Answer again with only the JSON object described in the expected output."
+                        )
+                        output = self.tasks[name].execute_sync(
+                            context=f"{context}\n\n{correction}" if context else correction
+                        )
+                        error = self._validate(name, output)
+                if error:
+                    raise ValueError(f"{name} output failed validation: {error}")
+        self._save_checkpoint(name, output)
+        self.outputs[name] = output
+        return output
+
+    @tracing.traced()
     def kickoff(self):
-        """Kick off the crew process."""
-        if not self.crew:
+        """Kick off the crew, running independent tasks concurrently.
+
+        If the deadline passes or the job is cancelled, the tasks finished so
+        far are returned as a partial result instead of an error.
+        """
+        if not self.tasks:
             return {"status": "error", "message": "CREW NOT SET UP"}
 
+        completed = {}
         try:
-            print(f"RUNNING CREW {self.job_id} with {self.llm_choice.upper()} LLM")
-            results = self.crew.kickoff()
+            print(f"RUNNING CREW {self.job_id} with {self.llm_choice.upper()} LLM, {self.model_preset} model preset")
+            completed = self._load_checkpoints()
+            self.resumed_tasks = list(completed)
+            if completed:
+                print(f"RESUMING CREW {self.job_id}, reusing {', '.join(completed)}")
+            with deadlines.bound(self.deadline):
+                results = self.graph.execute(self._run_task, completed=completed)
 
            
             structured_output = self.restructure_analysis_result(results)
@@ -67,43 +205,39 @@ class FinancialAnalystCrew:
             return structured_output
 
         except Exception as e:
+            reason = self.deadline.stopped()
+            if reason:
+                print(f"STOPPED CREW {self.job_id}: {reason}")
+                if metrics.METRICS_ENABLED:
+                    stopped_runs.inc(reason=reason)
+                return self.restructure_analysis_result({**completed, **self.outputs}, stopped_reason=reason)
+
             print(traceback.format_exc())
-            return {"status": "error", "message": str(e)}
+            return {
+                "status": "error",
+                "message": str(e),
+                "job_id": self.job_id,
+                "token_usage": self.usage.summary()
+            }
 
-    def restructure_analysis_result(self, results):
-        """Reorganize the results from the crew tasks into a structured format."""
-        structured_output = {
-            "status": "success",
-            "data": {}
-        }
+        finally:
+            self.agents.release()
 
-       
-        print("Raw Results from Crew:", results)
+    def restructure_analysis_result(self, results, stopped_reason=None):
+        """Reorganize the results from the crew tasks into a structured format."""
+        payloads = {}
+        for name, output in results.items():
+            for key in self.graph.outputs[name]:
+                payloads[key], _ = schemas.validate_output(key, output.raw)
 
-       
-        if isinstance(results, dict) and results.get("status") == "success":
-           
-            crew_output = results.get("unknown_type", None)
-
-            if crew_output:
-              
-                try:
-                    raw_content = crew_output.raw if hasattr(crew_output, 'raw') else None
-                    
-                    if raw_content:
-                       
-                        structured_output['data'] = {
-                           
-                            "research_findings": {
-                                "data_sources": raw_content.get('data_sources', []),
-                                "price_data": raw_content.get('price_data', {}),
-                                
-                            },
-                           
-                        }
-                except Exception as e:
-                    print(f"Error parsing crew output: {str(e)}")
-                    structured_output['status'] = 'error'
-                    structured_output['message'] = 'Failed to parse crew output.'
-
-        return structured_output
+        structured = {
+            "status": "partial" if stopped_reason else "success",
+            "data": schemas.build_report(payloads),
+            "token_usage": self.usage.summary(),
+            "resumed_tasks": self.resumed_tasks,
+            "model_preset": self.model_preset,
+            "agent_models": self.agents.assignments()
+        }
+        if stopped_reason:
+            structured.update(stopped_reason=stopped_reason, completed_tasks=list(results), job_id=self.job_id)
+        return structured
@@ -1,16 +1,54 @@
-from firebase_admin import credentials, firestore, initialize_app
+from firebase_admin import credentials, firestore, get_app, initialize_app
+from google.api_core.exceptions import AlreadyExists
 from datetime import datetime
 import logging
+import time
 from typing import Dict, Optional,  Any
 
+import metrics
+import tracing
+from storage import Storage
+from write_behind import WRITE_BEHIND_ACK_TIMEOUT, WRITE_BEHIND_ENABLED, WriteBehindQueue
+
+
+class Database(Storage):
+    """Firestore storage, with report and prediction writes batched behind the request."""
 
-class Database:
     def __init__(self):
-        creds = credentials.Certificate('')
-        initialize_app(creds)
+        try:
+            get_app()
+        except ValueError:
+            creds = credentials.Certificate('')
+            initialize_app(creds)
         self.db = firestore.client()
+        self.writes = WriteBehindQueue(self._commit_batch) if WRITE_BEHIND_ENABLED else None
+
+    def _commit_batch(self, writes: list):
+        batch = self.db.batch()
+        for write in writes:
+            batch.set(self.db.collection(write.collection).document(write.document_id), write.data)
+        batch.commit()
+
+    def _write_behind(self, collection: str, document_id: str, data: dict, durable: bool):
+        """Queue a document write, or with durable wait until it is committed."""
+        if self.writes is None:
+            with metrics.stage('firestore_write'):
+                self.db.collection(collection).document(document_id).set(data)
+            return
+        future = self.writes.put(collection, document_id, data, urgent=durable)
+        if durable:
+            future.result(timeout=WRITE_BEHIND_ACK_TIMEOUT)
+
+    def write_position(self) -> int:
+        return self.writes.position() if self.writes is not None else 0
 
-    def store_analysis_report(self, asset_name: str, report: dict) -> str:
+    def flush(self, timeout: Optional[float] = WRITE_BEHIND_ACK_TIMEOUT, since: Optional[int] = None) -> bool:
+        """Commit every queued write; False if that did not finish within timeout or a write after since failed."""
+        return self.writes.flush(timeout, since) if self.writes is not None else True
+
+    @tracing.traced(record_args=('asset_name', 'durable'))
+    def store_analysis_report(self, asset_name: str, report: dict, durable: bool = False) -> str:
+        """Queue a report for the next batch commit; durable returns only once it is stored."""
         try:
             doc_ref = self.db.collection('analysis_reports').document()
             report.update({
@@ -18,14 +56,16 @@ class Database:
                 'timestamp': datetime.now().isoformat(),
                 'report_id': doc_ref.id
             })
-            doc_ref.set(report)
+            self._write_behind('analysis_reports', doc_ref.id, report, durable)
             logging.info(f'Stored analysis report for {asset_name} with ID: {doc_ref.id}')
             return doc_ref.id
         except Exception as e:
             logging.error(f'Error storing analysis report for {asset_name}: {str(e)}')
             return 'Error storing analysis'
 
-    def store_price_predictions(self, asset_name: str, prediction: dict) -> str:
+    @tracing.traced(record_args=('asset_name', 'durable'))
+    def store_price_predictions(self, asset_name: str, prediction: dict, durable: bool = False) -> str:
+        """Queue predictions for the next batch commit; durable returns only once they are stored."""
         try:
             doc_ref = self.db.collection('price_predictions').document()
             prediction.update({
@@ -33,13 +73,14 @@ class Database:
                 'timestamp': datetime.now().isoformat(),
                 'prediction_id': doc_ref.id
             })
-            doc_ref.set(prediction)
+            self._write_behind('price_predictions', doc_ref.id, prediction, durable)
             logging.info(f'Stored price predictions for {asset_name} with ID: {doc_ref.id}')
             return doc_ref.id
         except Exception as e:
             logging.error(f'Error storing price predictions for {asset_name}: {str(e)}')
             return 'Error storing price predictions'
 
+    @tracing.traced(record_args=('asset_name',))
     def get_historical_data(self, asset_name: str, limit: int = 100) -> list:
         try:
             docs = (self.db.collection('historical_data')
@@ -52,8 +93,145 @@ class Database:
             logging.error(f'Error getting historical data for {asset_name}: {str(e)}')
             return []
 
+    @tracing.traced(record_args=('asset_name',))
+    def get_recent_analysis_reports(self, asset_name: str, limit: int = 5) -> list:
+        """Newest stored analysis reports for an asset, newest first.
+
+        Needs the composite index on asset_name and timestamp declared in
+        firestore.indexes.json; without it the query fails and nothing is reused.
+        """
+        try:
+            with metrics.stage('firestore_read'):
+                docs = (self.db.collection('analysis_reports')
+                        .where('asset_name', '==', asset_name)
+                        .order_by('timestamp', direction='DESCENDING')
+                        .limit(limit)
+                        .stream())
+                return [doc.to_dict() for doc in docs]
+        except Exception as e:
+            logging.error(f'Error getting recent analysis reports for {asset_name}: {str(e)}')
+            return []
+
+    @tracing.traced(record_args=('job_id', 'task_name'))
+    def store_task_checkpoint(self, job_id: str, task_name: str, checkpoint: dict) -> bool:
+        """Save one crew task's output under its job so a retry can resume."""
+        try:
+            doc_ref = (self.db.collection('crew_checkpoints').document(job_id)
+                       .collection('tasks').document(task_name))
+            with metrics.stage('firestore_write'):
+                doc_ref.set(checkpoint)
+            return True
+        except Exception as e:
+            logging.error(f'Error storing checkpoint {task_name} for job {job_id}: {str(e)}')
+            return False
+
+    @tracing.traced(record_args=('job_id',))
+    def get_task_checkpoints(self, job_id: str) -> Dict[str, Dict[str, Any]]:
+        """Every checkpointed task output for a job, by task name."""
+        try:
+            docs = self.db.collection('crew_checkpoints').document(job_id).collection('tasks').stream()
+            return {doc.id: doc.to_dict() for doc in docs}
+        except Exception as e:
+            logging.error(f'Error getting checkpoints for job {job_id}: {str(e)}')
+            return {}
+
+    @tracing.traced(record_args=('batch_id',))
+    def store_batch_status(self, batch_id: str, status: dict) -> bool:
+        """Overwrite the progress document of a batch analysis."""
+        try:
+            with metrics.stage('firestore_write'):
+                self.db.collection('analysis_batches').document(batch_id).set(status)
+            return True
+        except Exception as e:
+            logging.error(f'Error storing status for batch {batch_id}: {str(e)}')
+            return False
+
+    @tracing.traced(record_args=('batch_id',))
+    def get_batch_status(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        return self._get_document('analysis_batches', batch_id)
+
+    @tracing.traced(record_args=('job_id',))
+    def store_job_cancellation(self, job_id: str, cancellation: dict) -> bool:
+        """Record a cancel request, so the worker running the job stops it at its next task."""
+        try:
+            with metrics.stage('firestore_write'):
+                self.db.collection('job_cancellations').document(job_id).set(cancellation)
+            return True
+        except Exception as e:
+            logging.error(f'Error storing cancellation for job {job_id}: {str(e)}')
+            return False
+
+    @tracing.traced(record_args=('job_id',))
+    def get_job_cancellation(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            doc = self.db.collection('job_cancellations').document(job_id).get()
+            return doc.to_dict() if doc.exists else None
+        except Exception as e:
+            logging.error(f'Error getting cancellation for job {job_id}: {str(e)}')
+            return None
+
+    @tracing.traced()
+    def claim_idempotency_key(self, key: str, record: dict) -> Optional[Dict[str, Any]]:
+        """Store record under key unless an unexpired one exists.
+
+        Returns None once the key is claimed, or the record already holding it.
+        If Firestore is unavailable the key counts as claimed, so requests still run.
+        """
+        doc_ref = self.db.collection('idempotency_keys').document(key)
+        try:
+            with metrics.stage('firestore_write'):
+                doc_ref.create(record)
+            return None
+        except AlreadyExists:
+            pass
+        except Exception as e:
+            logging.error(f'Error claiming idempotency key {key}: {str(e)}')
+            return None
+
+        # An expired key is reclaimed in a transaction, so of two retries arriving
+        # after it lapsed one claims it and the other sees that claim.
+        @firestore.transactional
+        def reclaim(transaction) -> Optional[Dict[str, Any]]:
+            snapshot = doc_ref.get(transaction=transaction)
+            existing = snapshot.to_dict() or {}
+            if snapshot.exists and existing.get('expires_at', 0) > time.time():
+                return existing
+            transaction.set(doc_ref, record)
+            return None
+
+        try:
+            with metrics.stage('firestore_write'):
+                return reclaim(self.db.transaction())
+        except Exception as e:
+            logging.error(f'Error reclaiming expired idempotency key {key}: {str(e)}')
+        return None
+
+    @tracing.traced()
+    def update_idempotency_key(self, key: str, changes: dict) -> bool:
+        try:
+            with metrics.stage('firestore_write'):
+                self.db.collection('idempotency_keys').document(key).set(changes, merge=True)
+            return True
+        except Exception as e:
+            logging.error(f'Error updating idempotency key {key}: {str(e)}')
+            return False
+
+    @tracing.traced()
+    def release_idempotency_key(self, key: str) -> bool:
+        try:
+            with metrics.stage('firestore_write'):
+                self.db.collection('idempotency_keys').document(key).delete()
+            return True
+        except Exception as e:
+            logging.error(f'Error releasing idempotency key {key}: {str(e)}')
+            return False
+
     def _get_document(self, collection_name: str, document_id: str) -> Optional[Dict[str, Any]]:
         """Utility function to retrieve a document from a Firestore collection."""
+        if self.writes is not None:
+            queued = self.writes.get(collection_name, document_id)
+            if queued is not None:
+                return queued
         try:
             doc = self.db.collection(collection_name).document(document_id).get()
             if doc.exists:
@@ -65,6 +243,7 @@ class Database:
             logging.error(f'Error retrieving document from {collection_name} with ID {document_id}: {str(e)}')
             return None  
 
+    @tracing.traced(record_args=('report_id',))
     def get_analysis_report(self, report_id: str) -> Optional[Dict[str, Any]]:
         """Retrieve an analysis report by its ID."""
         document_data = self._get_document('analysis_reports', report_id)
@@ -75,6 +254,7 @@ class Database:
             return None  
 
 
+    @tracing.traced(record_args=('prediction_id',))
     def get_price_predictions(self, prediction_id: str) -> Optional[Dict[str, Any]]:
         """Retrieve price predictions by its ID."""
         document_data=  self._get_document('price_predictions', prediction_id)
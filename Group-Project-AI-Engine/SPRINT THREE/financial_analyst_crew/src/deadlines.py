@@ -0,0 +1,158 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+
+# Below gunicorn's 120 s worker timeout, so a run stops and saves what it has before the worker is killed.
+ANALYSIS_DEADLINE_SECONDS = float(os.environ.get('ANALYSIS_DEADLINE_SECONDS', 100))
+
+_current = contextvars.ContextVar('analysis_deadline', default=None)
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+
+class Cancelled(Exception):
+    """An analysis was stopped by its deadline or an explicit cancel."""
+
+    def __init__(self, reason: str):
+        super().__init__(f'Analysis stopped: {reason}')
+        self.reason = reason
+
+
+class Deadline:
+    """Wall-clock budget of one analysis, which can also be cancelled early.
+
+    Checked cooperatively: before every crew task and LLM call, while waiting
+    to retry, and between streamed chunks. LLM calls get the remaining time as
+    their timeout, so no call outlives the budget.
+    """
+
+    def __init__(self, seconds: Optional[float] = ANALYSIS_DEADLINE_SECONDS):
+        self.expires_at = time.monotonic() + seconds if seconds else None
+        self._cancelled = threading.Event()
+        self.reason = None
+
+    def remaining(self) -> Optional[float]:
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def cancel(self, reason: str = 'cancelled'):
+        self.reason = self.reason or reason
+        self._cancelled.set()
+
+    def stopped(self) -> Optional[str]:
+        """Why the analysis must stop, or None while it may continue."""
+        if self._cancelled.is_set():
+            return self.reason
+        if self.expires_at is not None and time.monotonic() >= self.expires_at:
+            return 'deadline_exceeded'
+        return None
+
+    def check(self):
+        reason = self.stopped()
+        if reason:
+            raise Cancelled(reason)
+
+    def sleep(self, seconds: float):
+        """Sleep, waking up early to raise Cancelled when the analysis is stopped."""
+        remaining = self.remaining()
+        self._cancelled.wait(seconds if remaining is None else min(seconds, remaining))
+        self.check()
+
+
+@contextmanager
+def bound(deadline: Optional[Deadline]):
+    """Make deadline the one checked by work done inside this block, in this context."""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def current() -> Optional[Deadline]:
+    return _current.get()
+
+
+def check():
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.check()
+
+
+def sleep(seconds: float):
+    deadline = _current.get()
+    if deadline is None:
+        time.sleep(seconds)
+    else:
+        deadline.sleep(seconds)
+
+
+def timeout(default: Optional[float]) -> Optional[float]:
+    """An LLM call's timeout, capped by what is left of the current deadline.
+
+    Raises Cancelled rather than returning 0, which litellm would read as no timeout.
+    """
+    deadline = _current.get()
+    if deadline is None:
+        return default
+    deadline.check()
+    remaining = deadline.remaining()
+    if remaining is None:
+        return default
+    return min(default, remaining) if default else remaining
+
+
+def acquire(lock, poll: float = 1.0):
+    """Acquire a lock or semaphore, raising Cancelled instead if the analysis stops while waiting."""
+    deadline = _current.get()
+    if deadline is None:
+        lock.acquire()
+        return
+    while True:
+        remaining = deadline.remaining()
+        if lock.acquire(timeout=poll if remaining is None else min(poll, remaining)):
+            break
+        deadline.check()
+    try:
+        deadline.check()
+    except Cancelled:
+        lock.release()
+        raise
+
+
+@contextmanager
+def held(lock):
+    """Hold a lock or semaphore acquired within the current deadline."""
+    acquire(lock)
+    try:
+        yield lock
+    finally:
+        lock.release()
+
+
+@contextmanager
+def registered(job_id: str, deadline: Deadline):
+    """Let cancel(job_id) reach this worker's run of the job."""
+    with _jobs_lock:
+        _jobs[job_id] = deadline
+    try:
+        yield deadline
+    finally:
+        with _jobs_lock:
+            if _jobs.get(job_id) is deadline:
+                del _jobs[job_id]
+
+
+def cancel(job_id: str) -> bool:
+    """Cancel a job running in this worker; False if it is not running here."""
+    with _jobs_lock:
+        deadline = _jobs.get(job_id)
+    if deadline is None:
+        return False
+    deadline.cancel()
+    return True
@@ -1,69 +1,212 @@
 from typing import Dict, List, Optional
+from contextlib import nullcontext
 from datetime import datetime
+import logging
+import os
+import threading
+import time
 import uuid
 from crew import FinancialAnalystCrew
+from quick import QuickAnalysis
 from PricePredictions import PricePredictions
-from database import Database
+from encoding import encode_prediction_series
+import deadlines
+import llm
+import metrics
+import providers
+import storage
+import tracing
+
+ANALYSIS_MODES = ('full', 'quick')
+
+Database = storage.backend()
+
+# How long a stored report is served instead of running a new analysis, per asset class.
+REPORT_FRESHNESS = {
+    'stock': float(os.environ.get('REPORT_FRESHNESS_STOCK', 6 * 3600)),
+    'crypto': float(os.environ.get('REPORT_FRESHNESS_CRYPTO', 3600))
+}
+REPORT_REUSE_CANDIDATES = int(os.environ.get('REPORT_REUSE_CANDIDATES', 5))
+
+report_reuse = metrics.registry.register(metrics.Counter(
+    'analysis_report_reuse_total',
+    'Analysis requests answered from a stored report or by a new run, by asset class.',
+    ('asset_class', 'outcome')
+))
+
+_interface = None
+_interface_lock = threading.Lock()
+
+
+def get_interface() -> 'FinancialInterface':
+    """Process-wide interface, so clients and caches are created once per worker."""
+    global _interface
+    if _interface is None:
+        with _interface_lock:
+            if _interface is None:
+                _interface = FinancialInterface()
+    return _interface
 
 class FinancialInterface:
     def __init__(self):
         self.price_predictions = PricePredictions()
         self.db = Database()
 
-    def request_analysis(self, asset_name: str, llm_choice: str, client_type: str) -> Dict:
-        """Request a new analysis following the collection structure"""
+    def fresh_report(self, asset_name: str, llm_choice: str, mode: str, model_preset: Optional[str]) -> Optional[Dict]:
+        """Newest complete stored report of the same kind still inside its asset class's freshness window."""
+        window = REPORT_FRESHNESS.get(self.price_predictions.asset_class(asset_name), 0)
+        if window <= 0:
+            return None
+        model_preset = (model_preset or providers.DEFAULT_MODEL_PRESET).lower()
+        for report in self.db.get_recent_analysis_reports(asset_name, REPORT_REUSE_CANDIDATES):
+            metadata = report.get('metadata') or {}
+            try:
+                age = (datetime.now() - datetime.fromisoformat(report['timestamp'])).total_seconds()
+            except (KeyError, TypeError, ValueError):
+                logging.warning(f"Skipping stored report {report.get('report_id')} for {asset_name} without a valid timestamp")
+                continue
+            if age > window:
+                return None
+            if (metadata.get('llm_used') == llm_choice
+                    and metadata.get('analysis_type', 'full_analysis') == f'{mode}_analysis'
+                    and metadata.get('model_preset') == model_preset
+                    and not metadata.get('partial')):
+                return {**report, 'age_seconds': round(age)}
+        return None
+
+    @tracing.traced(record_args=('asset_name', 'llm_choice', 'model_preset', 'mode', 'force_refresh', 'durable'))
+    def request_analysis(self, asset_name: str, llm_choice: str, client_type: str, job_id: Optional[str] = None,
+                         model_preset: Optional[str] = None, stream=None, mode: str = 'full',
+                         force_refresh: bool = False, durable: bool = False,
+                         deadline_seconds: Optional[float] = deadlines.ANALYSIS_DEADLINE_SECONDS) -> Dict:
+        """Request a new analysis following the collection structure
+
+        Passing the job_id of a failed analysis resumes it from its checkpointed tasks.
+        model_preset picks the LLM for each agent tier, e.g. 'fast' for quicker mobile results.
+        A streaming.ReportStream passed as stream receives the final report's tokens as they are generated.
+        mode 'quick' skips the crew for a single LLM call over cached data, with the same report structure.
+        A run stopped by its deadline or cancel_analysis stores the finished sections as a partial report.
+        deadline_seconds defaults to the interactive budget; 0 or None runs without one, e.g. for batches.
+        A fresh stored report of the same kind is returned instead of a new run unless force_refresh is set,
+        in which case LLM calls also bypass the response cache.
+        The report is stored in the background unless durable asks to wait until it is committed.
+        """
         try:
             if client_type != 'mobile':
                 raise ValueError("Analysis only available for mobile clients")
+            if mode not in ANALYSIS_MODES:
+                raise ValueError(f"Invalid analysis mode: {mode}")
 
-            
-            job_id = str(uuid.uuid4())
-            crew = FinancialAnalystCrew(job_id=job_id, asset_name=asset_name, llm_choice=llm_choice)
-            crew.setup_crew()
-            analysis_result = crew.kickoff()
+            labels = {
+                'asset_class': self.price_predictions.asset_class(asset_name),
+                'llm_provider': llm_choice
+            }
+            if not force_refresh:
+                with metrics.bind(**labels):
+                    report = self.fresh_report(asset_name, llm_choice, mode, model_preset)
+                if metrics.METRICS_ENABLED:
+                    report_reuse.inc(asset_class=labels['asset_class'], outcome='reused' if report else 'generated')
+                if report:
+                    return {
+                        "status": "success",
+                        "report_id": report['report_id'],
+                        "final_report": report.get('final_report', {}),
+                        "reused": True,
+                        "age_seconds": report['age_seconds']
+                    }
+            elif metrics.METRICS_ENABLED:
+                report_reuse.inc(asset_class=labels['asset_class'], outcome='forced')
+
+            job_id = job_id or str(uuid.uuid4())
+            deadline = deadlines.Deadline(deadline_seconds)
+            refresh = llm.refreshing() if force_refresh else nullcontext()
+            with metrics.bind(**labels), deadlines.registered(job_id, deadline), refresh:
+                if mode == 'quick':
+                    analysis_result = QuickAnalysis(
+                        asset_name, llm_choice, model_preset, deadline=deadline, predictor=self.price_predictions
+                    ).run()
+                else:
+                    crew = FinancialAnalystCrew(
+                        job_id=job_id,
+                        asset_name=asset_name,
+                        llm_choice=llm_choice,
+                        checkpoints=self.db,
+                        model_preset=model_preset,
+                        stream=stream,
+                        deadline=deadline,
+                        predictor=self.price_predictions
+                    )
+                    crew.setup_crew()
+                    analysis_result = crew.kickoff()
+
+            if analysis_result.get('status') == 'error':
+                return {"status": "error", "message": analysis_result.get('message'), "job_id": job_id}
+            data = analysis_result['data']
 
            
             full_analysis_report = {
                 'asset_name': asset_name,
                 'timestamp': datetime.now(),
                 'metadata': {
+                    'trace_id': tracing.current_trace_id(),
+                    'job_id': job_id,
+                    'token_usage': analysis_result.get('token_usage', {}),
+                    'resumed_tasks': analysis_result.get('resumed_tasks', []),
                     'llm_used': llm_choice,
-                    'tools_used': ['YahooFinance', 'WebSearch'],
-                    'analysis_type': 'full_analysis'
+                    'model_preset': analysis_result.get('model_preset'),
+                    'agent_models': analysis_result.get('agent_models', {}),
+                    'tools_used': ['YahooFinance'] if mode == 'quick' else ['YahooFinance', 'WebSearch'],
+                    'analysis_type': f'{mode}_analysis',
+                    'elapsed_seconds': analysis_result.get('elapsed_seconds'),
+                    'slo_met': analysis_result.get('slo_met'),
+                    'partial': analysis_result.get('status') == 'partial',
+                    'stopped_reason': analysis_result.get('stopped_reason'),
+                    'completed_tasks': analysis_result.get('completed_tasks')
                 },
                 'agent_processing': {
-                    'researcher_complete': True,
-                    'accountant_complete': True,
-                    'recommender_complete': True,
-                    'blogger_complete': True
+                    'researcher_complete': any(data['research_findings'].values()),
+                    'accountant_complete': 'financial_analysis' in data,
+                    'recommender_complete': 'recommendation' in data,
+                    'blogger_complete': 'final_report' in data
                 },
-                'research_findings': analysis_result.get('research', {}),
-                'financial_analysis': analysis_result.get('financial', {}),
-                'recommendation': analysis_result.get('recommendation', {}),
-                'final_report': {
-                    'executive_summary': analysis_result.get('executive_summary', ''),
-                    'sections': {
-                        'overview': analysis_result.get('overview', ''),
-                        'research_findings': analysis_result.get('research_summary', ''),
-                        'financial_analysis': analysis_result.get('financial_summary', ''),
-                        'recommendation': analysis_result.get('recommendation_summary', '')
-                    },
-                    'disclaimers': analysis_result.get('disclaimers', [])
-                }
+                'research_findings': data['research_findings'],
+                'financial_analysis': data.get('financial_analysis', {}),
+                'recommendation': data.get('recommendation', {}),
+                'final_report': data.get('final_report', {})
             }
 
            
-            report_id = self.db.store_analysis_report(asset_name, full_analysis_report)
+            with metrics.bind(**labels):
+                report_id = self.db.store_analysis_report(asset_name, full_analysis_report, durable=durable)
             
            
-            return {
-                "status": "success",
+            result = {
+                "status": analysis_result['status'],
                 "report_id": report_id,
-                "final_report": full_analysis_report['final_report']
+                "final_report": full_analysis_report['final_report'],
+                "reused": False,
+                "age_seconds": 0
             }
+            if analysis_result['status'] == 'partial':
+                result.update(job_id=job_id, stopped_reason=analysis_result['stopped_reason'])
+            return result
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
+    @tracing.traced(record_args=('job_id',))
+    def cancel_analysis(self, job_id: str) -> Dict:
+        """Stop a running analysis; the tasks it has finished are stored as a partial report.
+
+        The job is stopped at once if it runs in this worker. The stored
+        request reaches a job in any other worker at its next task.
+        """
+        running_here = deadlines.cancel(job_id)
+        stored = self.db.store_job_cancellation(job_id, {'requested_at': time.time()})
+        if not (running_here or stored):
+            return {"status": "error", "message": "Could not record the cancellation", "job_id": job_id}
+        return {"status": "success", "job_id": job_id, "running_here": running_here}
+
+    @tracing.traced(record_args=('report_id',))
     def get_analysis_report(self, report_id: str, client_type: str) -> Dict:
         """Retrieve analysis report"""
         try:
@@ -83,52 +226,66 @@ class FinancialInterface:
         except Exception as e:
             return {"status": "error", "message": str(e)}
 
-    def get_single_prediction(self, asset_name: str, timeframe: int = 30) -> Dict:
-        """Get price prediction for a single asset"""
+    @tracing.traced(record_args=('asset_name', 'timeframe', 'durable'))
+    def get_single_prediction(self, asset_name: str, timeframe: int = 30, durable: bool = False) -> Dict:
+        """Get price prediction for a single asset; durable waits until it is stored"""
         try:
             
-            prediction_result = self.price_predictions.predictions(
-                asset=asset_name,
-                prediction_timeframe=timeframe
-            )
+            labels = {
+                'asset_class': self.price_predictions.asset_class(asset_name),
+                'timeframe': timeframe
+            }
+            with metrics.bind(**labels):
+                prediction_result = self.price_predictions.predictions(
+                    asset=asset_name,
+                    prediction_timeframe=timeframe
+                )
             
             if prediction_result is None:
                 return {}
 
-           
+            series = encode_prediction_series(
+                prediction_result['Predictions'],
+                prediction_result['Dates']
+            )
             prediction_data = {
-                'predictions': prediction_result['Predictions'].tolist(),
-                'dates': [d.strftime('%Y-%m-%d') for d in prediction_result['Dates']],
+                **series,
                 'timeframe': timeframe,
-                'timestamp': datetime.now()
+                'timestamp': datetime.now(),
+                'trace_id': tracing.current_trace_id()
             }
-            
-           
-            prediction_id = self.db.store_price_predictions(
-                asset_name=asset_name,
-                prediction=prediction_data
-            )
+
+            with metrics.bind(**labels):
+                prediction_id = self.db.store_price_predictions(
+                    asset_name=asset_name,
+                    prediction=dict(prediction_data),
+                    durable=durable
+                )
 
             return {
                 "asset_name": asset_name,
                 "prediction_id": prediction_id,
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": prediction_data['timestamp'].isoformat(),
                 "timeframe": timeframe,
-                "predictions": prediction_result['Predictions'].tolist(),
-                "dates": [d.strftime('%Y-%m-%d') for d in prediction_result['Dates']]
+                **series
             }
         except Exception as e:
             raise Exception(f"Failed to get prediction for {asset_name}: {str(e)}")
 
-    def get_multiple_predictions(self, asset_list: List[str], timeframe: int = 30) -> Dict:
-        """Get predictions for multiple assets"""
+    @tracing.traced(record_args=('timeframe', 'durable'))
+    def get_multiple_predictions(self, asset_list: List[str], timeframe: int = 30, durable: bool = False) -> Dict:
+        """Get predictions for multiple assets; their writes share batch commits, and durable waits once for all of them"""
         try:
             predictions = {}
+            position = self.db.write_position()
             for asset in asset_list:
                 prediction = self.get_single_prediction(asset, timeframe)
                 if prediction:
                     predictions[asset] = prediction
 
+            if durable and not self.db.flush(since=position):
+                raise Exception("Predictions were not stored")
+
             return {
                 "timestamp": datetime.now().isoformat(),
                 "timeframe": timeframe,
@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+import re
+import time
+from typing import Optional, Tuple
+
+import deadlines
+import metrics
+
+
+IDEMPOTENCY_TTL = float(os.environ.get('IDEMPOTENCY_TTL', 24 * 3600))
+# How long an in-progress claim holds its key: past the analysis deadline and gunicorn's timeout,
+# so a key whose worker was killed mid-request can be claimed again by a retry.
+IDEMPOTENCY_LEASE = float(os.environ.get('IDEMPOTENCY_LEASE', deadlines.ANALYSIS_DEADLINE_SECONDS + 60))
+IDEMPOTENCY_RETRY_AFTER = int(os.environ.get('IDEMPOTENCY_RETRY_AFTER', 5))
+
+KEY_PATTERN = re.compile(r'^[\x21-\x7e]{1,255}$')
+
+idempotent_requests = metrics.registry.register(metrics.Counter(
+    'idempotent_requests_total',
+    'Requests carrying an Idempotency-Key, by route scope and outcome.',
+    ('scope', 'outcome')
+))
+
+
+def fingerprint(method: str, path: str, args: dict, body) -> str:
+    """Hash of everything that makes two requests the same request."""
+    payload = json.dumps({'method': method, 'path': path, 'args': args, 'body': body}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class IdempotencyStore:
+    """(Idempotency-Key, request fingerprint) to the job and response it produced, kept for IDEMPOTENCY_TTL.
+
+    The first request with a key claims it and runs; a retry with the same
+    payload gets the stored response, or "in progress" while the first one
+    is still running, and a different payload under the same key is refused.
+    A claim whose request never completes lapses after IDEMPOTENCY_LEASE.
+    """
+
+    def __init__(self, db, ttl: float = IDEMPOTENCY_TTL, lease: float = IDEMPOTENCY_LEASE):
+        self.db = db
+        self.ttl = ttl
+        self.lease = lease
+
+    @staticmethod
+    def storage_key(scope: str, key: str) -> str:
+        return hashlib.sha256(f'{scope}:{key}'.encode('utf-8')).hexdigest()
+
+    def begin(self, scope: str, key: str, request_hash: str) -> Tuple[str, str, Optional[dict]]:
+        """Claim a key; returns the outcome (new, replayed, in_progress or conflict), storage key and stored record."""
+        stored_key = self.storage_key(scope, key)
+        now = time.time()
+        existing = self.db.claim_idempotency_key(stored_key, {
+            'scope': scope,
+            'request_hash': request_hash,
+            'state': 'in_progress',
+            'created_at': now,
+            'expires_at': now + self.lease
+        })
+        if existing is None:
+            outcome = 'new'
+        elif existing.get('request_hash') != request_hash:
+            outcome = 'conflict'
+        elif existing.get('state') == 'completed':
+            outcome = 'replayed'
+        else:
+            outcome = 'in_progress'
+        if metrics.METRICS_ENABLED:
+            idempotent_requests.inc(scope=scope, outcome=outcome)
+        return outcome, stored_key, existing
+
+    def annotate(self, stored_key: str, **fields):
+        """Record the job a claimed key started, so retries can point at it."""
+        self.db.update_idempotency_key(stored_key, fields)
+
+    def complete(self, stored_key: str, status_code: int, body):
+        """Store the response for replay, kept for the full TTL."""
+        now = time.time()
+        self.db.update_idempotency_key(stored_key, {
+            'state': 'completed',
+            'status_code': status_code,
+            'body': body,
+            'completed_at': now,
+            'expires_at': now + self.ttl
+        })
+
+    def abandon(self, stored_key: str):
+        """Free a key whose request failed, so a retry runs it again."""
+        self.db.release_idempotency_key(stored_key)
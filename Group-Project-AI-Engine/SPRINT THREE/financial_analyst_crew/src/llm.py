@@ -0,0 +1,407 @@
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+import litellm
+from crewai import LLM
+
+import deadlines
+import llm_cache
+import metrics
+import tracing
+
+
+LLM_MAX_INFLIGHT = int(os.environ.get('LLM_MAX_INFLIGHT', 4))
+LLM_RATE_LIMIT_RETRIES = int(os.environ.get('LLM_RATE_LIMIT_RETRIES', 4))
+LLM_RETRY_BASE_DELAY = float(os.environ.get('LLM_RETRY_BASE_DELAY', 1.0))
+LLM_RETRY_MAX_DELAY = float(os.environ.get('LLM_RETRY_MAX_DELAY', 30.0))
+LLM_STATS_WINDOW = int(os.environ.get('LLM_STATS_WINDOW', 50))
+
+logger = logging.getLogger(__name__)
+
+inflight_calls = metrics.registry.register(metrics.Gauge(
+    'llm_inflight_calls',
+    'LLM calls currently running per provider.',
+    ('llm_provider',)
+))
+waiting_calls = metrics.registry.register(metrics.Gauge(
+    'llm_waiting_calls',
+    'LLM calls waiting for a free provider slot.',
+    ('llm_provider',)
+))
+rate_limited_calls = metrics.registry.register(metrics.Counter(
+    'llm_rate_limited_total',
+    'Rate-limit responses from providers by outcome.',
+    ('llm_provider', 'outcome')
+))
+tokens_used = metrics.registry.register(metrics.Counter(
+    'llm_tokens_total',
+    'Prompt and completion tokens by provider, crew task and model tier.',
+    ('llm_provider', 'task', 'tier', 'kind')
+))
+
+_usage_scope = contextvars.ContextVar('llm_usage_scope', default=None)
+_budget = contextvars.ContextVar('llm_concurrency_budget', default=None)
+_token_stream = contextvars.ContextVar('llm_token_stream', default=None)
+_refreshing = contextvars.ContextVar('llm_cache_refreshing', default=False)
+
+
+def max_inflight(provider: str) -> int:
+    """LLM_MAX_INFLIGHT_<PROVIDER> if set, otherwise LLM_MAX_INFLIGHT."""
+    return int(os.environ.get(f'LLM_MAX_INFLIGHT_{provider.upper()}', LLM_MAX_INFLIGHT))
+
+
+class ProviderLimiter:
+    """Caps in-flight calls to one provider and tracks how saturated it is."""
+
+    def __init__(self, provider: str, limit: int):
+        self.provider = provider
+        self.limit = max(1, limit)
+        self.inflight = 0
+        self.waiting = 0
+        self.rate_limited = 0
+        self._slots = threading.BoundedSemaphore(self.limit)
+        self._lock = threading.Lock()
+
+    def _publish(self):
+        if metrics.METRICS_ENABLED:
+            inflight_calls.set(self.inflight, llm_provider=self.provider)
+            waiting_calls.set(self.waiting, llm_provider=self.provider)
+
+    @contextmanager
+    def slot(self):
+        with self._lock:
+            self.waiting += 1
+            self._publish()
+        start = time.perf_counter()
+        try:
+            deadlines.acquire(self._slots)
+        except BaseException:
+            with self._lock:
+                self.waiting -= 1
+                self._publish()
+            raise
+        with self._lock:
+            self.waiting -= 1
+            self.inflight += 1
+            self._publish()
+        metrics.observe('llm_queue_wait', time.perf_counter() - start, llm_provider=self.provider)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.inflight -= 1
+                self._publish()
+            self._slots.release()
+
+    def record_rate_limit(self, outcome: str):
+        with self._lock:
+            self.rate_limited += 1
+        if metrics.METRICS_ENABLED:
+            rate_limited_calls.inc(llm_provider=self.provider, outcome=outcome)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'max_inflight': self.limit,
+                'inflight': self.inflight,
+                'waiting': self.waiting,
+                'rate_limited': self.rate_limited
+            }
+
+
+class ProviderStats:
+    """Rolling latency and error rate over the last LLM_STATS_WINDOW calls to one provider."""
+
+    def __init__(self, window: int = LLM_STATS_WINDOW):
+        self._calls = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool):
+        with self._lock:
+            self._calls.append((seconds, ok))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            calls = list(self._calls)
+        latencies = sorted(seconds for seconds, ok in calls if ok)
+
+        def percentile(q):
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else None
+
+        return {
+            'samples': len(calls),
+            'error_rate': sum(1 for _, ok in calls if not ok) / len(calls) if calls else 0.0,
+            'p50_seconds': percentile(0.5),
+            'p95_seconds': percentile(0.95)
+        }
+
+
+_limiters = {}
+_stats = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter(provider: str) -> ProviderLimiter:
+    """Process-wide limiter for a provider, shared by every crew."""
+    with _limiters_lock:
+        if provider not in _limiters:
+            _limiters[provider] = ProviderLimiter(provider, max_inflight(provider))
+        return _limiters[provider]
+
+
+def provider_stats(provider: str) -> ProviderStats:
+    with _limiters_lock:
+        if provider not in _stats:
+            _stats[provider] = ProviderStats()
+        return _stats[provider]
+
+
+def limiter_stats() -> dict:
+    with _limiters_lock:
+        limiters = dict(_limiters)
+        stats = dict(_stats)
+    return {
+        provider: {
+            **(limiters[provider].stats() if provider in limiters else {}),
+            **(stats[provider].snapshot() if provider in stats else {})
+        }
+        for provider in sorted(set(limiters) | set(stats))
+    }
+
+
+class TokenUsage:
+    """Prompt and completion tokens for one analysis, per task, provider and model tier."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def record(self, task: str, provider: str, prompt_tokens: int, completion_tokens: int,
+               cached: bool = False, tier: str = ''):
+        with self._lock:
+            entry = self._entries.setdefault((task, provider, tier), {
+                'prompt_tokens': 0, 'completion_tokens': 0, 'calls': 0, 'cached_calls': 0
+            })
+            entry['prompt_tokens'] += prompt_tokens
+            entry['completion_tokens'] += completion_tokens
+            entry['cached_calls' if cached else 'calls'] += 1
+
+    def summary(self) -> dict:
+        """Totals overall, by task, by provider and by tier, ready to store with a report."""
+        def add(totals, entry):
+            for name, value in entry.items():
+                totals[name] = totals.get(name, 0) + value
+            return totals
+
+        with self._lock:
+            entries = {key: dict(entry) for key, entry in self._entries.items()}
+        by_task, by_provider, by_tier, total = {}, {}, {}, {}
+        for (task, provider, tier), entry in entries.items():
+            add(by_task.setdefault(task, {}), entry)
+            add(by_provider.setdefault(provider, {}), entry)
+            if tier:
+                add(by_tier.setdefault(tier, {}), entry)
+            add(total, entry)
+        return {'total': total, 'by_task': by_task, 'by_provider': by_provider, 'by_tier': by_tier}
+
+
+@contextmanager
+def track_usage(usage: TokenUsage, task: str, tier: str = ''):
+    """Attribute LLM calls made inside this block to a task of an analysis and its model tier."""
+    token = _usage_scope.set((usage, task, tier))
+    try:
+        yield
+    finally:
+        _usage_scope.reset(token)
+
+
+def record_usage(provider: str, prompt_tokens: int, completion_tokens: int, cached: bool = False):
+    scope = _usage_scope.get()
+    usage, task, tier = scope or (None, '', '')
+    if usage is not None:
+        usage.record(task, provider, prompt_tokens, completion_tokens, cached, tier)
+    if metrics.METRICS_ENABLED and not cached:
+        tokens_used.inc(prompt_tokens, llm_provider=provider, task=task, tier=tier, kind='prompt')
+        tokens_used.inc(completion_tokens, llm_provider=provider, task=task, tier=tier, kind='completion')
+
+
+@contextmanager
+def concurrency_budget(budget: threading.Semaphore):
+    """Share one cap on concurrent LLM calls, across providers, by every crew run inside this block."""
+    token = _budget.set(budget)
+    try:
+        yield
+    finally:
+        _budget.reset(token)
+
+
+@contextmanager
+def stream_tokens(sink):
+    """Stream the text of LLM calls made inside this block into sink as it is generated.
+
+    sink.begin() is called at the start of every call and sink.feed(text)
+    with each piece of generated text.
+    """
+    token = _token_stream.set(sink)
+    try:
+        yield
+    finally:
+        _token_stream.reset(token)
+
+
+def streaming() -> bool:
+    return _token_stream.get() is not None
+
+
+@contextmanager
+def refreshing():
+    """LLM calls made inside this block skip cached responses and replace them with fresh ones."""
+    token = _refreshing.set(True)
+    try:
+        yield
+    finally:
+        _refreshing.reset(token)
+
+
+def _is_rate_limit(error: Exception) -> bool:
+    return isinstance(error, litellm.RateLimitError) or getattr(error, 'status_code', None) == 429
+
+
+def _retry_delay(attempt: int, error: Exception) -> float:
+    """Full-jitter exponential backoff, never shorter than the provider's Retry-After."""
+    delay = random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        retry_after = float(headers.get('retry-after', 0))
+    except (TypeError, ValueError):
+        retry_after = 0
+    return max(delay, min(retry_after, LLM_RETRY_MAX_DELAY))
+
+
+class ProviderLLM(LLM):
+    """crewAI LLM tagged with the provider choice it was created for."""
+
+    def __init__(self, provider: str, model: str, **kwargs):
+        super().__init__(model=model, **kwargs)
+        self.provider = provider
+
+    def call(self, messages, callbacks=None):
+        deadlines.check()
+        with tracing.span('llm_call', provider=self.provider, model=self.model) as call_span:
+            cache = llm_cache.get_cache()
+            key = llm_cache.cache_key(messages, self.model, self.temperature) if cache else None
+            if cache and not _refreshing.get():
+                cached = cache.get(key, self.provider)
+                if cached is not None:
+                    call_span.set_attribute('cache', 'hit')
+                    record_usage(self.provider, 0, 0, cached=True)
+                    sink = _token_stream.get()
+                    if sink is not None:
+                        sink.begin()
+                        sink.feed(cached)
+                    return cached
+
+            response = self._call_with_retries(messages, callbacks or [], call_span)
+
+            if cache and response:
+                cache.put(key, response, self.provider)
+            return response
+
+    def _call_with_retries(self, messages, callbacks, call_span):
+        """Call the provider within its in-flight limit, backing off on rate limits until the deadline."""
+        provider_limiter = limiter(self.provider)
+        budget = _budget.get()
+        attempt = 0
+        while True:
+            try:
+                with deadlines.held(budget) if budget else nullcontext(), provider_limiter.slot():
+                    with metrics.stage('llm_call', llm_provider=self.provider):
+                        started = time.perf_counter()
+                        try:
+                            response = self._complete(messages, callbacks)
+                        except Exception:
+                            provider_stats(self.provider).record(time.perf_counter() - started, ok=False)
+                            raise
+                        provider_stats(self.provider).record(time.perf_counter() - started, ok=True)
+                        return response
+            except Exception as e:
+                if not _is_rate_limit(e):
+                    raise
+                if attempt >= LLM_RATE_LIMIT_RETRIES:
+                    provider_limiter.record_rate_limit('exhausted')
+                    raise
+                provider_limiter.record_rate_limit('retried')
+                delay = _retry_delay(attempt, e)
+                attempt += 1
+                call_span.set_attribute('rate_limit_retries', attempt)
+                logger.warning(f'{self.provider} rate limited, retry {attempt} in {delay:.2f}s')
+                deadlines.sleep(delay)
+
+    def _completion_params(self, messages) -> dict:
+        """The litellm arguments crewAI's LLM.call would send, without Nones."""
+        params = {
+            'model': self.model,
+            'messages': messages,
+            'timeout': deadlines.timeout(self.timeout),
+            'temperature': self.temperature,
+            'top_p': self.top_p,
+            'n': self.n,
+            'stop': self.stop,
+            'max_tokens': self.max_tokens or self.max_completion_tokens,
+            'presence_penalty': self.presence_penalty,
+            'frequency_penalty': self.frequency_penalty,
+            'logit_bias': self.logit_bias,
+            'response_format': self.response_format,
+            'seed': self.seed,
+            'logprobs': self.logprobs,
+            'top_logprobs': self.top_logprobs,
+            'api_base': self.base_url,
+            'api_version': self.api_version,
+            'api_key': self.api_key,
+            'stream': False,
+            **self.kwargs
+        }
+        return {name: value for name, value in params.items() if value is not None}
+
+    def _complete(self, messages, callbacks):
+        """Send the messages to the provider; the only step that leaves the process.
+
+        Calls litellm directly rather than through LLM.call so the token usage
+        the provider reports can be recorded.
+        """
+        if callbacks:
+            self.set_callbacks(callbacks)
+        sink = _token_stream.get()
+        if sink is None:
+            response = litellm.completion(**self._completion_params(messages))
+        else:
+            response = self._complete_streaming(messages, sink)
+        usage = getattr(response, 'usage', None)
+        record_usage(
+            self.provider,
+            getattr(usage, 'prompt_tokens', 0) or 0,
+            getattr(usage, 'completion_tokens', 0) or 0
+        )
+        return response['choices'][0]['message']['content']
+
+    def _complete_streaming(self, messages, sink):
+        """Stream the completion into sink, then rebuild the full response from its chunks."""
+        sink.begin()
+        started = time.perf_counter()
+        chunks = []
+        for chunk in litellm.completion(**{**self._completion_params(messages), 'stream': True}):
+            if not chunks:
+                metrics.observe('llm_first_token', time.perf_counter() - started, llm_provider=self.provider)
+            # Leaving the loop closes the stream, so a stopped analysis stops generating too.
+            deadlines.check()
+            chunks.append(chunk)
+            text = chunk.choices[0].delta.content if chunk.choices else None
+            if text:
+                sink.feed(text)
+        return litellm.stream_chunk_builder(chunks, messages=messages)
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import metrics
+
+
+LLM_CACHE_ENABLED = os.environ.get('LLM_CACHE_ENABLED', 'true').lower() == 'true'
+LLM_CACHE_PATH = os.environ.get('LLM_CACHE_PATH', 'llm_cache.sqlite3')
+LLM_CACHE_TTL = float(os.environ.get('LLM_CACHE_TTL', 24 * 3600))
+LLM_CACHE_MAX_BYTES = int(os.environ.get('LLM_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+logger = logging.getLogger(__name__)
+
+cache_requests = metrics.registry.register(metrics.Counter(
+    'llm_cache_requests_total',
+    'LLM response cache lookups by result.',
+    ('result', 'llm_provider')
+))
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def cache_key(messages, model: str, temperature) -> str:
+    """Hash of the whitespace-normalized prompt, model name and temperature."""
+    normalized = [
+        {'role': message.get('role', ''), 'content': _WHITESPACE.sub(' ', str(message.get('content', ''))).strip()}
+        for message in messages
+    ]
+    payload = json.dumps({'messages': normalized, 'model': model, 'temperature': temperature}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """SQLite-backed exact-match cache with TTL expiry and least-recently-used size eviction."""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: float = LLM_CACHE_TTL, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._counter_lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, provider TEXT, response TEXT NOT NULL, '
+                'size INTEGER NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)'
+            )
+            connection.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def _count(self, result: str, provider: str):
+        with self._counter_lock:
+            if result == 'hit':
+                self.hits += 1
+            else:
+                self.misses += 1
+        if metrics.METRICS_ENABLED:
+            cache_requests.inc(result=result, llm_provider=provider)
+
+    def get(self, key: str, provider: str = '') -> Optional[str]:
+        now = time.time()
+        try:
+            with self._connection() as connection:
+                row = connection.execute(
+                    'SELECT response FROM responses WHERE key = ? AND created_at >= ?',
+                    (key, now - self.ttl)
+                ).fetchone()
+                if row is not None:
+                    connection.execute('UPDATE responses SET last_used = ? WHERE key = ?', (now, key))
+        except sqlite3.Error as e:
+            logger.warning(f'LLM cache lookup failed: {str(e)}')
+            row = None
+        self._count('hit' if row is not None else 'miss', provider)
+        return row[0] if row is not None else None
+
+    def put(self, key: str, response: str, provider: str = ''):
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        try:
+            with self._connection() as connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO responses (key, provider, response, size, created_at, last_used) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (key, provider, response, size, now, now)
+                )
+                connection.execute('DELETE FROM responses WHERE created_at < ?', (now - self.ttl,))
+                self._evict(connection)
+        except sqlite3.Error as e:
+            logger.warning(f'LLM cache write failed: {str(e)}')
+
+    def _evict(self, connection: sqlite3.Connection):
+        excess = connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0] - self.max_bytes
+        if excess <= 0:
+            return
+        evicted = []
+        for key, size in connection.execute('SELECT key, size FROM responses ORDER BY last_used'):
+            if excess <= 0:
+                break
+            evicted.append((key,))
+            excess -= size
+        connection.executemany('DELETE FROM responses WHERE key = ?', evicted)
+
+    def stats(self) -> dict:
+        with self._counter_lock:
+            lookups = self.hits + self.misses
+            stats = {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+        try:
+            entries, size = self._connection().execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+            stats.update(entries=entries, bytes=size, max_bytes=self.max_bytes)
+        except sqlite3.Error as e:
+            logger.warning(f'LLM cache stats failed: {str(e)}')
+        return stats
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[LLMResponseCache]:
+    """Process-wide response cache, or None when LLM_CACHE_ENABLED is false."""
+    global _response_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                _response_cache = LLMResponseCache()
+    return _response_cache
@@ -0,0 +1,184 @@
+import contextvars
+import cProfile
+import hmac
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL', 0.005))
+
+logger = logging.getLogger(__name__)
+
+# The profile of the request whose work runs in this context, carried into worker threads with the context.
+_current = contextvars.ContextVar('request_profile', default=None)
+
+
+def _slug(value) -> str:
+    return re.sub(r'[^A-Za-z0-9]+', '_', str(value)).strip('_')[:60] or 'none'
+
+
+def authorized(token: Optional[str]) -> bool:
+    """Profiling is only available when PROFILE_TOKEN is set and matches."""
+    if not PROFILE_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+
+
+class SamplingProfiler:
+    """Samples the request thread's and its worker threads' Python stacks at a fixed interval into collapsed stacks.
+
+    Worker thread stacks are rooted at the thread's name, e.g. crew-task_0.
+    """
+
+    extension = 'folded'
+
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.targets = {threading.get_ident(): None}
+        self.stacks = Counter()
+        self._targets_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+
+    def add_thread(self):
+        with self._targets_lock:
+            self.targets[threading.get_ident()] = threading.current_thread().name
+
+    def remove_thread(self):
+        with self._targets_lock:
+            self.targets.pop(threading.get_ident(), None)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            with self._targets_lock:
+                targets = dict(self.targets)
+            current_frames = sys._current_frames()
+            for ident, thread_name in targets.items():
+                frame = current_frames.get(ident)
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                if frames and thread_name:
+                    frames.append(thread_name)
+                if frames:
+                    self.stacks[';'.join(reversed(frames))] += 1
+
+    def write(self, path: str):
+        with open(path, 'w') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f'{stack} {count}\n')
+
+
+class DeterministicProfiler:
+    """cProfile wrapper writing pstats output, merged across the request thread and its worker threads.
+
+    Before Python 3.12 cProfile only sees the thread that enabled it, so each
+    worker thread gets its own profile, added to the output once the thread's
+    work is done. From 3.12 one profiler sees every thread and a second one
+    cannot be enabled, so worker threads are left to the request's profile.
+    """
+
+    extension = 'prof'
+
+    def __init__(self):
+        self._profile = cProfile.Profile()
+        self._workers = {}
+        self._finished = []
+        self._workers_lock = threading.Lock()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+
+    def add_thread(self):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            return
+        with self._workers_lock:
+            self._workers[threading.get_ident()] = profile
+
+    def remove_thread(self):
+        with self._workers_lock:
+            profile = self._workers.pop(threading.get_ident(), None)
+        if profile is not None:
+            profile.disable()
+            with self._workers_lock:
+                self._finished.append(profile)
+
+    def write(self, path: str):
+        stats = pstats.Stats(self._profile)
+        with self._workers_lock:
+            finished = list(self._finished)
+        for profile in finished:
+            stats.add(profile)
+        stats.dump_stats(path)
+
+
+class RequestProfile:
+    def __init__(self, route: str, asset: Optional[str], mode: str = 'sample'):
+        self.route = route
+        self.asset = asset
+        self.profiler = self._start(mode)
+        self.started_at = time.time()
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(self.started_at))
+        self.filename = f'{stamp}_{_slug(route)}_{_slug(asset)}_{os.getpid()}_{threading.get_ident()}.{self.profiler.extension}'
+        _current.set(self)
+
+    def _start(self, mode: str):
+        if mode == 'cprofile':
+            profiler = DeterministicProfiler()
+            try:
+                profiler.start()
+                return profiler
+            except ValueError as e:
+                # Python 3.12+ allows one active cProfile, e.g. while another request is being profiled.
+                logger.warning(f'cProfile unavailable for {self.route} ({self.asset}), sampling instead: {str(e)}')
+        profiler = SamplingProfiler()
+        profiler.start()
+        return profiler
+
+    def finish(self) -> str:
+        _current.set(None)
+        self.profiler.stop()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, self.filename)
+        self.profiler.write(path)
+        logger.info(f'Wrote profile for {self.route} ({self.asset}) to {path} after {time.time() - self.started_at:.2f}s')
+        return path
+
+
+@contextmanager
+def attached():
+    """Include the calling worker thread in the profile of the request whose context it runs in, if any."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    profile.profiler.add_thread()
+    try:
+        yield
+    finally:
+        profile.profiler.remove_thread()
@@ -0,0 +1,84 @@
+import os
+import threading
+
+import httpx
+import litellm
+
+from llm import ProviderLLM, limiter_stats
+from router import ROUTING_POLICIES, RoutedLLM
+
+
+OLLAMA_BASE_URL = os.environ.get('OLLAMA_BASE_URL', 'http://localhost:11434')
+LLM_HTTP_POOL_SIZE = int(os.environ.get('LLM_HTTP_POOL_SIZE', 20))
+LLM_HTTP_KEEPALIVE = float(os.environ.get('LLM_HTTP_KEEPALIVE', 60))
+LLM_HTTP_TIMEOUT = float(os.environ.get('LLM_HTTP_TIMEOUT', 600))
+
+PROVIDERS = {
+    'groq': {'model': 'groq/llama3-8b-8192'},
+    'groq_70b': {'model': 'groq/llama3-70b-8192'},
+    'gpt': {'model': 'gpt-3.5-turbo', 'temperature': 0.0},
+    'ollama_llama2': {'model': 'ollama/llama2', 'base_url': OLLAMA_BASE_URL},
+    'ollama_mistral': {'model': 'ollama/mistral', 'base_url': OLLAMA_BASE_URL}
+}
+
+MODEL_TIERS = ('fast', 'standard', 'strong')
+
+# LLM choice per agent tier under each preset; None keeps the llm_choice of the request.
+MODEL_PRESETS = {
+    'default': {'fast': None, 'standard': None, 'strong': None},
+    'tiered': {'fast': 'groq', 'standard': None, 'strong': None},
+    'fast': {'fast': 'groq', 'standard': 'groq', 'strong': 'groq_70b'}
+}
+DEFAULT_MODEL_PRESET = os.environ.get('DEFAULT_MODEL_PRESET', 'default').lower()
+
+_llms = {}
+_llms_lock = threading.Lock()
+_http_client = None
+
+
+def _install_http_pool():
+    """Give litellm one keep-alive connection pool for the whole process."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=LLM_HTTP_POOL_SIZE,
+                max_keepalive_connections=LLM_HTTP_POOL_SIZE,
+                keepalive_expiry=LLM_HTTP_KEEPALIVE
+            ),
+            timeout=LLM_HTTP_TIMEOUT
+        )
+        litellm.client_session = _http_client
+
+
+def get_llm(choice: str) -> ProviderLLM:
+    """Shared LLM for a provider or a routing policy, created on first use."""
+    choice = choice.lower()
+    if choice in ROUTING_POLICIES:
+        policy = ROUTING_POLICIES[choice]
+        candidates = {provider: get_llm(provider) for provider in policy['providers']}
+        with _llms_lock:
+            if choice not in _llms:
+                _llms[choice] = RoutedLLM(choice, candidates, hedge=policy['hedge'])
+            return _llms[choice]
+
+    if choice not in PROVIDERS:
+        raise ValueError(f"Invalid LLM choice: {choice}")
+    with _llms_lock:
+        if choice not in _llms:
+            _install_http_pool()
+            _llms[choice] = ProviderLLM(choice, **PROVIDERS[choice])
+        return _llms[choice]
+
+
+def tier_choices(preset: str) -> dict:
+    """LLM choice for each agent tier under a model preset, None where the crew's own LLM is kept."""
+    preset = (preset or DEFAULT_MODEL_PRESET).lower()
+    if preset not in MODEL_PRESETS:
+        raise ValueError(f"Invalid model preset: {preset}")
+    return dict(MODEL_PRESETS[preset])
+
+
+def status() -> dict:
+    """In-flight limits, saturation and rolling latency for every provider used so far."""
+    return limiter_stats()
@@ -0,0 +1,188 @@
+import contextvars
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import compaction
+import deadlines
+import metrics
+import providers
+import ratios
+import schemas
+import tracing
+from PricePredictions import PricePredictions
+from cache import TTLCache
+from llm import TokenUsage, track_usage
+
+
+QUICK_ANALYSIS_SLO_SECONDS = float(os.environ.get('QUICK_ANALYSIS_SLO_SECONDS', 10))
+QUICK_MAX_REASKS = int(os.environ.get('QUICK_MAX_REASKS', 1))
+QUICK_MAX_HEADLINES = int(os.environ.get('QUICK_MAX_HEADLINES', 8))
+NEWS_CACHE_TTL = float(os.environ.get('NEWS_CACHE_TTL', 1800))
+
+news_cache = TTLCache('news', ttl=NEWS_CACHE_TTL, max_entries=256)
+
+logger = logging.getLogger(__name__)
+
+slo_results = metrics.registry.register(metrics.Counter(
+    'quick_analysis_slo_total',
+    'Quick analyses by whether they finished within QUICK_ANALYSIS_SLO_SECONDS.',
+    ('outcome',)
+))
+
+QUICK_PROMPT = """You are a financial analyst giving a quick buy, sell or hold snapshot of {asset_name}.
+Base it only on the data below: computed financial ratios and price trends, broad market
+indicators and recent headlines. Say so when a figure is missing instead of guessing.
+
+DATA:
+{context}
+
+Answer with only a JSON object matching the quick_analysis schema: {{
+  "news_sentiment": "positive | negative | neutral",
+  "recommendation": {{
+    "decision": "buy | sell | hold",
+    "confidence_level": 0.0,
+    "rationale": "string",
+    "risk_factors": ["string"]
+  }},
+  "final_report": {{
+    "executive_summary": "string",
+    "sections": {{
+      "overview": "string",
+      "research_findings": "string",
+      "financial_analysis": "string",
+      "recommendation": "string"
+    }},
+    "disclaimers": ["string"]
+  }}
+}}"""
+
+
+def _headline(item: dict) -> str:
+    # yfinance has returned news both flat and nested under "content".
+    content = item.get('content') or item
+    title = content.get('title', '')
+    publisher = content.get('publisher') or (content.get('provider') or {}).get('displayName', '')
+    return f'{title} ({publisher})' if title and publisher else title
+
+
+def headlines(asset_name: str) -> list:
+    """Recent Yahoo Finance headlines for an asset, shared for NEWS_CACHE_TTL seconds."""
+    cached = news_cache.get(asset_name)
+    if cached is not None:
+        return cached
+    try:
+        with metrics.stage('news_fetch'):
+            items = ratios.yf.Ticker(asset_name).news or []
+    except Exception as e:
+        logger.warning(f'Fetching news for {asset_name} failed: {str(e)}')
+        return []
+    found = [text for text in (_headline(item) for item in items) if text][:QUICK_MAX_HEADLINES]
+    news_cache.set(asset_name, found)
+    return found
+
+
+class QuickAnalysis:
+    """Single-call analysis: cached metrics, market context and headlines in one compact prompt.
+
+    Returns the same final_report and recommendation structure as the crew,
+    in seconds rather than minutes, for a buy, sell or hold snapshot.
+    """
+
+    def __init__(self, asset_name: str, llm_choice: str = 'groq', model_preset: str = None,
+                 deadline: deadlines.Deadline = None, predictor: PricePredictions = None):
+        self.asset_name = asset_name
+        self.deadline = deadline or deadlines.Deadline()
+        self.predictor = predictor or PricePredictions()
+        self.llm_choice = llm_choice.lower()
+        self.model_preset = (model_preset or providers.DEFAULT_MODEL_PRESET).lower()
+        self.usage = TokenUsage()
+        self.llm_provider = self._setup_llm_provider()
+
+    def _setup_llm_provider(self):
+        """The LLM the preset gives the strong tier, which also makes the crew's decision."""
+        choice = providers.tier_choices(self.model_preset)['strong']
+        return providers.get_llm(choice or self.llm_choice)
+
+    @tracing.traced()
+    def gather_context(self) -> dict:
+        """Metrics, market indicators and headlines, fetched concurrently and mostly from cache.
+
+        Each fetch runs in a copy of the caller's context, so it keeps the
+        request's metric labels, trace span and deadline.
+        """
+        with ThreadPoolExecutor(max_workers=3, thread_name_prefix='quick-context') as executor:
+            figures = executor.submit(contextvars.copy_context().run, ratios.financial_metrics_report,
+                                      self.asset_name, self.predictor)
+            market = executor.submit(contextvars.copy_context().run, ratios.market_indicators, self.predictor)
+            news = executor.submit(contextvars.copy_context().run, headlines, self.asset_name)
+            return {
+                **json.loads(figures.result()),
+                'market_context': market.result(),
+                'headlines': news.result()
+            }
+
+    def _validate(self, raw: str):
+        payloads = {}
+        for key in ('recommendation', 'final_report'):
+            payload, error = schemas.validate_output(key, raw)
+            if error:
+                return None, f'{key}: {error}'
+            payloads[key] = payload
+        return payloads, None
+
+    @tracing.traced()
+    def run(self) -> dict:
+        start = time.perf_counter()
+        try:
+            with deadlines.bound(self.deadline), metrics.stage('quick_analysis'):
+                context = self.gather_context()
+                prompt = QUICK_PROMPT.format(asset_name=self.asset_name, context=compaction.dumps(context))
+                messages = [{'role': 'user', 'content': prompt}]
+                with track_usage(self.usage, 'quick_analysis'):
+                    raw = self.llm_provider.call(messages)
+                    payloads, error = self._validate(raw)
+                    for _ in range(QUICK_MAX_REASKS):
+                        if not error:
+                            break
+                        correction = (
+                            f'Your previous answer could not be used: {error}. '
+                            'Answer again with only the JSON object described above.'
+                        )
+                        messages = messages[:1] + [
+                            {'role': 'assistant', 'content': raw},
+                            {'role': 'user', 'content': correction}
+                        ]
+                        raw = self.llm_provider.call(messages)
+                        payloads, error = self._validate(raw)
+                if error:
+                    raise ValueError(f'quick analysis output failed validation: {error}')
+        except Exception as e:
+            logger.error(f'Quick analysis of {self.asset_name} failed: {str(e)}', exc_info=True)
+            return {'status': 'error', 'message': str(e), 'token_usage': self.usage.summary()}
+
+        elapsed = time.perf_counter() - start
+        slo_met = elapsed <= QUICK_ANALYSIS_SLO_SECONDS
+        if metrics.METRICS_ENABLED:
+            slo_results.inc(outcome='met' if slo_met else 'missed')
+        if not slo_met:
+            logger.warning(f'Quick analysis of {self.asset_name} took {elapsed:.1f}s, '
+                           f'over the {QUICK_ANALYSIS_SLO_SECONDS:.0f}s SLO')
+
+        payloads['financial_metrics'] = context['financial_metrics']
+        answer = compaction.extract_json(raw) or {}
+        payloads['news_analysis'] = {
+            'latest_news': context['headlines'],
+            'sentiment': answer.get('news_sentiment') or 'neutral',
+            'sources': ['Yahoo Finance'] if context['headlines'] else []
+        }
+        return {
+            'status': 'success',
+            'data': schemas.build_report(payloads),
+            'token_usage': self.usage.summary(),
+            'elapsed_seconds': round(elapsed, 3),
+            'slo_met': slo_met,
+            'model_preset': self.model_preset
+        }
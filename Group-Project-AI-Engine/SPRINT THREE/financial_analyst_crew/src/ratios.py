@@ -0,0 +1,234 @@
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+import metrics
+from cache import TTLCache
+
+
+FUNDAMENTALS_CACHE_TTL = float(os.environ.get('FUNDAMENTALS_CACHE_TTL', 24 * 3600))
+MARKET_CONTEXT_TTL = float(os.environ.get('MARKET_CONTEXT_TTL', 3600))
+TRADING_DAYS = 252
+
+fundamentals_cache = TTLCache('fundamentals', ttl=FUNDAMENTALS_CACHE_TTL, max_entries=256)
+market_cache = TTLCache('market_context', ttl=MARKET_CONTEXT_TTL, max_entries=4)
+
+logger = logging.getLogger(__name__)
+
+# Line items read from the yfinance annual statements, by statement attribute.
+STATEMENT_ITEMS = {
+    'income_stmt': {
+        'total_revenue': 'Total Revenue',
+        'cost_of_revenue': 'Cost Of Revenue',
+        'gross_profit': 'Gross Profit',
+        'operating_income': 'Operating Income',
+        'net_income': 'Net Income',
+        'ebit': 'EBIT',
+        'interest_expense': 'Interest Expense'
+    },
+    'balance_sheet': {
+        'total_assets': 'Total Assets',
+        'stockholders_equity': 'Stockholders Equity',
+        'current_assets': 'Current Assets',
+        'current_liabilities': 'Current Liabilities',
+        'inventory': 'Inventory',
+        'cash': 'Cash And Cash Equivalents',
+        'receivables': 'Accounts Receivable',
+        'total_debt': 'Total Debt',
+        'shares_outstanding': 'Ordinary Shares Number'
+    },
+    'cashflow': {
+        'dividends_paid': 'Cash Dividends Paid'
+    }
+}
+
+# Metric groups as they appear in the financial_analysis schema.
+RATIO_GROUPS = {
+    'profitability_ratios': ['return_on_equity', 'return_on_assets', 'profit_margin', 'operating_margin', 'gross_margin'],
+    'liquidity_ratios': ['current_ratio', 'quick_ratio', 'cash_ratio', 'working_capital'],
+    'solvency_ratios': ['debt_to_equity', 'debt_to_assets', 'interest_coverage', 'equity_multiplier'],
+    'efficiency_ratios': ['asset_turnover', 'inventory_turnover', 'receivables_turnover', 'days_sales_outstanding'],
+    'market_value_ratios': ['pe_ratio', 'price_to_book', 'dividend_yield', 'market_cap'],
+    'growth_metrics': ['revenue_growth', 'earnings_growth', 'dividend_growth', 'asset_growth']
+}
+# Broad market and macro series shared by every asset, by the name used in the context.
+MARKET_INDICATORS = {
+    '^GSPC': 'sp500',
+    '^IXIC': 'nasdaq',
+    '^VIX': 'vix',
+    '^TNX': 'us_10y_yield',
+    'BTC-USD': 'bitcoin'
+}
+TREND_COLUMNS = ['price', 'return_1y', 'return_3y', 'volatility_annualized', 'max_drawdown', 'price_vs_200d_average']
+FUNDAMENTAL_COLUMNS = [
+    column for rows in STATEMENT_ITEMS.values() for name in rows for column in (name, f'{name}_prior')
+]
+
+
+def _statement_values(statement, rows: dict) -> dict:
+    """Latest and prior fiscal year for each line item, NaN when yfinance has no row."""
+    values = {}
+    for name, row in rows.items():
+        series = pd.Series(dtype=float)
+        if isinstance(statement, pd.DataFrame) and row in statement.index:
+            series = statement.loc[row].sort_index(ascending=False)
+        values[name] = float(series.iloc[0]) if len(series) > 0 else np.nan
+        values[f'{name}_prior'] = float(series.iloc[1]) if len(series) > 1 else np.nan
+    return values
+
+
+def fetch_fundamentals(ticker: str) -> dict:
+    """Annual statement line items for a ticker, cached for FUNDAMENTALS_CACHE_TTL seconds."""
+    values = fundamentals_cache.get(ticker)
+    if values is None:
+        with metrics.stage('fundamentals_download'):
+            source = yf.Ticker(ticker)
+            values = {}
+            for attribute, rows in STATEMENT_ITEMS.items():
+                values.update(_statement_values(getattr(source, attribute, None), rows))
+        fundamentals_cache.set(ticker, values)
+    return values
+
+
+def _ratio(numerator, denominator):
+    return numerator / denominator.where(denominator != 0)
+
+
+def _growth(current, prior):
+    return _ratio(current - prior, prior.abs())
+
+
+def compute_ratios(fundamentals: pd.DataFrame, prices: pd.Series) -> pd.DataFrame:
+    """Every ratio in RATIO_GROUPS for all tickers at once.
+
+    fundamentals has one row per ticker with the FUNDAMENTAL_COLUMNS, prices
+    the latest close per ticker. Ratios that cannot be computed are NaN.
+    """
+    f = fundamentals.reindex(columns=FUNDAMENTAL_COLUMNS).astype(float)
+    price = prices.reindex(f.index).astype(float)
+    average_assets = f[['total_assets', 'total_assets_prior']].mean(axis=1)
+    dividends = f['dividends_paid'].abs()
+    market_cap = price * f['shares_outstanding']
+    eps = _ratio(f['net_income'], f['shares_outstanding'])
+
+    return pd.DataFrame({
+        'return_on_equity': _ratio(f['net_income'], f['stockholders_equity']),
+        'return_on_assets': _ratio(f['net_income'], average_assets),
+        'profit_margin': _ratio(f['net_income'], f['total_revenue']),
+        'operating_margin': _ratio(f['operating_income'], f['total_revenue']),
+        'gross_margin': _ratio(f['gross_profit'], f['total_revenue']),
+        'current_ratio': _ratio(f['current_assets'], f['current_liabilities']),
+        'quick_ratio': _ratio(f['current_assets'] - f['inventory'].fillna(0), f['current_liabilities']),
+        'cash_ratio': _ratio(f['cash'], f['current_liabilities']),
+        'working_capital': f['current_assets'] - f['current_liabilities'],
+        'debt_to_equity': _ratio(f['total_debt'], f['stockholders_equity']),
+        'debt_to_assets': _ratio(f['total_debt'], f['total_assets']),
+        'interest_coverage': _ratio(f['ebit'], f['interest_expense'].abs()),
+        'equity_multiplier': _ratio(f['total_assets'], f['stockholders_equity']),
+        'asset_turnover': _ratio(f['total_revenue'], average_assets),
+        'inventory_turnover': _ratio(f['cost_of_revenue'], f['inventory']),
+        'receivables_turnover': _ratio(f['total_revenue'], f['receivables']),
+        'days_sales_outstanding': _ratio(365 * f['receivables'], f['total_revenue']),
+        'pe_ratio': _ratio(price, eps.where(eps > 0)),
+        'price_to_book': _ratio(market_cap, f['stockholders_equity']),
+        'dividend_yield': _ratio(dividends, market_cap),
+        'market_cap': market_cap,
+        'revenue_growth': _growth(f['total_revenue'], f['total_revenue_prior']),
+        'earnings_growth': _growth(f['net_income'], f['net_income_prior']),
+        'dividend_growth': _growth(dividends, f['dividends_paid_prior'].abs()),
+        'asset_growth': _growth(f['total_assets'], f['total_assets_prior'])
+    }, index=f.index)
+
+
+def price_trends(closes: pd.DataFrame) -> pd.DataFrame:
+    """Return, volatility and drawdown per ticker from a date-by-ticker frame of closes."""
+    if closes.empty:
+        return pd.DataFrame(index=closes.columns, columns=TREND_COLUMNS, dtype=float)
+    closes = closes.sort_index().ffill()
+    last = closes.iloc[-1]
+    year_ago = closes.iloc[-TRADING_DAYS] if len(closes) >= TRADING_DAYS else closes.bfill().iloc[0]
+    daily_returns = np.log(closes).diff()
+
+    return pd.DataFrame({
+        'price': last,
+        'return_1y': last / year_ago - 1,
+        'return_3y': last / closes.bfill().iloc[0] - 1,
+        'volatility_annualized': daily_returns.std() * np.sqrt(TRADING_DAYS),
+        'max_drawdown': (closes / closes.cummax() - 1).min(),
+        'price_vs_200d_average': last / closes.rolling(200).mean().iloc[-1] - 1
+    })
+
+
+def _closing_prices(tickers: list, predictor) -> pd.DataFrame:
+    closes = {}
+    for ticker in tickers:
+        try:
+            closes[ticker] = predictor.price_history(ticker)['Close'].squeeze()
+        except Exception as e:
+            logger.warning(f'No price history for {ticker}: {str(e)}')
+    return pd.DataFrame(closes).reindex(columns=tickers)
+
+
+def compute_metrics(tickers: list, predictor, asset_classes: dict = None) -> pd.DataFrame:
+    """Ratios and price trends for many tickers, one row per ticker.
+
+    Fundamentals come from the statement cache and prices from the
+    predictor's shared price history cache; crypto assets only get price trends.
+    """
+    asset_classes = asset_classes or {}
+    with metrics.stage('ratio_engine'):
+        rows = {}
+        for ticker in tickers:
+            if asset_classes.get(ticker) == 'crypto':
+                continue
+            try:
+                rows[ticker] = fetch_fundamentals(ticker)
+            except Exception as e:
+                logger.warning(f'No fundamentals for {ticker}: {str(e)}')
+        fundamentals = pd.DataFrame.from_dict(rows, orient='index').reindex(index=tickers)
+
+        trends = price_trends(_closing_prices(tickers, predictor)).reindex(index=tickers)
+        return compute_ratios(fundamentals, trends['price']).join(trends)
+
+
+def _clean(value):
+    return None if pd.isna(value) else round(float(value), 4)
+
+
+def metrics_by_group(frame: pd.DataFrame, ticker: str) -> dict:
+    """One ticker's row shaped like the metric groups of the financial_analysis schema."""
+    row = frame.loc[ticker]
+    figures = {group: {name: _clean(row[name]) for name in names} for group, names in RATIO_GROUPS.items()}
+    figures['historical_trends'] = {name: _clean(row[name]) for name in TREND_COLUMNS}
+    return figures
+
+
+def financial_metrics_report(asset_name: str, predictor) -> str:
+    """Computed metrics for one asset as compact JSON, used as a crew task output."""
+    asset_class = predictor.asset_class(asset_name)
+    frame = compute_metrics([asset_name], predictor, {asset_name: asset_class})
+    figures = {'asset_class': asset_class, **metrics_by_group(frame, asset_name)}
+    return json.dumps({'financial_metrics': figures}, separators=(',', ':'))
+
+
+def market_indicators(predictor) -> dict:
+    """Price trends of MARKET_INDICATORS, fetched once and shared for MARKET_CONTEXT_TTL seconds."""
+    indicators = market_cache.get('indicators')
+    if indicators is None:
+        with metrics.stage('market_context'):
+            trends = price_trends(_closing_prices(list(MARKET_INDICATORS), predictor)).reindex(index=list(MARKET_INDICATORS))
+        indicators = {
+            name: {column: _clean(trends.loc[ticker, column]) for column in TREND_COLUMNS}
+            for ticker, name in MARKET_INDICATORS.items()
+        }
+        market_cache.set('indicators', indicators)
+    return indicators
+
+
+def market_context_report(asset_name: str, predictor) -> str:
+    """Market and macro indicators as compact JSON, the same for every asset."""
+    return json.dumps({'market_context': market_indicators(predictor)}, separators=(',', ':'))
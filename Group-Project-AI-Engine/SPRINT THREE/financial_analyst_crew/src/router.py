@@ -0,0 +1,161 @@
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import metrics
+import tracing
+from llm import ProviderLLM, provider_stats, streaming
+
+
+ROUTER_HEDGE = os.environ.get('ROUTER_HEDGE', 'false').lower() == 'true'
+ROUTER_HEDGE_MIN_DELAY = float(os.environ.get('ROUTER_HEDGE_MIN_DELAY', 1.0))
+ROUTER_HEDGE_DEFAULT_DELAY = float(os.environ.get('ROUTER_HEDGE_DEFAULT_DELAY', 5.0))
+ROUTER_HEDGE_WORKERS = int(os.environ.get('ROUTER_HEDGE_WORKERS', 16))
+ROUTER_MIN_SAMPLES = int(os.environ.get('ROUTER_MIN_SAMPLES', 5))
+ROUTER_MAX_ERROR_RATE = float(os.environ.get('ROUTER_MAX_ERROR_RATE', 0.5))
+ROUTER_PRIOR_LATENCY = float(os.environ.get('ROUTER_PRIOR_LATENCY', 10.0))
+
+# Provider sets an analysis may be routed across, selected with llm_choice.
+ROUTING_POLICIES = {
+    'auto': {'providers': ['groq', 'gpt', 'ollama_llama2', 'ollama_mistral'], 'hedge': ROUTER_HEDGE},
+    'hosted': {'providers': ['groq', 'gpt'], 'hedge': ROUTER_HEDGE},
+    'local': {'providers': ['ollama_llama2', 'ollama_mistral'], 'hedge': False},
+    'hedged': {'providers': ['groq', 'gpt'], 'hedge': True}
+}
+
+logger = logging.getLogger(__name__)
+
+routed_calls = metrics.registry.register(metrics.Counter(
+    'llm_routed_calls_total',
+    'LLM calls answered through the router, by provider and how it was reached.',
+    ('policy', 'llm_provider', 'route')
+))
+
+_hedge_pool = None
+_hedge_pool_lock = threading.Lock()
+
+
+def _executor() -> ThreadPoolExecutor:
+    global _hedge_pool
+    with _hedge_pool_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=ROUTER_HEDGE_WORKERS, thread_name_prefix='llm-hedge')
+        return _hedge_pool
+
+
+class Router:
+    """Send each call to the fastest healthy provider, failing over and optionally hedging.
+
+    candidates maps provider names to objects with call(messages, callbacks);
+    stats looks up a provider's rolling latency and error rate. Both can be
+    fakes, so the routing decisions can be exercised without any real LLM.
+    """
+
+    def __init__(self, policy: str, candidates: dict, hedge: bool = False, stats=provider_stats,
+                 hedge_min_delay: float = ROUTER_HEDGE_MIN_DELAY):
+        self.policy = policy
+        self.candidates = candidates
+        self.hedge = hedge and len(candidates) > 1
+        self.stats = stats
+        self.hedge_min_delay = hedge_min_delay
+
+    def _score(self, name: str):
+        snapshot = self.stats(name).snapshot()
+        known = snapshot['samples'] >= ROUTER_MIN_SAMPLES
+        healthy = not known or snapshot['error_rate'] <= ROUTER_MAX_ERROR_RATE
+        latency = snapshot['p95_seconds'] if known and snapshot['p95_seconds'] is not None else ROUTER_PRIOR_LATENCY
+        return (not healthy, latency)
+
+    def rank(self) -> list:
+        """Healthy providers by rolling p95 latency, then unhealthy ones as a last resort."""
+        return sorted(self.candidates, key=self._score)
+
+    def hedge_delay(self, name: str) -> float:
+        snapshot = self.stats(name).snapshot()
+        if snapshot['samples'] < ROUTER_MIN_SAMPLES or snapshot['p95_seconds'] is None:
+            return ROUTER_HEDGE_DEFAULT_DELAY
+        return max(self.hedge_min_delay, snapshot['p95_seconds'])
+
+    def _record(self, name: str, route: str):
+        if metrics.METRICS_ENABLED:
+            routed_calls.inc(policy=self.policy, llm_provider=name, route=route)
+
+    def call(self, messages, callbacks=None):
+        ranked = self.rank()
+        with tracing.span('llm_route', policy=self.policy, primary=ranked[0]) as route_span:
+            # Two answers streaming into the same response would interleave.
+            if self.hedge and not streaming():
+                name, response = self._call_hedged(ranked, messages, callbacks)
+            else:
+                name, response = self._call_in_order(ranked, messages, callbacks)
+            route_span.set_attribute('provider', name)
+            return response
+
+    def _call_in_order(self, ranked, messages, callbacks):
+        last_error = None
+        for position, name in enumerate(ranked):
+            try:
+                response = self.candidates[name].call(messages, callbacks)
+                self._record(name, 'primary' if position == 0 else 'failover')
+                return name, response
+            except Exception as e:
+                logger.warning(f'{name} failed for policy {self.policy}: {str(e)}')
+                last_error = e
+        raise last_error
+
+    def _call_hedged(self, ranked, messages, callbacks):
+        """Start the best provider, add the next one if it has not answered within its p95,
+        and return whichever succeeds first. A failed call fails over immediately.
+
+        Blocking HTTP calls cannot be cancelled, so the slower call runs to
+        completion in the background and its answer is discarded.
+        """
+        executor = _executor()
+        waiting = list(ranked)
+        running = {}
+        last_error = None
+
+        def launch(route):
+            name = waiting.pop(0)
+            context = contextvars.copy_context()
+            running[executor.submit(context.run, self.candidates[name].call, messages, callbacks)] = (name, route)
+
+        launch('primary')
+        timeout = self.hedge_delay(ranked[0])
+        while running:
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            timeout = None
+            if not done:
+                if waiting:
+                    launch('hedge')
+                continue
+            for future in done:
+                name, route = running.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    logger.warning(f'{name} failed for policy {self.policy}: {str(e)}')
+                    last_error = e
+                    if waiting and not running:
+                        launch('failover')
+                    continue
+                self._record(name, route)
+                return name, response
+        raise last_error
+
+
+class RoutedLLM(ProviderLLM):
+    """crewAI LLM that routes every call across the providers of a policy."""
+
+    def __init__(self, policy: str, candidates: dict, hedge: bool = False):
+        first = next(iter(candidates.values()))
+        super().__init__(policy, model=first.model, temperature=first.temperature)
+        self.router = Router(policy, candidates, hedge=hedge)
+
+    def call(self, messages, callbacks=None):
+        # crewAI sets the agent's stop words on the LLM it was given; pass them on.
+        for candidate in self.router.candidates.values():
+            candidate.stop = self.stop
+        return self.router.call(messages, callbacks)
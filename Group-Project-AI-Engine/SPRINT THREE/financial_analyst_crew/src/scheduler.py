@@ -0,0 +1,212 @@
+import fcntl
+import logging
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+import metrics
+
+
+PRETRAIN_ENABLED = os.environ.get('PRETRAIN_ENABLED', 'true').lower() == 'true'
+PRETRAIN_TIME_UTC = os.environ.get('PRETRAIN_TIME_UTC', '21:30')
+PRETRAIN_CONCURRENCY = int(os.environ.get('PRETRAIN_CONCURRENCY', 1))
+PRETRAIN_NICE = int(os.environ.get('PRETRAIN_NICE', 10))
+PRETRAIN_MODE = os.environ.get('PRETRAIN_MODE', 'retrain').lower()
+PRETRAIN_TF_THREADS = int(os.environ.get('PRETRAIN_TF_THREADS', 2))
+
+logger = logging.getLogger(__name__)
+
+_state = {
+    'next_run': None,
+    'last_run_started': None,
+    'last_run_finished': None,
+    'last_run_trained': 0,
+    'last_run_errors': [],
+    'running': False
+}
+_state_lock = threading.Lock()
+_started_pid = None
+_stop = threading.Event()
+
+
+def next_run_after(now: datetime) -> datetime:
+    """Next occurrence of PRETRAIN_TIME_UTC strictly after now."""
+    hour, minute = (int(part) for part in PRETRAIN_TIME_UTC.split(':'))
+    candidate = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if candidate <= now:
+        candidate += timedelta(days=1)
+    return candidate
+
+
+def watchlist(predictor) -> list:
+    """Every (asset, timeframe) pair for the stock and crypto lists."""
+    assets = predictor.technology_stocks + predictor.crypto_assets
+    return [(asset, timeframe) for asset in assets for timeframe in predictor.prediction_timeframes]
+
+
+def _lower_priority():
+    # Runs in the training process before TensorFlow starts its thread pools, which inherit the niceness.
+    try:
+        os.nice(PRETRAIN_NICE)
+    except OSError as e:
+        logger.debug(f'Could not lower pre-training priority: {str(e)}')
+
+
+class _RunLock:
+    """Non-blocking file lock so only one worker per host runs a pre-training pass."""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, '.pretrain.lock')
+        self.file = None
+
+    def acquire(self) -> bool:
+        self.file = open(self.path, 'w')
+        try:
+            fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self.file.close()
+            self.file = None
+            return False
+
+    def release(self):
+        if self.file:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+
+
+def train_watchlist(result_path: str):
+    """Retrain every model at low priority with capped TensorFlow threads, saving models to MODEL_DIR.
+
+    Runs in its own process, started by run_once, so neither model.fit nor
+    TensorFlow's thread pools compete with requests at normal priority.
+    Forecasts and errors are written to result_path for the worker to publish.
+    """
+    _lower_priority()
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(PRETRAIN_TF_THREADS)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    from PricePredictions import PricePredictions
+
+    predictor = PricePredictions()
+    pairs = watchlist(predictor)
+    forecasts = {}
+    errors = []
+    logger.info(f'Pre-training {len(pairs)} models with concurrency {PRETRAIN_CONCURRENCY}')
+    with ThreadPoolExecutor(max_workers=PRETRAIN_CONCURRENCY, thread_name_prefix='pretrain') as executor:
+        futures = {
+            executor.submit(predictor.refresh, asset, timeframe, PRETRAIN_MODE == 'finetune'): (asset, timeframe)
+            for asset, timeframe in pairs
+        }
+        for future in as_completed(futures):
+            asset, timeframe = futures[future]
+            try:
+                forecasts[(asset, timeframe)] = future.result()
+            except Exception as e:
+                logger.warning(f'Pre-training {asset} ({timeframe} days) failed: {str(e)}')
+                errors.append(f'{asset}/{timeframe}: {str(e)}')
+    with open(result_path, 'wb') as file:
+        pickle.dump({'forecasts': forecasts, 'errors': errors}, file)
+
+
+def _train_in_subprocess() -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        result_path = os.path.join(directory, 'pretrain.pickle')
+        with metrics.stage('pretrain'):
+            completed = subprocess.run([sys.executable, os.path.abspath(__file__), result_path])
+        if completed.returncode != 0 or not os.path.exists(result_path):
+            raise RuntimeError(f'Training process exited with status {completed.returncode}')
+        with open(result_path, 'rb') as file:
+            return pickle.load(file)
+
+
+def run_once():
+    """Retrain the whole watchlist in a low-priority process and publish models and forecasts to the caches."""
+    from PricePredictions import MODEL_DIR, prediction_cache
+    from financial_interface import get_interface
+
+    lock = _RunLock(MODEL_DIR)
+    if not lock.acquire():
+        logger.info('Pre-training already running in another worker, skipping')
+        return
+
+    predictor = get_interface().price_predictions
+    errors = []
+    trained = 0
+    with _state_lock:
+        _state.update(running=True, last_run_started=time.time())
+
+    try:
+        result = _train_in_subprocess()
+        errors.extend(result['errors'])
+        for (asset, timeframe), forecast in result['forecasts'].items():
+            try:
+                predictor.load_saved_model(asset, timeframe)
+                prediction_cache.set((asset, timeframe), forecast)
+                trained += 1
+            except Exception as e:
+                logger.warning(f'Publishing the pre-trained {asset} ({timeframe} days) model failed: {str(e)}')
+                errors.append(f'{asset}/{timeframe}: {str(e)}')
+    except Exception as e:
+        logger.error(f'Pre-training run failed: {str(e)}')
+        errors.append(str(e))
+    finally:
+        lock.release()
+        with _state_lock:
+            _state.update(
+                running=False,
+                last_run_finished=time.time(),
+                last_run_trained=trained,
+                last_run_errors=errors
+            )
+    logger.info(f'Pre-training finished: {trained} trained, {len(errors)} failed')
+
+
+def _loop():
+    while not _stop.is_set():
+        next_run = next_run_after(datetime.now(timezone.utc))
+        with _state_lock:
+            _state['next_run'] = next_run.isoformat()
+        if _stop.wait((next_run - datetime.now(timezone.utc)).total_seconds()):
+            return
+        try:
+            run_once()
+        except Exception as e:
+            logger.error(f'Pre-training run failed: {str(e)}', exc_info=True)
+
+
+def start():
+    """Start the nightly pre-training scheduler once per worker process."""
+    global _started_pid
+    with _state_lock:
+        if not PRETRAIN_ENABLED or _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+    threading.Thread(target=_loop, name='pretrain-scheduler', daemon=True).start()
+
+
+def stop():
+    _stop.set()
+
+
+def status() -> dict:
+    with _state_lock:
+        return {'enabled': PRETRAIN_ENABLED, **_state, 'last_run_errors': list(_state['last_run_errors'])}
+
+
+if __name__ == '__main__':
+    # With a result path this is the training process started by run_once;
+    # it must not import the app before train_watchlist lowers its priority.
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) > 1:
+        train_watchlist(sys.argv[1])
+    else:
+        run_once()
@@ -0,0 +1,195 @@
+import json
+import re
+from typing import Annotated, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, BeforeValidator, Field, ValidationError, field_validator
+
+from compaction import extract_json
+
+_DECISION = re.compile(r'\b(buy|sell|hold)\b')
+
+
+def _as_text(value):
+    """Models sometimes answer a text field with a list or an object; keep the content."""
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return '\n'.join(str(item) for item in value)
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (str, dict)):
+        return [value]
+    return value
+
+
+def _as_float(value):
+    if isinstance(value, str):
+        cleaned = value.strip().rstrip('%').replace(',', '').replace('$', '')
+        try:
+            return float(cleaned)
+        except ValueError:
+            return None
+    return value
+
+
+Text = Annotated[str, BeforeValidator(_as_text)]
+TextList = Annotated[List[Text], BeforeValidator(_as_list)]
+Number = Annotated[Optional[float], BeforeValidator(_as_float)]
+
+
+class NewsAnalysis(BaseModel):
+    latest_news: TextList = []
+    sentiment: Text
+    sources: TextList = []
+
+
+class PriceData(BaseModel):
+    current: Number = None
+    historical_summary: Text = ''
+
+
+class PriceResearch(BaseModel):
+    data_sources: TextList = []
+    price_data: PriceData = Field(default_factory=PriceData)
+    market_trends: Text
+    sources: TextList = []
+
+
+class CompanyResearch(BaseModel):
+    company_fundamentals: Text
+    competitor_analysis: Text = ''
+    sources: TextList = []
+
+
+class ResearchFindings(BaseModel):
+    news_analysis: Optional[NewsAnalysis] = None
+    price_research: Optional[PriceResearch] = None
+    company_research: Optional[CompanyResearch] = None
+
+
+class RatioGroup(BaseModel):
+    metrics: Dict[str, Number] = {}
+    analysis: Text = ''
+
+
+class FinancialAnalysis(BaseModel):
+    profitability_ratios: RatioGroup = Field(default_factory=RatioGroup)
+    liquidity_ratios: RatioGroup = Field(default_factory=RatioGroup)
+    solvency_ratios: RatioGroup = Field(default_factory=RatioGroup)
+    efficiency_ratios: RatioGroup = Field(default_factory=RatioGroup)
+    market_value_ratios: RatioGroup = Field(default_factory=RatioGroup)
+    growth_metrics: RatioGroup = Field(default_factory=RatioGroup)
+    risks: TextList = []
+    historical_trends: Text = ''
+    price_trends: Dict[str, Number] = {}
+    summary: Text
+
+
+class Recommendation(BaseModel):
+    decision: Text
+    confidence_level: Number = None
+    rationale: Text
+    risk_factors: TextList = []
+
+    @field_validator('decision')
+    @classmethod
+    def _decision(cls, value: str) -> str:
+        match = _DECISION.search(value.lower())
+        if match is None:
+            raise ValueError('decision must be buy, sell or hold')
+        return match.group(1)
+
+    @field_validator('confidence_level')
+    @classmethod
+    def _confidence(cls, value: Optional[float]) -> Optional[float]:
+        # Percentages are common in answers; store a 0-1 fraction.
+        if value is not None and value > 1:
+            value = value / 100
+        if value is not None and not 0 <= value <= 1:
+            raise ValueError('confidence_level must be between 0 and 1')
+        return value
+
+
+class ReportSections(BaseModel):
+    overview: Text = ''
+    research_findings: Text = ''
+    financial_analysis: Text = ''
+    recommendation: Text = ''
+
+
+class FinalReport(BaseModel):
+    executive_summary: Text
+    sections: ReportSections
+    disclaimers: TextList = []
+
+
+# Schema per crew output key; outputs without one only need to parse as JSON.
+OUTPUT_SCHEMAS = {
+    'news_analysis': NewsAnalysis,
+    'price_research': PriceResearch,
+    'company_research': CompanyResearch,
+    'financial_analysis': FinancialAnalysis,
+    'recommendation': Recommendation,
+    'final_report': FinalReport
+}
+
+
+def _error_summary(error: ValidationError) -> str:
+    return '; '.join(
+        f"{'.'.join(str(part) for part in item['loc']) or 'value'}: {item['msg']}"
+        for item in error.errors()
+    )
+
+
+def validate_output(output_key: str, raw: str) -> Tuple[Optional[dict], Optional[str]]:
+    """Parse and validate one task output.
+
+    Returns the validated payload and None, or None and a short description
+    of what is wrong that can be sent back to the agent.
+    """
+    parsed = extract_json(raw)
+    if parsed is None:
+        return None, 'the answer does not contain a JSON object'
+
+    payload = parsed.get(output_key, parsed)
+    schema = OUTPUT_SCHEMAS.get(output_key)
+    if schema is None:
+        return payload, None
+    if not isinstance(payload, dict):
+        return None, f'{output_key} must be a JSON object'
+    try:
+        return schema.model_validate(payload).model_dump(), None
+    except ValidationError as e:
+        return None, _error_summary(e)
+
+
+def merge_financial_analysis(analysis: dict, figures: dict) -> dict:
+    """Put the computed metrics next to the accountant's interpretation of them."""
+    merged = FinancialAnalysis.model_validate(analysis or {'summary': ''}).model_dump()
+    for group, values in (figures or {}).items():
+        if group in merged and isinstance(merged[group], dict):
+            merged[group]['metrics'] = values
+    merged['price_trends'] = (figures or {}).get('historical_trends', {})
+    return merged
+
+
+def build_report(payloads: Dict[str, dict]) -> dict:
+    """Assemble validated task payloads into the report sections stored for an analysis."""
+    research = ResearchFindings.model_validate({
+        key: payloads.get(key) for key in ('news_analysis', 'price_research', 'company_research')
+    })
+    report = {'research_findings': research.model_dump()}
+    if 'financial_analysis' in payloads or 'financial_metrics' in payloads:
+        report['financial_analysis'] = merge_financial_analysis(
+            payloads.get('financial_analysis'), payloads.get('financial_metrics')
+        )
+    for key in ('recommendation', 'final_report'):
+        if key in payloads:
+            report[key] = payloads[key]
+    return report
@@ -0,0 +1,241 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import metrics
+import tracing
+from storage import Storage
+
+
+STORAGE_SQLITE_PATH = os.environ.get('STORAGE_SQLITE_PATH', 'storage.sqlite3')
+
+
+class SQLiteDatabase(Storage):
+    """Embedded storage in one SQLite file, for single-node deployments, local runs and offline benchmarks.
+
+    Documents are kept as JSON in a single table keyed by collection and id,
+    mirroring the Firestore layout, so both backends return the same dicts.
+    Workers on one host share the file; WAL mode lets reads run alongside a write.
+    """
+
+    def __init__(self, path: str = STORAGE_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._transaction() as connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS documents ('
+                'collection TEXT NOT NULL, id TEXT NOT NULL, asset_name TEXT, timestamp TEXT, '
+                'data TEXT NOT NULL, PRIMARY KEY (collection, id))'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS documents_asset ON documents (collection, asset_name, timestamp)'
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread, and a new one after a fork.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        """A write transaction that holds the database lock from its first statement."""
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _put(self, collection: str, document_id: str, data: dict, connection: sqlite3.Connection = None):
+        row = (collection, document_id, data.get('asset_name'), data.get('timestamp'), json.dumps(data, default=str))
+        statement = 'INSERT OR REPLACE INTO documents (collection, id, asset_name, timestamp, data) VALUES (?, ?, ?, ?, ?)'
+        with metrics.stage('sqlite_write'):
+            if connection is not None:
+                connection.execute(statement, row)
+            else:
+                self._connection().execute(statement, row)
+
+    def _get(self, collection: str, document_id: str, connection: sqlite3.Connection = None) -> Optional[dict]:
+        with metrics.stage('sqlite_read'):
+            row = (connection or self._connection()).execute(
+                'SELECT data FROM documents WHERE collection = ? AND id = ?', (collection, document_id)
+            ).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def _store(self, collection: str, id_field: str, asset_name: str, document: dict) -> str:
+        document_id = uuid.uuid4().hex[:20]
+        document.update({
+            'asset_name': asset_name,
+            'timestamp': datetime.now().isoformat(),
+            id_field: document_id
+        })
+        self._put(collection, document_id, document)
+        return document_id
+
+    def _latest(self, collection: str, asset_name: str, limit: int) -> list:
+        with metrics.stage('sqlite_read'):
+            rows = self._connection().execute(
+                'SELECT data FROM documents WHERE collection = ? AND asset_name = ? ORDER BY timestamp DESC LIMIT ?',
+                (collection, asset_name, limit)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    @tracing.traced(record_args=('asset_name',))
+    def store_analysis_report(self, asset_name: str, report: dict, durable: bool = False) -> str:
+        try:
+            report_id = self._store('analysis_reports', 'report_id', asset_name, report)
+            logging.info(f'Stored analysis report for {asset_name} with ID: {report_id}')
+            return report_id
+        except Exception as e:
+            logging.error(f'Error storing analysis report for {asset_name}: {str(e)}')
+            return 'Error storing analysis'
+
+    @tracing.traced(record_args=('asset_name',))
+    def store_price_predictions(self, asset_name: str, prediction: dict, durable: bool = False) -> str:
+        try:
+            prediction_id = self._store('price_predictions', 'prediction_id', asset_name, prediction)
+            logging.info(f'Stored price predictions for {asset_name} with ID: {prediction_id}')
+            return prediction_id
+        except Exception as e:
+            logging.error(f'Error storing price predictions for {asset_name}: {str(e)}')
+            return 'Error storing price predictions'
+
+    @tracing.traced(record_args=('asset_name',))
+    def get_historical_data(self, asset_name: str, limit: int = 100) -> list:
+        try:
+            return self._latest('historical_data', asset_name, limit)
+        except Exception as e:
+            logging.error(f'Error getting historical data for {asset_name}: {str(e)}')
+            return []
+
+    @tracing.traced(record_args=('asset_name',))
+    def get_recent_analysis_reports(self, asset_name: str, limit: int = 5) -> list:
+        try:
+            return self._latest('analysis_reports', asset_name, limit)
+        except Exception as e:
+            logging.error(f'Error getting recent analysis reports for {asset_name}: {str(e)}')
+            return []
+
+    def _get_document(self, collection_name: str, document_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            document = self._get(collection_name, document_id)
+            if document is None:
+                logging.warning(f'No document found in {collection_name} with ID: {document_id}')
+            return document
+        except Exception as e:
+            logging.error(f'Error retrieving document from {collection_name} with ID {document_id}: {str(e)}')
+            return None
+
+    @tracing.traced(record_args=('report_id',))
+    def get_analysis_report(self, report_id: str) -> Optional[Dict[str, Any]]:
+        return self._get_document('analysis_reports', report_id)
+
+    @tracing.traced(record_args=('prediction_id',))
+    def get_price_predictions(self, prediction_id: str) -> Optional[Dict[str, Any]]:
+        return self._get_document('price_predictions', prediction_id)
+
+    @tracing.traced(record_args=('job_id', 'task_name'))
+    def store_task_checkpoint(self, job_id: str, task_name: str, checkpoint: dict) -> bool:
+        try:
+            self._put(f'crew_checkpoints/{job_id}/tasks', task_name, checkpoint)
+            return True
+        except Exception as e:
+            logging.error(f'Error storing checkpoint {task_name} for job {job_id}: {str(e)}')
+            return False
+
+    @tracing.traced(record_args=('job_id',))
+    def get_task_checkpoints(self, job_id: str) -> Dict[str, Dict[str, Any]]:
+        try:
+            with metrics.stage('sqlite_read'):
+                rows = self._connection().execute(
+                    'SELECT id, data FROM documents WHERE collection = ?', (f'crew_checkpoints/{job_id}/tasks',)
+                ).fetchall()
+            return {task_name: json.loads(data) for task_name, data in rows}
+        except Exception as e:
+            logging.error(f'Error getting checkpoints for job {job_id}: {str(e)}')
+            return {}
+
+    @tracing.traced(record_args=('batch_id',))
+    def store_batch_status(self, batch_id: str, status: dict) -> bool:
+        try:
+            self._put('analysis_batches', batch_id, status)
+            return True
+        except Exception as e:
+            logging.error(f'Error storing status for batch {batch_id}: {str(e)}')
+            return False
+
+    @tracing.traced(record_args=('batch_id',))
+    def get_batch_status(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        return self._get_document('analysis_batches', batch_id)
+
+    @tracing.traced(record_args=('job_id',))
+    def store_job_cancellation(self, job_id: str, cancellation: dict) -> bool:
+        try:
+            self._put('job_cancellations', job_id, cancellation)
+            return True
+        except Exception as e:
+            logging.error(f'Error storing cancellation for job {job_id}: {str(e)}')
+            return False
+
+    @tracing.traced(record_args=('job_id',))
+    def get_job_cancellation(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self._get('job_cancellations', job_id)
+        except Exception as e:
+            logging.error(f'Error getting cancellation for job {job_id}: {str(e)}')
+            return None
+
+    @tracing.traced()
+    def claim_idempotency_key(self, key: str, record: dict) -> Optional[Dict[str, Any]]:
+        """Store record under key unless an unexpired one exists; fails open like the Firestore backend."""
+        try:
+            with self._transaction() as connection:
+                existing = self._get('idempotency_keys', key, connection)
+                if existing is not None and existing.get('expires_at', 0) > time.time():
+                    return existing
+                self._put('idempotency_keys', key, record, connection)
+            return None
+        except Exception as e:
+            logging.error(f'Error claiming idempotency key {key}: {str(e)}')
+            return None
+
+    @tracing.traced()
+    def update_idempotency_key(self, key: str, changes: dict) -> bool:
+        try:
+            with self._transaction() as connection:
+                record = self._get('idempotency_keys', key, connection) or {}
+                record.update(changes)
+                self._put('idempotency_keys', key, record, connection)
+            return True
+        except Exception as e:
+            logging.error(f'Error updating idempotency key {key}: {str(e)}')
+            return False
+
+    @tracing.traced()
+    def release_idempotency_key(self, key: str) -> bool:
+        try:
+            with metrics.stage('sqlite_write'):
+                self._connection().execute(
+                    'DELETE FROM documents WHERE collection = ? AND id = ?', ('idempotency_keys', key)
+                )
+            return True
+        except Exception as e:
+            logging.error(f'Error releasing idempotency key {key}: {str(e)}')
+            return False
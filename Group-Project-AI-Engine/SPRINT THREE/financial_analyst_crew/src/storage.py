@@ -0,0 +1,113 @@
+import abc
+import os
+from typing import Any, Dict, Optional
+
+
+# firestore (default) or sqlite for a single node, local runs and offline benchmarks.
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'firestore').lower()
+STORAGE_BACKENDS = ('firestore', 'sqlite')
+
+
+class Storage(abc.ABC):
+    """Everything the application stores: reports, predictions and the state of running jobs.
+
+    Store methods return the new document's id, or an error string when it
+    could not be stored; other methods return False, None or an empty result
+    on failure rather than raising, so storage problems never fail a request.
+    Backends must implement every abstract method; write_position and flush
+    only matter to backends that queue writes.
+    """
+
+    @abc.abstractmethod
+    def store_analysis_report(self, asset_name: str, report: dict, durable: bool = False) -> str:
+        """Store a report, adding asset_name, timestamp and report_id to it; durable waits until it is committed."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def store_price_predictions(self, asset_name: str, prediction: dict, durable: bool = False) -> str:
+        """Store predictions, adding asset_name, timestamp and prediction_id to them."""
+        raise NotImplementedError
+
+    def write_position(self) -> int:
+        """Marks the writes queued so far, for flush(since=...); 0 for backends that write through."""
+        return 0
+
+    def flush(self, timeout: Optional[float] = None, since: Optional[int] = None) -> bool:
+        """Commit writes that are still queued; False if that did not finish within timeout.
+
+        With since, a write_position(), also False if a write queued after it failed.
+        """
+        return True
+
+    @abc.abstractmethod
+    def get_historical_data(self, asset_name: str, limit: int = 100) -> list:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_recent_analysis_reports(self, asset_name: str, limit: int = 5) -> list:
+        """Newest stored analysis reports for an asset, newest first."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_analysis_report(self, report_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_price_predictions(self, prediction_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def store_task_checkpoint(self, job_id: str, task_name: str, checkpoint: dict) -> bool:
+        """Save one crew task's output under its job so a retry can resume."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_task_checkpoints(self, job_id: str) -> Dict[str, Dict[str, Any]]:
+        """Every checkpointed task output for a job, by task name."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def store_batch_status(self, batch_id: str, status: dict) -> bool:
+        """Overwrite the progress document of a batch analysis."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_batch_status(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def store_job_cancellation(self, job_id: str, cancellation: dict) -> bool:
+        """Record a cancel request, so the worker running the job stops it at its next task."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def get_job_cancellation(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def claim_idempotency_key(self, key: str, record: dict) -> Optional[Dict[str, Any]]:
+        """Store record under key unless an unexpired one exists.
+
+        Returns None once the key is claimed, or the record already holding it.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def update_idempotency_key(self, key: str, changes: dict) -> bool:
+        """Merge changes into the record held by key."""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def release_idempotency_key(self, key: str) -> bool:
+        raise NotImplementedError
+
+
+def backend(name: str = STORAGE_BACKEND) -> type:
+    """The Storage class for a backend name; only the chosen backend's client library is imported."""
+    if name == 'firestore':
+        from database import Database
+        return Database
+    if name == 'sqlite':
+        from sqlite_storage import SQLiteDatabase
+        return SQLiteDatabase
+    raise ValueError(f'Unknown STORAGE_BACKEND {name!r}, expected one of {list(STORAGE_BACKENDS)}')
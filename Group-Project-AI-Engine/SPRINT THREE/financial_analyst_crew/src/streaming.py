@@ -0,0 +1,97 @@
+import contextvars
+import json
+import os
+import queue
+import threading
+
+import profiling
+
+SSE_KEEPALIVE_SECONDS = float(os.environ.get('SSE_KEEPALIVE_SECONDS', 15))
+
+# crewAI agents answer as "Thought: ... Final Answer: ..."; only the answer is streamed.
+FINAL_ANSWER_MARKER = 'Final Answer:'
+
+
+def format_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str, separators=(',', ':'))}\n\n"
+
+
+class ReportStream:
+    """Carries the final report's tokens from the crew's LLM calls to a streaming response.
+
+    Every LLM call streamed into it starts over: if part of an earlier answer
+    was already sent, a reset event tells the client to discard it, which
+    covers schema re-asks and provider failover.
+    """
+
+    def __init__(self):
+        self._events = queue.Queue()
+        self._lock = threading.Lock()
+        self._buffer = ''
+        self._forwarded = None
+        self._sent = False
+
+    def publish(self, event: str, data):
+        self._events.put((event, data))
+
+    def begin(self):
+        """Start of an LLM call whose text is streamed."""
+        with self._lock:
+            if self._sent:
+                self.publish('reset', {})
+            self._buffer = ''
+            self._forwarded = None
+            self._sent = False
+
+    def feed(self, text: str):
+        """Append generated text, forwarding whatever follows the final answer marker."""
+        with self._lock:
+            self._buffer += text
+            if self._forwarded is None:
+                index = self._buffer.find(FINAL_ANSWER_MARKER)
+                if index < 0:
+                    return
+                self._forwarded = index + len(FINAL_ANSWER_MARKER)
+            delta = self._buffer[self._forwarded:]
+            self._forwarded = len(self._buffer)
+            if not self._sent:
+                delta = delta.lstrip()
+            if delta:
+                self._sent = True
+                self.publish('token', {'text': delta})
+
+    def finish(self, result: dict):
+        """End the stream with the stored analysis, partial or complete, or the error that stopped it."""
+        self.publish('done' if result.get('status') in ('success', 'partial') else 'error', result)
+
+    def events(self, keepalive: float = SSE_KEEPALIVE_SECONDS):
+        """Server-sent events until the analysis finishes, with comments to keep idle proxies open."""
+        while True:
+            try:
+                event, data = self._events.get(timeout=keepalive)
+            except queue.Empty:
+                yield ': keep-alive\n\n'
+                continue
+            yield format_event(event, data)
+            if event in ('done', 'error'):
+                return
+
+
+def start(stream: ReportStream, request_analysis, **kwargs) -> threading.Thread:
+    """Run request_analysis in the background and end the stream with its result.
+
+    The analysis runs to completion and is stored even if the client disconnects.
+    """
+    context = contextvars.copy_context()
+
+    def run():
+        try:
+            with profiling.attached():
+                result = request_analysis(stream=stream, **kwargs)
+        except Exception as e:
+            result = {'status': 'error', 'message': str(e), 'job_id': kwargs.get('job_id')}
+        stream.finish(result)
+
+    thread = threading.Thread(target=context.run, args=(run,), name='analysis-stream', daemon=True)
+    thread.start()
+    return thread
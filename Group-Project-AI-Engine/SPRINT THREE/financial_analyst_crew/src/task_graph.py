@@ -0,0 +1,100 @@
+import contextvars
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List
+
+import profiling
+
+
+CREW_MAX_PARALLEL_TASKS = int(os.environ.get('CREW_MAX_PARALLEL_TASKS', 3))
+
+
+class TaskGraph:
+    """Dependency graph of crew tasks built from the inputs and outputs declared in tasks.yaml."""
+
+    def __init__(self, config: Dict[str, dict]):
+        self.tasks = list(config)
+        self.outputs = {name: list(config[name].get('outputs', [])) for name in self.tasks}
+        self.inputs = {name: list(config[name].get('inputs', [])) for name in self.tasks}
+
+        self.producers = {}
+        for name, outputs in self.outputs.items():
+            for output in outputs:
+                if output in self.producers:
+                    raise ValueError(f"Output {output} is produced by both {self.producers[output]} and {name}")
+                self.producers[output] = name
+
+        self.dependencies = {}
+        for name, inputs in self.inputs.items():
+            missing = [item for item in inputs if item not in self.producers]
+            if missing:
+                raise ValueError(f"Task {name} needs inputs no task produces: {missing}")
+            self.dependencies[name] = sorted({self.producers[item] for item in inputs}, key=self.tasks.index)
+
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        order = []
+        remaining = dict(self.dependencies)
+        while remaining:
+            ready = [name for name, deps in remaining.items() if all(dep in order for dep in deps)]
+            if not ready:
+                raise ValueError(f"Task graph has a cycle between: {sorted(remaining)}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+        return order
+
+    def upstream(self, name: str) -> List[str]:
+        """Every task whose output this task consumes, directly or indirectly."""
+        seen = []
+        stack = list(self.dependencies[name])
+        while stack:
+            dep = stack.pop()
+            if dep not in seen:
+                seen.append(dep)
+                stack.extend(self.dependencies[dep])
+        return sorted(seen, key=self.order.index)
+
+    def execute(self, run_task: Callable[[str, Dict[str, object]], object],
+                max_parallel: int = CREW_MAX_PARALLEL_TASKS, completed: Dict[str, object] = None) -> Dict[str, object]:
+        """Run every task once its dependencies have finished, independent tasks concurrently.
+
+        run_task receives the task name and the results of its direct dependencies.
+        Tasks already present in completed are not run again. The first failure
+        is raised once in-flight tasks have finished.
+        """
+        results = dict(completed or {})
+        pending = [name for name in self.order if name not in results]
+        running = {}
+
+        def run_profiled(name, upstream):
+            with profiling.attached():
+                return run_task(name, upstream)
+
+        with ThreadPoolExecutor(max_workers=max(1, max_parallel), thread_name_prefix='crew-task') as executor:
+            while pending or running:
+                for name in list(pending):
+                    if len(running) >= max(1, max_parallel):
+                        break
+                    if all(dep in results for dep in self.dependencies[name]):
+                        pending.remove(name)
+                        upstream = {dep: results[dep] for dep in self.dependencies[name]}
+                        context = contextvars.copy_context()
+                        running[executor.submit(context.run, run_profiled, name, upstream)] = name
+
+                if not running:
+                    raise ValueError(f"Tasks cannot be scheduled: {pending}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                failure = None
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as e:
+                        failure = failure or e
+                if failure:
+                    wait(running)
+                    raise failure
+        return results
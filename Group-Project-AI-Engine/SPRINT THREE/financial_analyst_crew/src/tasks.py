@@ -1,55 +1,118 @@
 from crewai import Task
+from crewai.tasks.task_output import TaskOutput
+from functools import lru_cache
 from pathlib import Path
 import yaml
 import os
+from agents import load_agents_config
+import ratios
+from task_graph import TaskGraph
+
+TASKS_CONFIG_PATH = Path(__file__).parent.parent / "config" / "tasks.yaml"
+REQUIRED_TASK_FIELDS = ('description', 'expected_output', 'agent')
+REQUIRED_COMPUTED_FIELDS = ('description', 'function', 'outputs')
+
+# Tasks computed in Python rather than by an agent, by their function name in tasks.yaml.
+COMPUTED_TASKS = {
+    'financial_metrics': ratios.financial_metrics_report,
+    'market_context': ratios.market_context_report
+}
+
+
+@lru_cache(maxsize=None)
+def load_tasks_config() -> dict:
+    """Parse and validate tasks.yaml once per process."""
+    with open(TASKS_CONFIG_PATH, 'r') as file:
+        config = yaml.safe_load(file)
+
+    agent_types = load_agents_config()
+    for task_name, fields in config.items():
+        required = REQUIRED_COMPUTED_FIELDS if 'function' in (fields or {}) else REQUIRED_TASK_FIELDS
+        missing = [field for field in required if not (fields or {}).get(field)]
+        if missing:
+            raise ValueError(f"Task {task_name} in tasks.yaml is missing: {missing}")
+        if 'function' in fields and fields['function'] not in COMPUTED_TASKS:
+            raise ValueError(f"Task {task_name} uses unknown function: {fields['function']}")
+        if 'function' not in fields and fields['agent'] not in agent_types:
+            raise ValueError(f"Task {task_name} uses unknown agent: {fields['agent']}")
+        unknown = [name for name in fields.get('context_fields', {}) if name not in fields.get('inputs', [])]
+        if unknown:
+            raise ValueError(f"Task {task_name} has context_fields for inputs it does not take: {unknown}")
+        if 'expected_output' in fields:
+            # Schemas are indented for people; the model does not need the whitespace.
+            fields['expected_output'] = ' '.join(fields['expected_output'].split())
+        try:
+            fields['description'].format(asset_name='')
+        except (KeyError, IndexError, ValueError) as e:
+            raise ValueError(f"Task {task_name} description may only use {{asset_name}}: {str(e)}")
+    return config
+
+
+@lru_cache(maxsize=None)
+def task_graph() -> TaskGraph:
+    """The crew's dependency graph, built once per process."""
+    return TaskGraph(load_tasks_config())
+
 
 class FinancialTasks:
-    def __init__(self, agents, asset_name: str):
+    """Crew template: the parsed task config and graph, with only {asset_name} bound per analysis."""
+
+    def __init__(self, agents, asset_name: str, predictor=None):
         self.agents = agents
         self.asset_name = asset_name
-        
-        current_dir = Path(__file__).parent.parent
-        config_path = current_dir / "config" / "tasks.yaml"
-       
-        with open(config_path, 'r') as file:
-            self.config = yaml.safe_load(file)
-
-    def research_stock(self) -> Task:
-        description = self.config['research_stock_task']['description'].format(
-            asset_name=self.asset_name
-        )
-        return Task(
-            description=description,
-            expected_output=self.config['research_stock_task']['expected_output'],
-            agent=self.agents.researcher()
+        self.predictor = predictor
+        self.config = load_tasks_config()
+
+    def graph(self) -> TaskGraph:
+        return task_graph()
+
+    def context_fields(self, task_name: str, input_name: str) -> list:
+        """Fields of an input the task needs, or None for the whole output."""
+        return self.config[task_name].get('context_fields', {}).get(input_name)
+
+    def agent_type(self, task_name: str):
+        return self.config[task_name].get('agent')
+
+    def is_computed(self, task_name: str) -> bool:
+        return 'function' in self.config[task_name]
+
+    def run_computed(self, task_name: str) -> TaskOutput:
+        """Run a computed task on the crew's price source and wrap its result like an agent's output."""
+        task_config = self.config[task_name]
+        return TaskOutput(
+            name=task_name,
+            description=task_config['description'].format(asset_name=self.asset_name),
+            raw=COMPUTED_TASKS[task_config['function']](self.asset_name, self.predictor),
+            agent=task_config['function']
         )
 
-    def analyze_stock(self) -> Task:
-        description = self.config['analyze_stock_task']['description'].format(
+    def create_task(self, task_name: str) -> Task:
+        """Build a task from its config, with its own agent of the configured type."""
+        task_config = self.config[task_name]
+        description = task_config['description'].format(
             asset_name=self.asset_name
         )
         return Task(
+            name=task_name,
             description=description,
-            expected_output=self.config['analyze_stock_task']['expected_output'],
-            agent=self.agents.accountant()
+            expected_output=task_config['expected_output'],
+            agent=getattr(self.agents, task_config['agent'])()
         )
 
+    def research_news(self) -> Task:
+        return self.create_task('research_news_task')
+
+    def research_price(self) -> Task:
+        return self.create_task('research_price_task')
+
+    def research_company(self) -> Task:
+        return self.create_task('research_company_task')
+
+    def analyze_stock(self) -> Task:
+        return self.create_task('analyze_stock_task')
+
     def make_decision(self) -> Task:
-        description = self.config['make_decision_task']['description'].format(
-            asset_name=self.asset_name
-        )
-        return Task(
-            description=description,
-            expected_output=self.config['make_decision_task']['expected_output'],
-            agent=self.agents.recommender()
-        )
+        return self.create_task('make_decision_task')
 
     def output_report(self) -> Task:
-        description = self.config['output_task']['description'].format(
-            asset_name=self.asset_name
-        )
-        return Task(
-            description=description,
-            expected_output=self.config['output_task']['expected_output'],
-            agent=self.agents.blogger()
-        )
+        return self.create_task('output_task')
@@ -0,0 +1,137 @@
+import inspect
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Optional
+
+
+TRACE_EXPORTER = os.environ.get('TRACE_EXPORTER', 'none').lower()
+TRACE_FILE = os.environ.get('TRACE_FILE', 'traces.jsonl')
+
+_current_span = ContextVar('current_span', default=None)
+_export_lock = threading.Lock()
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+class Span:
+    def __init__(self, name: str, trace_id: Optional[str] = None, **attributes):
+        parent = _current_span.get()
+        self.name = name
+        self.trace_id = trace_id or (parent.trace_id if parent else _new_id(16))
+        self.span_id = _new_id(8)
+        self.parent = parent
+        self.attributes = attributes
+        self.status = 'ok'
+        self.error = None
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+        self._token = _current_span.set(self)
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None):
+        if self.duration is not None:
+            return
+        self.duration = time.perf_counter() - self._start
+        if error is not None:
+            self.status = 'error'
+            self.error = f'{type(error).__name__}: {error}'
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # Ended from a different context than it was started in.
+            _current_span.set(self.parent)
+        _export(self)
+
+    def to_dict(self) -> dict:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent.span_id if self.parent else None,
+            'name': self.name,
+            'start': datetime.fromtimestamp(self.start_time, timezone.utc).isoformat(),
+            'duration_ms': round(self.duration * 1000, 3),
+            'status': self.status,
+            'error': self.error,
+            'attributes': self.attributes
+        }
+
+
+def _export(finished: Span):
+    if TRACE_EXPORTER == 'none':
+        return
+    line = json.dumps(finished.to_dict(), default=str)
+    with _export_lock:
+        if TRACE_EXPORTER == 'stdout':
+            sys.stdout.write(line + '\n')
+            sys.stdout.flush()
+        elif TRACE_EXPORTER == 'file':
+            with open(TRACE_FILE, 'a') as file:
+                file.write(line + '\n')
+
+
+def start_span(name: str, trace_id: Optional[str] = None, **attributes) -> Span:
+    """Open a span and make it current until end() is called."""
+    return Span(name, trace_id=trace_id, **attributes)
+
+
+@contextmanager
+def span(name: str, trace_id: Optional[str] = None, **attributes):
+    current = Span(name, trace_id=trace_id, **attributes)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(error=e)
+        raise
+    else:
+        current.end()
+
+
+def traced(name: Optional[str] = None, record_args=()):
+    """Run the decorated function inside a span, recording selected arguments."""
+    def decorator(f):
+        signature = inspect.signature(f)
+        span_name = name or f.__qualname__
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            attributes = {}
+            if record_args:
+                bound = signature.bind_partial(*args, **kwargs).arguments
+                attributes = {key: bound[key] for key in record_args if key in bound}
+            with span(span_name, **attributes):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_trace_id() -> Optional[str]:
+    current = _current_span.get()
+    return current.trace_id if current else None
+
+
+class TraceContextFilter(logging.Filter):
+    """Adds trace_id and span_id to log records for use in format strings."""
+
+    def filter(self, record):
+        current = _current_span.get()
+        record.trace_id = current.trace_id if current else '-'
+        record.span_id = current.span_id if current else '-'
+        return True
+
+
+def install_log_filter(logger: Optional[logging.Logger] = None):
+    for handler in (logger or logging.getLogger()).handlers:
+        handler.addFilter(TraceContextFilter())
@@ -0,0 +1,157 @@
+import logging
+import os
+import threading
+import time
+
+import metrics
+
+
+WARMUP_ENABLED = os.environ.get('WARMUP_ENABLED', 'true').lower() == 'true'
+WARMUP_WATCHLIST = os.environ.get('WARMUP_WATCHLIST', 'technology_stocks')
+WARMUP_TIMEFRAMES = [int(value) for value in os.environ.get('WARMUP_TIMEFRAMES', '30').split(',') if value.strip()]
+WARMUP_RETRY_SECONDS = float(os.environ.get('WARMUP_RETRY_SECONDS', 2))
+WARMUP_RETRY_MAX_SECONDS = float(os.environ.get('WARMUP_RETRY_MAX_SECONDS', 60))
+WARMUP_MAX_ERRORS = 20
+
+logger = logging.getLogger(__name__)
+
+_state = {
+    'phase': 'pending',
+    'started_at': None,
+    'finished_at': None,
+    'current_step': None,
+    'steps_completed': [],
+    'price_series_loaded': 0,
+    'models_loaded': 0,
+    'retries': 0,
+    'errors': []
+}
+_state_lock = threading.Lock()
+_started_pid = None
+
+
+def _update(**changes):
+    with _state_lock:
+        _state.update(changes)
+
+
+def _record_error(step: str, error: Exception):
+    logger.warning(f'Warm-up step {step} failed: {str(error)}')
+    with _state_lock:
+        _state['errors'].append(f'{step}: {str(error)}')
+        del _state['errors'][:-WARMUP_MAX_ERRORS]
+
+
+def watchlist(predictor) -> list:
+    """Resolve WARMUP_WATCHLIST: a PricePredictions list name or comma-separated tickers."""
+    named = getattr(predictor, WARMUP_WATCHLIST, None)
+    if isinstance(named, list):
+        return list(named)
+    return [asset.strip() for asset in WARMUP_WATCHLIST.split(',') if asset.strip()]
+
+
+def _step(name: str, function):
+    _update(current_step=name)
+    with metrics.stage(f'warmup_{name}'):
+        function()
+    with _state_lock:
+        _state['steps_completed'].append(name)
+
+
+def _import_libraries():
+    import tensorflow
+    import crewai
+    import litellm
+
+
+def _initialize_clients():
+    from financial_interface import get_interface
+    get_interface()
+
+
+def _preload():
+    from financial_interface import get_interface
+    predictor = get_interface().price_predictions
+    for asset in watchlist(predictor):
+        try:
+            predictor.price_history(asset)
+            with _state_lock:
+                _state['price_series_loaded'] += 1
+        except Exception as e:
+            _record_error(f'price_series {asset}', e)
+            continue
+        for timeframe in WARMUP_TIMEFRAMES:
+            try:
+                if predictor.load_saved_model(asset, timeframe) is not None:
+                    with _state_lock:
+                        _state['models_loaded'] += 1
+            except Exception as e:
+                _record_error(f'model {asset}/{timeframe}', e)
+
+
+def _required_step(name: str, function):
+    """Run a step the worker cannot serve without, retrying with backoff until it succeeds.
+
+    A transient failure at boot, e.g. Firestore being unreachable, only keeps
+    the worker out of rotation until the next attempt succeeds.
+    """
+    delay = WARMUP_RETRY_SECONDS
+    while True:
+        try:
+            _step(name, function)
+            return
+        except Exception as e:
+            _record_error(name, e)
+        logger.warning(f'Warm-up step {name} will be retried in {delay:.0f}s')
+        with _state_lock:
+            _state['retries'] += 1
+        _update(phase='retrying', current_step=None)
+        time.sleep(delay)
+        delay = min(delay * 2, WARMUP_RETRY_MAX_SECONDS)
+        _update(phase='running')
+
+
+def run():
+    """Import heavy libraries, create shared clients and fill the price and model caches."""
+    _update(phase='running', started_at=time.time())
+    _required_step('imports', _import_libraries)
+    _required_step('clients', _initialize_clients)
+
+    try:
+        _step('preload', _preload)
+    except Exception as e:
+        _record_error('preload', e)
+
+    _update(phase='ready', current_step=None, finished_at=time.time())
+    logger.info(f'Warm-up finished in {_state["finished_at"] - _state["started_at"]:.2f}s')
+
+
+def start():
+    """Start warm-up once per worker process, in the background."""
+    global _started_pid
+    with _state_lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+
+    if not WARMUP_ENABLED:
+        _update(phase='ready', steps_completed=['skipped'], finished_at=time.time())
+        return
+    threading.Thread(target=run, name='warmup', daemon=True).start()
+
+
+def is_ready() -> bool:
+    return _state['phase'] == 'ready'
+
+
+def status() -> dict:
+    from PricePredictions import model_cache, prediction_cache, price_cache
+
+    with _state_lock:
+        snapshot = {**_state, 'steps_completed': list(_state['steps_completed']), 'errors': list(_state['errors'])}
+    snapshot['caches'] = {
+        'price_series': price_cache.stats(),
+        'models': model_cache.stats(),
+        'predictions': prediction_cache.stats()
+    }
+    return snapshot
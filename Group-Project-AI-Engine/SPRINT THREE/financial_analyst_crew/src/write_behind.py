@@ -0,0 +1,216 @@
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+import metrics
+
+
+WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'true').lower() == 'true'
+# Firestore accepts at most 500 writes per batch.
+WRITE_BEHIND_MAX_BATCH = min(int(os.environ.get('WRITE_BEHIND_MAX_BATCH', 100)), 500)
+WRITE_BEHIND_FLUSH_SECONDS = float(os.environ.get('WRITE_BEHIND_FLUSH_SECONDS', 0.25))
+WRITE_BEHIND_MAX_RETRIES = int(os.environ.get('WRITE_BEHIND_MAX_RETRIES', 5))
+WRITE_BEHIND_BACKOFF_SECONDS = float(os.environ.get('WRITE_BEHIND_BACKOFF_SECONDS', 0.2))
+WRITE_BEHIND_ACK_TIMEOUT = float(os.environ.get('WRITE_BEHIND_ACK_TIMEOUT', 10))
+# Seconds gunicorn gives a stopping worker before killing it; the start script exports its --graceful-timeout.
+GUNICORN_GRACEFUL_TIMEOUT = float(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# In-flight requests finish before the exit-time flush runs, so it gets half of that window.
+WRITE_BEHIND_SHUTDOWN_SECONDS = float(os.environ.get('WRITE_BEHIND_SHUTDOWN_SECONDS', GUNICORN_GRACEFUL_TIMEOUT / 2))
+
+logger = logging.getLogger(__name__)
+
+batch_commits = metrics.registry.register(metrics.Counter(
+    'write_behind_commits_total',
+    'Batched storage commits by outcome: committed, retried or failed after every retry.',
+    ('outcome',)
+))
+batch_sizes = metrics.registry.register(metrics.Histogram(
+    'write_behind_batch_size',
+    'Writes per batched storage commit.',
+    (),
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500)
+))
+pending_writes = metrics.registry.register(metrics.Gauge(
+    'write_behind_pending_writes',
+    'Writes queued and not yet committed.',
+    ()
+))
+
+
+class PendingWrite:
+    def __init__(self, sequence: int, collection: str, document_id: str, data: dict):
+        self.sequence = sequence
+        self.collection = collection
+        self.document_id = document_id
+        self.data = data
+        self.queued_at = time.monotonic()
+        self.future = Future()
+
+
+class WriteBehindQueue:
+    """Buffers document writes and commits them in batches from a background thread.
+
+    A batch is committed once max_batch writes are waiting or the oldest has
+    waited flush_seconds. A failed commit is retried with exponential backoff;
+    after max_retries the futures of its writes carry the error. Queued
+    documents stay readable through get() until they are committed, and the
+    queue is flushed when the process exits.
+    """
+
+    def __init__(self, commit: Callable[[list], None], max_batch: int = WRITE_BEHIND_MAX_BATCH,
+                 flush_seconds: float = WRITE_BEHIND_FLUSH_SECONDS, max_retries: int = WRITE_BEHIND_MAX_RETRIES,
+                 backoff: float = WRITE_BEHIND_BACKOFF_SECONDS):
+        self.commit = commit
+        self.max_batch = max_batch
+        self.flush_seconds = flush_seconds
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._condition = threading.Condition()
+        self._pending = []
+        self._documents = {}
+        self._sequence = 0
+        self._finished_through = 0
+        # Sequences of recent writes whose batch failed, for flush(since=...).
+        self._failed = deque(maxlen=10000)
+        self._flush_requested = False
+        self._closed = False
+        self._thread = None
+        self._started_pid = None
+        atexit.register(self.close)
+
+    def put(self, collection: str, document_id: str, data: dict, urgent: bool = False) -> Future:
+        """Queue a document write; the future resolves to document_id once it is committed.
+
+        urgent commits the waiting batch now instead of after flush_seconds.
+        """
+        with self._condition:
+            closed = self._closed
+            if closed:
+                write = PendingWrite(0, collection, document_id, data)
+            else:
+                self._sequence += 1
+                write = PendingWrite(self._sequence, collection, document_id, data)
+                self._start()
+                self._pending.append(write)
+                self._documents[(collection, document_id)] = data
+                self._flush_requested = self._flush_requested or urgent
+                self._condition.notify_all()
+        if closed:
+            # Shutting down: nothing will flush later, so write through.
+            self._commit([write])
+        elif metrics.METRICS_ENABLED:
+            pending_writes.inc()
+        return write.future
+
+    def get(self, collection: str, document_id: str) -> Optional[dict]:
+        """A document that is queued but not committed yet."""
+        with self._condition:
+            data = self._documents.get((collection, document_id))
+        return dict(data) if data is not None else None
+
+    def position(self) -> int:
+        """Sequence number of the last queued write, to pass to flush as since."""
+        with self._condition:
+            return self._sequence
+
+    def flush(self, timeout: Optional[float] = WRITE_BEHIND_ACK_TIMEOUT, since: Optional[int] = None) -> bool:
+        """Commit everything queued so far; False if that did not finish within timeout.
+
+        With since, also False if any write queued after that position() failed.
+        """
+        with self._condition:
+            target = self._sequence
+            self._flush_requested = True
+            self._condition.notify_all()
+            if not self._condition.wait_for(lambda: self._finished_through >= target, timeout):
+                return False
+            return since is None or not any(since < sequence <= target for sequence in self._failed)
+
+    def close(self, timeout: float = WRITE_BEHIND_SHUTDOWN_SECONDS):
+        """Flush the queue and stop the background thread."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread if self._started_pid == os.getpid() else None
+        if thread is not None:
+            thread.join(timeout)
+        with self._condition:
+            lost = len(self._pending)
+        if lost:
+            logger.error(f'{lost} queued writes were not committed before shutdown')
+
+    def _start(self):
+        # Called with the condition held; a forked worker starts its own thread.
+        if self._started_pid == os.getpid():
+            return
+        self._started_pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+
+    def _next_batch(self) -> list:
+        with self._condition:
+            self._condition.wait_for(lambda: self._pending or self._closed)
+            if not self._pending:
+                return []
+            due = self._pending[0].queued_at + self.flush_seconds
+            self._condition.wait_for(
+                lambda: len(self._pending) >= self.max_batch or self._flush_requested or self._closed,
+                max(0.0, due - time.monotonic())
+            )
+            batch = self._pending[:self.max_batch]
+            del self._pending[:self.max_batch]
+            if not self._pending:
+                self._flush_requested = False
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            committed = self._commit(batch)
+            with self._condition:
+                if not committed:
+                    self._failed.extend(write.sequence for write in batch)
+                for write in batch:
+                    key = (write.collection, write.document_id)
+                    if self._documents.get(key) is write.data:
+                        del self._documents[key]
+                self._finished_through = max(self._finished_through, batch[-1].sequence)
+                self._condition.notify_all()
+            if metrics.METRICS_ENABLED:
+                pending_writes.dec(len(batch))
+
+    def _commit(self, batch: list) -> bool:
+        for attempt in range(self.max_retries + 1):
+            try:
+                with metrics.stage('firestore_batch_write'):
+                    self.commit(batch)
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error(f'Committing {len(batch)} queued writes failed after {attempt + 1} attempts: {str(e)}')
+                    if metrics.METRICS_ENABLED:
+                        batch_commits.inc(outcome='failed')
+                    for write in batch:
+                        write.future.set_exception(e)
+                    return False
+                delay = self.backoff * 2 ** attempt
+                logger.warning(f'Committing {len(batch)} queued writes failed, retrying in {delay:.1f}s: {str(e)}')
+                if metrics.METRICS_ENABLED:
+                    batch_commits.inc(outcome='retried')
+                time.sleep(delay)
+
+        if metrics.METRICS_ENABLED:
+            batch_commits.inc(outcome='committed')
+            batch_sizes.observe(len(batch))
+        for write in batch:
+            write.future.set_result(write.document_id)
+        return True